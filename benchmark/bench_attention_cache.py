@@ -0,0 +1,59 @@
+# MIT License
+#
+# Copyright (c) 2021 Sangchun Ha
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+import argparse
+import time
+import torch
+from models.las.decoder import Decoder
+
+parser = argparse.ArgumentParser(description='decoder step time with and without the attention cache')
+parser.add_argument('--batch_size', type=int, default=8)
+parser.add_argument('--seq_len', type=int, default=400)
+parser.add_argument('--hidden_size', type=int, default=512)
+parser.add_argument('--num_steps', type=int, default=50)
+parser.add_argument('--cuda', action='store_true')
+args = parser.parse_args()
+
+device = torch.device('cuda' if args.cuda and torch.cuda.is_available() else 'cpu')
+
+
+def measure(decoder: Decoder, encoder_output: torch.Tensor, use_cache: bool) -> float:
+    with torch.no_grad():
+        if device.type == 'cuda':
+            torch.cuda.synchronize()
+        start = time.perf_counter()
+
+        cache = decoder.precompute(encoder_output) if use_cache else None
+        inputs = torch.full((encoder_output.size(0),), decoder.sos_id, dtype=torch.long, device=device)
+        attn_distribution, hidden = None, None
+
+        for _ in range(args.num_steps):
+            output, attn_distribution, hidden = decoder.forward_step(inputs, encoder_output, attn_distribution,
+                                                                     hidden, cache)
+            inputs = output.squeeze(1).argmax(dim=-1)
+
+        if device.type == 'cuda':
+            torch.cuda.synchronize()
+
+    return (time.perf_counter() - start) / args.num_steps * 1e3
+
+
+print('device : {}'.format(device))
+for attn_mechanism in ('location', 'scaled_dot', 'multi_head'):
+    decoder = Decoder(device, 2000, hidden_size=args.hidden_size, attn_mechanism=attn_mechanism).to(device).eval()
+    encoder_output = torch.randn(args.batch_size, args.seq_len, args.hidden_size, device=device)
+
+    measure(decoder, encoder_output, True)
+    uncached = measure(decoder, encoder_output, False)
+    cached = measure(decoder, encoder_output, True)
+
+    print('{:10s} : {:7.2f} ms per step without cache, {:7.2f} ms with cache, {:.2f}x'.format(
+        attn_mechanism, uncached, cached, uncached / cached))
@@ -0,0 +1,76 @@
+# MIT License
+#
+# Copyright (c) 2021 Sangchun Ha
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+import argparse
+import multiprocessing
+import resource
+import time
+import torch
+from models.attention import MultiHeadAttention, FusedMultiHeadAttention
+
+parser = argparse.ArgumentParser(description='peak memory and time of multi-head attention at long encoder lengths')
+parser.add_argument('--batch_size', type=int, default=8)
+parser.add_argument('--q_len', type=int, default=100)
+parser.add_argument('--key_dim', type=int, default=512)
+parser.add_argument('--num_head', type=int, default=8)
+parser.add_argument('--cuda', action='store_true')
+args = parser.parse_args()
+
+
+def measure(attn_mechanism: str, k_len: int, device: str):
+    """ Peak memory in MB above the inputs and time in ms of one teacher-forced attention, in a fresh process """
+    device = torch.device(device)
+    query = torch.randn(args.batch_size, args.q_len, args.key_dim, device=device)
+    key = torch.randn(args.batch_size, k_len, args.key_dim, device=device)
+    key_lengths = torch.randint(k_len // 2, k_len + 1, (args.batch_size,))
+
+    if attn_mechanism == 'multi_head':
+        attention = MultiHeadAttention(args.key_dim, args.num_head)
+        forward = lambda: attention(query, key, key)
+    else:
+        attention = FusedMultiHeadAttention(args.key_dim, args.num_head)
+        forward = lambda: attention(query, key, key, key_lengths=key_lengths)
+
+    with torch.no_grad():
+        if device.type == 'cuda':
+            torch.cuda.synchronize()
+            torch.cuda.reset_peak_memory_stats(device)
+            baseline = torch.cuda.memory_allocated(device)
+        else:
+            baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+        forward()  # warm up, the peak of both calls is the same
+        start = time.perf_counter()
+        forward()
+
+        if device.type == 'cuda':
+            torch.cuda.synchronize()
+            peak = torch.cuda.max_memory_allocated(device)
+        else:
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        elapsed = time.perf_counter() - start
+
+    return (peak - baseline) / 2 ** 20, elapsed * 1e3
+
+
+if __name__ == '__main__':
+    device = 'cuda' if args.cuda and torch.cuda.is_available() else 'cpu'
+    context = multiprocessing.get_context('spawn')
+    print('device : {}'.format(device))
+
+    for k_len in (1000, 2000, 4000, 8000):
+        results = dict()
+        for attn_mechanism in ('multi_head', 'fused_multi_head'):
+            with context.Pool(1) as pool:  # ru_maxrss is a high-water mark, so every run gets its own process
+                results[attn_mechanism] = pool.apply(measure, (attn_mechanism, k_len, device))
+
+        print('enc_T {:5d} : multi_head {:8.1f} MB {:8.2f} ms, fused_multi_head {:8.1f} MB {:8.2f} ms'.format(
+            k_len, *results['multi_head'], *results['fused_multi_head']))
@@ -0,0 +1,58 @@
+# MIT License
+#
+# Copyright (c) 2021 Sangchun Ha
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+import os
+import time
+import argparse
+import tempfile
+import numpy as np
+from data.data_loader import load_audio
+from data.packed_corpus import pack_corpus, PackedCorpus
+
+parser = argparse.ArgumentParser(description='per-file vs packed corpus audio loading')
+parser.add_argument('--audio_path', type=str, default='', help='directory of pcm files, generated if empty')
+parser.add_argument('--num_files', type=int, default=2000)
+args = parser.parse_args()
+
+audio_path = args.audio_path
+
+if not audio_path:
+    audio_path = tempfile.mkdtemp()
+    for idx in range(args.num_files):
+        length = np.random.randint(16000, 16000 * 6)
+        np.random.randint(-3000, 3000, length).astype('h').tofile(os.path.join(audio_path, '{}.pcm'.format(idx)))
+
+audio_paths = sorted(path for path in os.listdir(audio_path) if path.endswith('.pcm'))[:args.num_files]
+corpus_path = tempfile.mkdtemp()
+pack_corpus(audio_path, audio_paths, corpus_path)
+
+start = time.perf_counter()
+for path in audio_paths:
+    load_audio(os.path.join(audio_path, path))
+per_file_time = time.perf_counter() - start
+
+packed_corpus = PackedCorpus(corpus_path)
+packed_corpus.read(audio_paths[0])  # memory-map once
+
+start = time.perf_counter()
+for path in audio_paths:
+    packed_corpus.read(path)
+packed_read_time = time.perf_counter() - start
+
+start = time.perf_counter()
+for path in audio_paths:
+    packed_corpus.read(path).astype('float32') / 32767
+packed_time = time.perf_counter() - start
+
+print('files : {}'.format(len(audio_paths)))
+print('per-file open + read + convert : {:.1f} us / file'.format(per_file_time / len(audio_paths) * 1e6))
+print('packed slice                   : {:.1f} us / file'.format(packed_read_time / len(audio_paths) * 1e6))
+print('packed slice + convert         : {:.1f} us / file'.format(packed_time / len(audio_paths) * 1e6))
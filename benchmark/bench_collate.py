@@ -0,0 +1,64 @@
+# MIT License
+#
+# Copyright (c) 2021 Sangchun Ha
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+import time
+import argparse
+import torch
+from data.data_loader import _collate_fn, BufferedCollate
+
+parser = argparse.ArgumentParser(description='collate microbenchmark')
+parser.add_argument('--batch_size', type=int, default=32)
+parser.add_argument('--n_dim', type=int, default=80)
+parser.add_argument('--num_batches', type=int, default=200)
+args = parser.parse_args()
+
+torch.manual_seed(22)
+batches = list()
+for _ in range(10):
+    batch = list()
+    for _ in range(args.batch_size):
+        seq_length = int(torch.randint(200, 1500, (1,)))
+        batch.append((torch.rand(args.n_dim, seq_length), torch.randint(3, 2000, (int(torch.randint(10, 100, (1,))),))))
+    batches.append(batch)
+
+
+def bytes_copied(batch, buffered: bool) -> int:
+    batch_size, max_length = len(batch), max(seq.size(1) for seq, _ in batch)
+    padded_bytes = batch_size * args.n_dim * max_length * 4
+    if buffered:  # valid frames are copied, padding is zeroed, once
+        return padded_bytes
+    # pad_sequence fills and copies the (B, T, D) tensor, the model makes the (B, D, T) view contiguous
+    return padded_bytes * 3
+
+
+def run(collate_fn, buffered: bool) -> None:
+    for batch in batches:  # warm up and grow buffers
+        collate_fn(batch)[0].contiguous()
+
+    total_bytes = 0
+    start = time.perf_counter()
+    for idx in range(args.num_batches):
+        batch = batches[idx % len(batches)]
+        pad_seqs = collate_fn(batch)[0]
+        pad_seqs.contiguous()  # layout the encoder convolution needs
+        total_bytes += bytes_copied(batch, buffered)
+    elapsed = time.perf_counter() - start
+
+    print('{:16s}: {:.3f} ms / batch, {:.1f} MB written / batch'.format(
+        'buffered' if buffered else '_collate_fn', elapsed / args.num_batches * 1e3,
+        total_bytes / args.num_batches / 1e6))
+
+
+for expected, result in zip(_collate_fn(batches[0]), BufferedCollate()(batches[0])):
+    assert torch.equal(expected, result)
+
+run(_collate_fn, False)
+run(BufferedCollate(), True)
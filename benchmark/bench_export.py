@@ -0,0 +1,127 @@
+# MIT License
+#
+# Copyright (c) 2021 Sangchun Ha
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import torch
+from model_builder import load_model
+from models.deepspeech2.model import DeepSpeech2
+from models.export import export_model
+from models.las.decoder import Decoder
+from models.las.encoder import Encoder
+from models.las.model import ListenAttendSpell
+from models.search import GreedySearch, ctc_greedy_decode
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'deploy'))
+from runtime import Recognizer
+
+parser = argparse.ArgumentParser(description='cold start and latency of TorchScript artifacts against the eager model')
+parser.add_argument('--architecture', type=str, default='las', help='las or deepspeech2, used without --model_path')
+parser.add_argument('--model_path', type=str, default='', help='trained model, if empty, a randomly initialized one')
+parser.add_argument('--max_len', type=int, default=120)
+parser.add_argument('--blank_id', type=int, default=1999)
+parser.add_argument('--iterations', type=int, default=10)
+parser.add_argument('--num_threads', type=int, default=1)
+args = parser.parse_args()
+
+torch.set_num_threads(args.num_threads)
+device = torch.device('cpu')
+
+EAGER_COLD_START = '''
+import sys, time
+start = time.perf_counter()
+import torch
+sys.path.insert(0, {root!r})
+from model_builder import load_model
+from models.search import GreedySearch, ctc_greedy_decode
+from models.deepspeech2.model import DeepSpeech2
+torch.set_num_threads({num_threads})
+model = load_model({model_path!r}, torch.device('cpu')).eval()
+feature, feature_lengths = torch.randn(1, 80, 300), torch.IntTensor([300])
+with torch.no_grad():
+    if isinstance(model, DeepSpeech2):
+        log_probs, output_lengths = model(feature, feature_lengths)
+        ctc_greedy_decode(log_probs, output_lengths, {blank_id})
+    else:
+        GreedySearch(torch.device('cpu'), {max_len})(model, feature, feature_lengths)
+print(time.perf_counter() - start)
+'''
+
+RUNTIME_COLD_START = '''
+import sys, time
+start = time.perf_counter()
+import torch
+sys.path.insert(0, {deploy!r})
+from runtime import Recognizer
+recognizer = Recognizer({export_dir!r}, num_threads={num_threads})
+recognizer(torch.randn(1, 80, 300), torch.IntTensor([300]))
+print(time.perf_counter() - start)
+'''
+
+
+def cold_start(code: str) -> float:
+    """ Seconds from the imports to the first utterance decoded, in a fresh interpreter """
+    output = subprocess.run([sys.executable, '-W', 'ignore', '-c', code], capture_output=True, text=True, check=True)
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def eager_decode(model, feature, feature_lengths):
+    with torch.no_grad():
+        if isinstance(model, DeepSpeech2):
+            log_probs, output_lengths = model(feature, feature_lengths)
+            return ctc_greedy_decode(log_probs, output_lengths, args.blank_id)
+        return GreedySearch(device, args.max_len)(model, feature, feature_lengths)
+
+
+def latency(decode, feature, feature_lengths) -> float:
+    decode(feature, feature_lengths)
+    start = time.perf_counter()
+    for _ in range(args.iterations):
+        decode(feature, feature_lengths)
+    return (time.perf_counter() - start) / args.iterations * 1e3
+
+
+with tempfile.TemporaryDirectory() as tmp_dir:
+    model_path = args.model_path
+    if not model_path:
+        if args.architecture == 'deepspeech2':
+            model = DeepSpeech2(args.blank_id + 1)
+        else:
+            model = ListenAttendSpell(Encoder(args.blank_id + 1, 80, 256),
+                                      Decoder(device, args.blank_id + 1, 512, 512, max_len=args.max_len))
+        model_path = os.path.join(tmp_dir, 'model.pt')
+        torch.save(model, model_path)
+
+    model = load_model(model_path, device).eval()
+    export_dir = os.path.join(tmp_dir, 'export')
+    export_model(model, export_dir, args.blank_id, max_len=args.max_len)
+    recognizer = Recognizer(export_dir)
+
+    print('cold start : eager {:.2f} s, torchscript {:.2f} s'.format(
+        cold_start(EAGER_COLD_START.format(root=ROOT, model_path=model_path, num_threads=args.num_threads,
+                                           blank_id=args.blank_id, max_len=args.max_len)),
+        cold_start(RUNTIME_COLD_START.format(deploy=os.path.join(ROOT, 'deploy'), export_dir=export_dir,
+                                             num_threads=args.num_threads))))
+
+    for seconds in (2, 5, 10):
+        feature = torch.randn(1, 80, seconds * 100)
+        feature_lengths = torch.IntTensor([seconds * 100])
+
+        eager_time = latency(lambda x, lengths: eager_decode(model, x, lengths), feature, feature_lengths)
+        script_time = latency(recognizer, feature, feature_lengths)
+
+        print('{:2d} s utterance : eager {:8.2f} ms, torchscript {:8.2f} ms, {:.2f}x'.format(
+            seconds, eager_time, script_time, eager_time / script_time))
@@ -0,0 +1,88 @@
+# MIT License
+#
+# Copyright (c) 2021 Sangchun Ha
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+import torch
+from models.lm import compile_arpa, NGramLanguageModel
+
+parser = argparse.ArgumentParser(description='n-gram language model compile, load and scoring time')
+parser.add_argument('--num_vocabs', type=int, default=2000)
+parser.add_argument('--num_ngrams', type=int, default=200000)
+parser.add_argument('--iterations', type=int, default=50)
+args = parser.parse_args()
+
+
+def write_arpa(path: str, chars: list, order: int, num_ngrams: int, seed: int = 0) -> None:
+    """ Random ARPA model where every n-gram extends an (n - 1)-gram of the model """
+    rng = np.random.RandomState(seed)
+    levels = {1: [(char,) for char in chars + ['<s>', '</s>']]}
+
+    for n in range(2, order + 1):
+        ngrams = set()
+        while len(ngrams) < num_ngrams:
+            prefix = levels[n - 1][rng.randint(len(levels[n - 1]))]
+            if prefix[-1] != '</s>':
+                ngrams.add(prefix + (chars[rng.randint(len(chars))] if rng.rand() < 0.95 else '</s>',))
+        levels[n] = sorted(ngrams)
+
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\\data\\\n')
+        for n in levels:
+            f.write('ngram {}={}\n'.format(n, len(levels[n])))
+        for n in levels:
+            f.write('\n\\{}-grams:\n'.format(n))
+            for ngram in levels[n]:
+                if n < order:
+                    f.write('{:.4f}\t{}\t{:.4f}\n'.format(-3 * rng.rand(), ' '.join(ngram), -rng.rand()))
+                else:
+                    f.write('{:.4f}\t{}\n'.format(-3 * rng.rand(), ' '.join(ngram)))
+        f.write('\n\\end\\\n')
+
+
+chars = [chr(0xAC00 + idx) for idx in range(args.num_vocabs - 3)]
+char2id = {char: idx + 3 for idx, char in enumerate(chars)}
+
+with tempfile.TemporaryDirectory() as tmp_dir:
+    for order in (3, 5):
+        arpa_path = os.path.join(tmp_dir, '{}gram.arpa'.format(order))
+        lm_path = os.path.join(tmp_dir, '{}gram'.format(order))
+        write_arpa(arpa_path, chars, order, args.num_ngrams)
+
+        start = time.perf_counter()
+        compile_arpa(arpa_path, char2id, lm_path)
+        compile_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        lm = NGramLanguageModel(lm_path)
+        load_time = time.perf_counter() - start
+
+        print('{}-gram : compile {:.2f} s, load {:.2f} ms'.format(order, compile_time, load_time * 1e3))
+
+        for batch_size in (1, 8, 32, 128):
+            states = lm.initial_state(batch_size)
+            tokens = torch.randint(3, args.num_vocabs, (args.iterations, batch_size))
+            score_time, advance_time = 0.0, 0.0
+
+            for step in range(args.iterations):
+                start = time.perf_counter()
+                lm.score(states)
+                score_time += time.perf_counter() - start
+
+                start = time.perf_counter()
+                states = lm.advance(states, tokens[step])
+                advance_time += time.perf_counter() - start
+
+            print('  batch {:3d} : score {:7.3f} ms, advance {:7.3f} ms per step'.format(
+                batch_size, score_time / args.iterations * 1e3, advance_time / args.iterations * 1e3))
@@ -0,0 +1,84 @@
+# MIT License
+#
+# Copyright (c) 2021 Sangchun Ha
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+import argparse
+import multiprocessing
+import resource
+import time
+import torch
+from models.deepspeech2.model import DeepSpeech2
+from models.las.decoder import Decoder
+from models.las.encoder import Encoder
+from models.las.model import ListenAttendSpell
+from models.long_form import LongFormTranscriber
+from models.search import GreedySearch, ctc_greedy_decode
+
+parser = argparse.ArgumentParser(description='peak memory and throughput of long-form transcription by audio length')
+parser.add_argument('--architecture', type=str, default='deepspeech2', help='las or deepspeech2')
+parser.add_argument('--seconds', type=int, nargs='+', default=[30, 60, 120, 240])
+parser.add_argument('--window_size', type=int, default=1000)
+parser.add_argument('--overlap', type=int, default=200)
+parser.add_argument('--batch_size', type=int, default=8)
+parser.add_argument('--max_len', type=int, default=120, help='tokens per window, and per recording for LAS whole')
+parser.add_argument('--blank_id', type=int, default=1999)
+parser.add_argument('--num_threads', type=int, default=4)
+args = parser.parse_args()
+
+
+def build_model():
+    torch.manual_seed(0)
+    device = torch.device('cpu')
+
+    if args.architecture == 'deepspeech2':
+        return DeepSpeech2(args.blank_id + 1).eval()
+
+    return ListenAttendSpell(Encoder(args.blank_id + 1, 80, 256),
+                             Decoder(device, args.blank_id + 1, 512, 512, max_len=args.max_len)).eval()
+
+
+def measure(mode: str, seconds: int):
+    """ Peak memory in MB above the model and real time factor of one recording, in a fresh process """
+    torch.set_num_threads(args.num_threads)
+    device = torch.device('cpu')
+    model = build_model()
+    feature = torch.randn(80, seconds * 100)
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    start = time.perf_counter()
+    with torch.no_grad():
+        if mode == 'long_form':
+            LongFormTranscriber(model, device, args.blank_id, window_size=args.window_size, overlap=args.overlap,
+                                batch_size=args.batch_size, max_len=args.max_len)(feature)
+        elif isinstance(model, DeepSpeech2):
+            log_probs, output_lengths = model(feature.unsqueeze(0), torch.IntTensor([feature.size(1)]))
+            ctc_greedy_decode(log_probs, output_lengths, args.blank_id)
+        else:
+            GreedySearch(device, args.max_len)(model, feature.unsqueeze(0), torch.IntTensor([feature.size(1)]))
+    elapsed = time.perf_counter() - start
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    return (peak - baseline) / 2 ** 20, elapsed / seconds
+
+
+if __name__ == '__main__':
+    context = multiprocessing.get_context('spawn')
+    print('{}, window {} frames, overlap {} frames, {} windows per batch'.format(
+        args.architecture, args.window_size, args.overlap, args.batch_size))
+
+    for seconds in args.seconds:
+        results = dict()
+        for mode in ('whole', 'long_form'):
+            with context.Pool(1) as pool:  # ru_maxrss is a high-water mark, so every run gets its own process
+                results[mode] = pool.apply(measure, (mode, seconds))
+
+        print('{:5d} s : whole {:8.1f} MB RTF {:.3f}, long form {:8.1f} MB RTF {:.3f}'.format(
+            seconds, *results['whole'], *results['long_form']))
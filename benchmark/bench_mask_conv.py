@@ -0,0 +1,84 @@
+# MIT License
+#
+# Copyright (c) 2021 Sangchun Ha
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+import time
+import argparse
+import torch
+import torch.nn as nn
+from models.modules import MaskConv
+
+parser = argparse.ArgumentParser(description='MaskConv forward time per batch size')
+parser.add_argument('--n_dim', type=int, default=80)
+parser.add_argument('--seq_len', type=int, default=400)
+parser.add_argument('--iterations', type=int, default=10)
+parser.add_argument('--cuda', action='store_true')
+args = parser.parse_args()
+
+device = torch.device('cuda' if args.cuda and torch.cuda.is_available() else 'cpu')
+
+
+def loop_mask_forward(mask_conv: MaskConv, inputs: torch.Tensor, seq_lens: torch.Tensor):
+    """ Masks after every module with a python loop over the batch, as MaskConv did before """
+    output = None
+
+    for module in mask_conv.sequential:
+        output = module(inputs)
+        mask = torch.BoolTensor(output.size()).fill_(0)
+        if output.is_cuda:
+            mask = mask.cuda()
+        seq_lens = mask_conv.get_seq_lens(module, seq_lens)
+
+        for idx, seq_len in enumerate(seq_lens):
+            seq_len = seq_len.item()
+            if (mask[idx].size(2) - seq_len) > 0:
+                mask[idx].narrow(2, seq_len, mask[idx].size(2) - seq_len).fill_(1)
+
+        output = output.masked_fill(mask, 0)
+        inputs = output
+
+    return output, seq_lens
+
+
+def measure(forward, mask_conv: MaskConv, inputs: torch.Tensor, seq_lens: torch.Tensor) -> float:
+    with torch.no_grad():
+        forward(mask_conv, inputs, seq_lens.clone())
+        if device.type == 'cuda':
+            torch.cuda.synchronize()
+
+        start = time.perf_counter()
+        for _ in range(args.iterations):
+            forward(mask_conv, inputs, seq_lens.clone())
+        if device.type == 'cuda':
+            torch.cuda.synchronize()
+
+    return (time.perf_counter() - start) / args.iterations * 1e3
+
+
+mask_conv = MaskConv(nn.Sequential(
+    nn.Conv2d(in_channels=1, out_channels=32, kernel_size=(41, 11), stride=(2, 2), padding=(20, 5)),
+    nn.BatchNorm2d(num_features=32),
+    nn.Hardtanh(min_val=0, max_val=20, inplace=True),
+    nn.Conv2d(in_channels=32, out_channels=32, kernel_size=(21, 11), stride=(2, 1), padding=(10, 5)),
+    nn.BatchNorm2d(num_features=32),
+    nn.Hardtanh(min_val=0, max_val=20, inplace=True)
+)).to(device).eval()
+
+print('device : {}'.format(device))
+for batch_size in (4, 8, 16, 32, 64):
+    inputs = torch.randn(batch_size, 1, args.n_dim, args.seq_len, device=device)
+    seq_lens = torch.randint(args.seq_len // 2, args.seq_len + 1, (batch_size,), dtype=torch.int32)
+    seq_lens[0] = args.seq_len
+
+    loop_time = measure(loop_mask_forward, mask_conv, inputs, seq_lens)
+    broadcast_time = measure(lambda module, x, lengths: module(x, lengths), mask_conv, inputs, seq_lens)
+
+    print('batch {:3d} : loop {:8.2f} ms, broadcast {:8.2f} ms, {:.2f}x'.format(
+        batch_size, loop_time, broadcast_time, loop_time / broadcast_time))
@@ -0,0 +1,125 @@
+# MIT License
+#
+# Copyright (c) 2021 Sangchun Ha
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+import argparse
+import os
+import tempfile
+import time
+import torch
+from model_builder import load_model
+from models.deepspeech2.model import DeepSpeech2
+from models.export import export_onnx
+from models.las.decoder import Decoder
+from models.las.encoder import Encoder
+from models.las.model import ListenAttendSpell
+from models.onnx_backend import load_onnx_model
+from models.search import CTCPrefixBeamSearch, GreedySearch, ctc_greedy_decode
+
+parser = argparse.ArgumentParser(description='parity and latency of the onnxruntime backend against torch on CPU')
+parser.add_argument('--architecture', type=str, default='las', help='las or deepspeech2, used without --model_path')
+parser.add_argument('--model_path', type=str, default='', help='trained model, if empty, a randomly initialized one')
+parser.add_argument('--input_size', type=int, default=80)
+parser.add_argument('--max_len', type=int, default=120)
+parser.add_argument('--blank_id', type=int, default=1999)
+parser.add_argument('--iterations', type=int, default=5)
+parser.add_argument('--num_threads', type=int, default=1)
+parser.add_argument('--beam_size', type=int, default=4)
+args = parser.parse_args()
+
+torch.set_num_threads(args.num_threads)
+torch.manual_seed(0)
+device = torch.device('cpu')
+
+
+def make_batch(batch_size: int, seq_len: int):
+    """ Random features with lengths spread down to half of seq_len, so padding is exercised """
+    feature = torch.randn(batch_size, args.input_size, seq_len)
+    feature_lengths = torch.linspace(seq_len, seq_len // 2, batch_size).int()
+    return feature, feature_lengths
+
+
+def run_model(model, feature, feature_lengths):
+    with torch.no_grad():
+        if isinstance(model, DeepSpeech2) or not hasattr(model, 'encoder'):
+            log_probs, output_lengths = model(feature, feature_lengths)
+            return None, log_probs, output_lengths
+        return model.encoder(feature, feature_lengths)
+
+
+def max_diff(a, b, lengths) -> float:
+    if a is None:  # DeepSpeech2 has no encoder output
+        return float('nan')
+    return max((a[idx, :length] - b[idx, :length]).abs().max().item() for idx, length in enumerate(lengths.tolist()))
+
+
+def decode(model, searches, feature, feature_lengths):
+    with torch.no_grad():
+        if isinstance(model, DeepSpeech2) or not hasattr(model, 'encoder'):
+            log_probs, output_lengths = model(feature, feature_lengths)
+            hypotheses = [ctc_greedy_decode(log_probs, output_lengths, args.blank_id)]
+        else:
+            hypotheses = [GreedySearch(device, args.max_len)(model, feature, feature_lengths)]
+
+        for search in searches:
+            hypotheses.append(search(model, feature, feature_lengths))
+
+    return hypotheses
+
+
+def latency(model, feature, feature_lengths) -> float:
+    run_model(model, feature, feature_lengths)
+    start = time.perf_counter()
+    for _ in range(args.iterations):
+        run_model(model, feature, feature_lengths)
+    return (time.perf_counter() - start) / args.iterations * 1e3
+
+
+with tempfile.TemporaryDirectory() as tmp_dir:
+    if args.model_path:
+        model = load_model(args.model_path, device).eval()
+    elif args.architecture == 'deepspeech2':
+        model = DeepSpeech2(args.blank_id + 1, input_size=args.input_size).eval()
+    else:
+        model = ListenAttendSpell(Encoder(args.blank_id + 1, args.input_size, 256),
+                                  Decoder(device, args.blank_id + 1, 512, 512, max_len=args.max_len)).eval()
+
+    meta = export_onnx(model, tmp_dir, args.input_size)
+    onnx_model = load_onnx_model(os.path.join(tmp_dir, meta['files'][0]), getattr(model, 'decoder', None),
+                                 args.num_threads)
+
+    searches = list()
+    if isinstance(model, DeepSpeech2) or model.encoder.use_joint_ctc_attention:
+        searches.append(CTCPrefixBeamSearch(device, args.blank_id, beam_size=args.beam_size, top_k=args.beam_size))
+
+    print('{} exported to {} with outputs {}'.format(meta['architecture'], meta['files'][0], meta['outputs']))
+
+    for batch_size in (1, 4, 16):
+        for seq_len in (200, 1000):
+            feature, feature_lengths = make_batch(batch_size, seq_len)
+
+            torch_outputs = run_model(model, feature, feature_lengths)
+            onnx_outputs = run_model(onnx_model, feature, feature_lengths)
+            output_lengths = torch_outputs[2]
+            assert torch.equal(output_lengths.int(), onnx_outputs[2].int()), 'output lengths differ'
+
+            same_tokens = all(torch.equal(a, b) for a, b in zip(decode(model, searches, feature, feature_lengths),
+                                                                decode(onnx_model, searches, feature, feature_lengths)))
+            torch_time = latency(model, feature, feature_lengths)
+            onnx_time = latency(onnx_model, feature, feature_lengths)
+
+            print('B {:2d} T {:4d} : max abs diff encoder {:.2e} log_probs {:.2e}, same tokens {}, '
+                  'torch {:8.2f} ms, onnxruntime {:8.2f} ms, {:.2f}x'.format(
+                      batch_size, seq_len, max_diff(torch_outputs[0], onnx_outputs[0], output_lengths),
+                      max_diff(torch_outputs[1], onnx_outputs[1], output_lengths), same_tokens,
+                      torch_time, onnx_time, torch_time / onnx_time))
+
+    for search in searches:
+        search.close()
@@ -0,0 +1,98 @@
+# MIT License
+#
+# Copyright (c) 2021 Sangchun Ha
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+import argparse
+import time
+import torch
+from model_builder import load_model
+from models.deepspeech2.model import DeepSpeech2
+from models.deepspeech2.streaming import StreamingDeepSpeech2
+
+parser = argparse.ArgumentParser(description='first token latency and real time factor of streaming DeepSpeech2 on CPU')
+parser.add_argument('--model_path', type=str, default='', help='unidirectional model, if empty, a random one')
+parser.add_argument('--input_size', type=int, default=80)
+parser.add_argument('--blank_id', type=int, default=1999)
+parser.add_argument('--seconds', type=int, default=10)
+parser.add_argument('--frame_stride', type=float, default=0.010, help='seconds per feature frame')
+parser.add_argument('--num_threads', type=int, default=1)
+args = parser.parse_args()
+
+torch.set_num_threads(args.num_threads)
+torch.manual_seed(0)
+device = torch.device('cpu')
+special_tokens = (args.blank_id, 1, 2)
+
+if args.model_path:
+    model = load_model(args.model_path, device).eval()
+else:
+    model = DeepSpeech2(args.blank_id + 1, args.input_size, bidirectional=False, lookahead_context=20).eval()
+
+num_frames = int(args.seconds / args.frame_stride)
+feature = torch.randn(1, args.input_size, num_frames)
+streaming = StreamingDeepSpeech2(model, args.blank_id)
+
+with torch.no_grad():
+    subsampling = num_frames / model(feature, torch.IntTensor([num_frames]))[1].item()
+
+
+def first_token_frame(log_probs: torch.Tensor) -> int:
+    tokens = log_probs[0].argmax(dim=-1).tolist()
+    return next((idx for idx, token in enumerate(tokens) if token not in special_tokens), -1)
+
+
+def simulate(chunk_len: int):
+    """
+    Feeds chunk_len frames at a time, chunk i arriving once its audio is recorded. Returns the first token latency
+    (from the end of the audio frame of the first token to its decoding), the real time factor and the mean compute
+    time of a chunk.
+    """
+    streaming.reset()
+    clock, compute_time, first_token_latency = 0.0, 0.0, None
+    chunks = [feature[:, :, begin:begin + chunk_len] for begin in range(0, num_frames, chunk_len)]
+
+    for idx, chunk in enumerate(chunks):
+        is_last = idx == len(chunks) - 1
+        arrival = min((idx + 1) * chunk_len, num_frames) * args.frame_stride
+
+        start = time.perf_counter()
+        log_probs = streaming.forward_chunk(chunk, is_last)
+        streaming.decode(log_probs)
+        elapsed = time.perf_counter() - start
+
+        clock = max(clock, arrival) + elapsed
+        compute_time += elapsed
+
+        frame = first_token_frame(log_probs) if log_probs.size(1) > 0 else -1
+        if first_token_latency is None and frame >= 0:
+            output_frame = streaming.num_frames - log_probs.size(1) + frame
+            first_token_latency = clock - (int(output_frame * subsampling) + 1) * args.frame_stride
+
+    return first_token_latency, compute_time / args.seconds, compute_time / len(chunks)
+
+
+with torch.no_grad():
+    simulate(32)  # warmup
+
+    print('{} s utterance, model right context {} frames ({:.0f} ms)'.format(
+        args.seconds, streaming.right_context, streaming.right_context * args.frame_stride * 1e3))
+
+    for chunk_len in (8, 16, 32, 64, 128):
+        first_token_latency, rtf, chunk_time = simulate(chunk_len)
+        print('chunk {:4.0f} ms : first token latency {:7.1f} ms, RTF {:.3f}, {:6.2f} ms per chunk'.format(
+            chunk_len * args.frame_stride * 1e3, first_token_latency * 1e3, rtf, chunk_time * 1e3))
+
+    offline = DeepSpeech2(model.fc.out_features, args.input_size, model.hidden_size, model.num_layers,
+                          bidirectional=True, rnn_type={'LSTM': 'lstm', 'GRU': 'gru'}.get(model.rnn.mode, 'rnn')).eval()
+    start = time.perf_counter()
+    offline(feature, torch.IntTensor([num_frames]))
+    elapsed = time.perf_counter() - start
+    print('bidirectional, whole utterance : first token latency {:7.1f} ms, RTF {:.3f}'.format(
+        (args.seconds + elapsed) * 1e3, elapsed / args.seconds))
@@ -0,0 +1,59 @@
+# MIT License
+#
+# Copyright (c) 2021 Sangchun Ha
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+import argparse
+import time
+import numpy as np
+import torch
+from data.batch_feature import BatchFeatureExtractor
+from data.streaming_feature import StreamingFeatureExtractor
+
+parser = argparse.ArgumentParser(description='per chunk latency of streaming feature extraction against batch extraction')
+parser.add_argument('--seconds', type=int, default=10)
+parser.add_argument('--sampling_rate', type=int, default=16000)
+parser.add_argument('--num_threads', type=int, default=1)
+args = parser.parse_args()
+
+torch.set_num_threads(args.num_threads)
+np.random.seed(0)
+sound = (np.random.randn(args.seconds * args.sampling_rate) * 0.1).astype('float32')
+
+for feature_extraction in ('spectrogram', 'melspectrogram', 'mfcc', 'filterbank'):
+    n_dim = 40 if feature_extraction == 'mfcc' else 80
+    batch_feature_extractor = BatchFeatureExtractor(feature_extraction, args.sampling_rate, n_dim)
+    streaming_feature_extractor = StreamingFeatureExtractor(feature_extraction, args.sampling_rate, n_dim)
+
+    with torch.no_grad():
+        batch_feature_extractor(torch.from_numpy(sound).unsqueeze(0), torch.LongTensor([len(sound)]))
+        start = time.perf_counter()
+        batch_feature_extractor(torch.from_numpy(sound).unsqueeze(0), torch.LongTensor([len(sound)]))
+        batch_time = time.perf_counter() - start
+
+    print('{} : batch {:.1f} ms for {} s'.format(feature_extraction, batch_time * 1e3, args.seconds))
+
+    for chunk_ms in (10, 20, 40, 100, 200):
+        chunk_len = args.sampling_rate * chunk_ms // 1000
+        streaming_feature_extractor.reset()
+        chunk_times = list()
+
+        for begin in range(0, len(sound), chunk_len):
+            start = time.perf_counter()
+            streaming_feature_extractor(sound[begin:begin + chunk_len])
+            chunk_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        streaming_feature_extractor.finish()
+        total_time = sum(chunk_times) + time.perf_counter() - start
+        chunk_times = np.array(chunk_times) * 1e3
+
+        print('  chunk {:3d} ms : mean {:.3f} ms, p95 {:.3f} ms per chunk, RTF {:.4f}, {:.2f}x batch time'.format(
+            chunk_ms, chunk_times.mean(), np.percentile(chunk_times, 95), total_time / args.seconds,
+            total_time / batch_time))
@@ -0,0 +1,51 @@
+import os
+import time
+import wave
+import argparse
+import tempfile
+import librosa
+import numpy as np
+from data.wav import load_wav
+
+parser = argparse.ArgumentParser(description='librosa.load vs header parsed memory-mapped wav loading')
+parser.add_argument('--audio_path', type=str, default='', help='directory of wav files, generated if empty')
+parser.add_argument('--num_files', type=int, default=500)
+parser.add_argument('--file_rate', type=int, default=16000, help='sampling rate of generated files')
+parser.add_argument('--num_channels', type=int, default=1, help='number of channels of generated files')
+parser.add_argument('--sampling_rate', type=int, default=16000)
+args = parser.parse_args()
+
+audio_path = args.audio_path
+
+if not audio_path:
+    audio_path = tempfile.mkdtemp()
+    for idx in range(args.num_files):
+        length = np.random.randint(args.file_rate, args.file_rate * 6)
+        sound = np.random.randint(-3000, 3000, (length, args.num_channels)).astype('<i2')
+
+        with wave.open(os.path.join(audio_path, '{}.wav'.format(idx)), 'wb') as f:
+            f.setnchannels(args.num_channels)
+            f.setsampwidth(2)
+            f.setframerate(args.file_rate)
+            f.writeframes(sound.tobytes())
+
+audio_paths = sorted(os.path.join(audio_path, path) for path in os.listdir(audio_path) if path.endswith('.wav'))
+audio_paths = audio_paths[:args.num_files]
+
+librosa.load(audio_paths[0], sr=args.sampling_rate)  # warm up imports and filter caches
+load_wav(audio_paths[0], args.sampling_rate)
+
+start = time.perf_counter()
+for path in audio_paths:
+    librosa.load(path, sr=args.sampling_rate)
+librosa_time = time.perf_counter() - start
+
+start = time.perf_counter()
+for path in audio_paths:
+    load_wav(path, args.sampling_rate)
+load_wav_time = time.perf_counter() - start
+
+print('files : {}'.format(len(audio_paths)))
+print('librosa.load : {:.1f} us / file'.format(librosa_time / len(audio_paths) * 1e6))
+print('load_wav     : {:.1f} us / file'.format(load_wav_time / len(audio_paths) * 1e6))
+print('speedup      : {:.1f}x'.format(librosa_time / load_wav_time))
@@ -0,0 +1,31 @@
+# MIT License
+#
+# Copyright (c) 2021 Sangchun Ha
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+import argparse
+from models.lm import compile_arpa
+from vocabulary import load_label
+
+
+parser = argparse.ArgumentParser(description='compile character ARPA n-gram model')
+parser.add_argument('--arpa_path', type=str, default='')
+parser.add_argument('--label_path', type=str, default='')
+parser.add_argument('--lm_path', type=str, default='')
+parser.add_argument('--blank_id', type=int, default=1999)
+parser.add_argument('--sos_id', type=int, default=1)
+parser.add_argument('--eos_id', type=int, default=2)
+parser.add_argument('--space_token', type=str, default='<space>')
+args = parser.parse_args()
+
+char2id, _ = load_label(args.label_path, args.blank_id)
+meta = compile_arpa(args.arpa_path, char2id, args.lm_path, args.sos_id, args.eos_id, args.space_token)
+
+print('{}-gram model with {} n-grams is written to {} ({} skipped)'.format(
+    meta['order'], sum(meta['num_ngrams'].values()), args.lm_path, meta['num_skipped']))
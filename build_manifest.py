@@ -0,0 +1,27 @@
+# MIT License
+#
+# Copyright (c) 2021 Sangchun Ha
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+import argparse
+from vocabulary import build_manifest
+
+
+parser = argparse.ArgumentParser(description='build binary manifest')
+parser.add_argument('--dataset_path', type=str, default='')
+parser.add_argument('--audio_path', type=str, default='')
+parser.add_argument('--manifest_path', type=str, default='')
+parser.add_argument('--extension', type=str, default='pcm')
+parser.add_argument('--sampling_rate', type=int, default=16000)
+args = parser.parse_args()
+
+num_utterances = build_manifest(args.dataset_path, args.manifest_path, args.audio_path, args.extension,
+                                 args.sampling_rate)
+
+print('{} utterances are written to {}'.format(num_utterances, args.manifest_path))
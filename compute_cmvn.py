@@ -0,0 +1,74 @@
+# MIT License
+#
+# Copyright (c) 2021 Sangchun Ha
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+import numpy as np
+import hydra
+
+from hydra.core.config_store import ConfigStore
+from omegaconf import OmegaConf, DictConfig
+from data import (
+    MelSpectrogramConfig,
+    SpectrogramConfig,
+    MFCCConfig,
+    FilterBankConfig,
+    PreprocessConfig,
+)
+from data.data_loader import SpectrogramDataset
+from data.cmvn import compute_cmvn_stats
+from vocabulary import (
+    load_dataset,
+    load_manifest,
+)
+
+
+cs = ConfigStore.instance()
+cs.store(group="audio", name="melspectrogram", node=MelSpectrogramConfig, package="audio")
+cs.store(group="audio", name="filterbank", node=FilterBankConfig, package="audio")
+cs.store(group="audio", name="mfcc", node=MFCCConfig, package="audio")
+cs.store(group="audio", name="spectrogram", node=SpectrogramConfig, package="audio")
+cs.store(group="preprocess", name="default", node=PreprocessConfig, package="preprocess")
+
+
+@hydra.main(config_path='configs', config_name='preprocess')
+def main(config: DictConfig) -> None:
+    print(OmegaConf.to_yaml(config))
+
+    np.random.seed(config.preprocess.seed)
+
+    if config.preprocess.manifest_path:
+        audio_paths, transcripts, _, _ = load_manifest(config.preprocess.manifest_path, config.preprocess.mode)
+    else:
+        audio_paths, transcripts, _, _ = load_dataset(config.preprocess.dataset_path, config.preprocess.mode)
+
+    dataset = SpectrogramDataset(
+        config.preprocess.audio_path,
+        audio_paths,
+        transcripts,
+        config.audio.sampling_rate,
+        config.audio.n_mfcc if config.audio.feature_extraction == 'mfcc' else config.audio.n_mel,
+        config.audio.frame_length,
+        config.audio.frame_stride,
+        config.audio.extension,
+        config.audio.feature_extraction,
+        False,
+        False,
+        feature_cache_path=config.audio.feature_cache_path,
+        corpus_path=config.preprocess.corpus_path,
+    )
+
+    mean, std, count = compute_cmvn_stats(dataset, config.preprocess.num_workers, config.preprocess.chunk_size)
+    np.savez(config.preprocess.cmvn_path, mean=mean, std=std, count=count)
+
+    print('{} frames, statistics are written to {}'.format(count, config.preprocess.cmvn_path))
+
+
+if __name__ == "__main__":
+    main()
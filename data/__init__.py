@@ -20,8 +20,11 @@ class FeatureConfig:
     frame_stride: float = 0.010
     normalize: bool = False
     spec_augment: bool = False
+    batch_spec_augment: bool = False
     num_time_mask: int = 1
     num_freq_mask: int = 1
+    feature_cache_path: str = ''
+    cmvn_path: str = ''
 
 
 @dataclass
@@ -49,3 +52,17 @@ class MFCCConfig(FeatureConfig):
 class FilterBankConfig(FeatureConfig):
     feature_extraction: str = 'filterbank'
     n_mel: int = 80
+
+
+@dataclass
+class PreprocessConfig:
+    dataset_path: str = ''
+    manifest_path: str = ''
+    audio_path: str = ''
+    corpus_path: str = ''
+    cmvn_path: str = 'cmvn.npz'
+    num_workers: int = 4
+    chunk_size: int = 256
+    feature_dtype: str = 'float16'
+    mode: str = 'train'
+    seed: int = 22
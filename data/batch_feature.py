@@ -0,0 +1,197 @@
+# MIT License
+#
+# Copyright (c) 2021 Sangchun Ha
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+import inspect
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+import librosa
+from torch import Tensor
+from typing import Optional, Tuple
+
+
+class BatchFeatureExtractor(nn.Module):
+    """
+    Extracts features of a padded batch of waveforms at once with torch operations.
+    Gives the same features as Spectrogram, MelSpectrogram, MFCC and FilterBank in data/feature.py,
+    so it can run in the collate function or on the device after the input transfer.
+
+    Args:
+        feature_extraction (str): type of feature (spectrogram, melspectrogram, mfcc, filterbank)
+        sampling_rate (int): sampling rate of audio (default: 16000)
+        n_dim (int): dimension of feature, n_mel or n_mfcc (default: 80)
+        frame_length (float): frame length in seconds (default: 0.020)
+        frame_stride (float): frame stride in seconds (default: 0.010)
+        top_db (float): melspectrogram and mfcc are clipped to top_db below the reference, if None, not clipped
+            (default: 80.0)
+        ref_db (float): fixed reference of the top_db clipping, if None, the maximum of each utterance as librosa
+            (default: None)
+
+    Inputs: sounds, sound_lengths, normalize
+        - **sounds** (batch, num_samples): padded waveforms
+        - **sound_lengths** (batch): number of valid samples of each waveform
+        - **normalize** (bool): flag indication per-utterance normalize or not
+
+    Returns: features, feature_lengths
+        - **features** (batch, n_dim, seq_len): padded features, the padding region is zero
+        - **feature_lengths** (batch): number of valid frames of each feature
+    """
+    def __init__(
+            self,
+            feature_extraction: str = 'melspectrogram',
+            sampling_rate: int = 16000,
+            n_dim: int = 80,
+            frame_length: float = 0.020,
+            frame_stride: float = 0.010,
+            top_db: Optional[float] = 80.0,
+            ref_db: Optional[float] = None,
+    ) -> None:
+        super(BatchFeatureExtractor, self).__init__()
+        self.feature_extraction = feature_extraction
+        self.sampling_rate = sampling_rate
+        self.n_dim = n_dim
+        self.top_db = top_db
+        self.ref_db = ref_db
+
+        if feature_extraction == 'filterbank':
+            import torchaudio.compliance.kaldi as kaldi
+
+            self.n_fft = int(sampling_rate * frame_length * 1000 * 0.001)
+            self.hop_length = int(sampling_rate * frame_stride * 1000 * 0.001)
+            self.padded_n_fft = 1 << (self.n_fft - 1).bit_length()
+            window = torch.hann_window(self.n_fft, periodic=False, dtype=torch.float64).pow(0.85)
+            mel_basis, _ = kaldi.get_mel_banks(n_dim, self.padded_n_fft, float(sampling_rate), 20.0, 0.0,
+                                               100.0, -500.0, 1.0)
+            mel_basis = F.pad(mel_basis, (0, 1), mode='constant', value=0)
+
+        else:
+            self.n_fft = int(round(sampling_rate * frame_length))
+            self.hop_length = int(round(sampling_rate * frame_stride))
+            self.padded_n_fft = self.n_fft
+            self.pad_mode = inspect.signature(librosa.stft).parameters['pad_mode'].default
+
+            if feature_extraction == 'spectrogram':
+                window = torch.hamming_window(self.n_fft, periodic=False, dtype=torch.float64)
+            else:
+                window = torch.hann_window(self.n_fft, periodic=True, dtype=torch.float64)
+
+            if feature_extraction == 'melspectrogram':
+                mel_basis = librosa.filters.mel(sr=sampling_rate, n_fft=self.n_fft, n_mels=n_dim)
+            elif feature_extraction == 'mfcc':
+                mel_basis = librosa.filters.mel(sr=sampling_rate, n_fft=self.n_fft, n_mels=128)
+                self.register_buffer('dct_matrix', self._dct_matrix(n_dim, 128))
+
+        self.register_buffer('window', window.float())
+        if feature_extraction != 'spectrogram':
+            self.register_buffer('mel_basis', torch.as_tensor(mel_basis, dtype=torch.float32))
+
+    @staticmethod
+    def _dct_matrix(n_mfcc: int, n_mels: int) -> Tensor:
+        """ Orthonormal DCT-II matrix, same as scipy.fftpack.dct(type=2, norm='ortho') used by librosa """
+        n = np.arange(n_mels)
+        k = np.arange(n_mfcc)[:, None]
+        dct_matrix = np.cos(np.pi / n_mels * (n + 0.5) * k) * np.sqrt(2.0 / n_mels)
+        dct_matrix[0] *= np.sqrt(0.5)
+
+        return torch.as_tensor(dct_matrix, dtype=torch.float32)
+
+    def get_feature_lengths(self, sound_lengths: Tensor) -> Tensor:
+        if self.feature_extraction == 'filterbank':  # kaldi snip_edges
+            return torch.clamp((sound_lengths - self.n_fft) // self.hop_length + 1, min=0)
+
+        return sound_lengths // self.hop_length + 1  # librosa center
+
+    def frame(self, sounds: Tensor, sound_lengths: Tensor) -> Tensor:
+        """ Splits padded waveforms into frames, (batch, num_samples) => (batch, seq_len, n_fft) """
+        num_samples = sounds.size(1)
+        positions = torch.arange(num_samples, device=sounds.device)
+        sounds = sounds.masked_fill(positions.unsqueeze(0) >= sound_lengths.unsqueeze(1), 0)
+
+        if self.feature_extraction != 'filterbank':
+            pad = self.n_fft // 2
+
+            if self.pad_mode == 'reflect':
+                positions = torch.arange(-pad, num_samples + pad, device=sounds.device).abs().unsqueeze(0)
+                last = (sound_lengths - 1).unsqueeze(1)
+                positions = torch.where(positions > last, 2 * last - positions, positions)
+                sounds = sounds.gather(1, positions.clamp(0, num_samples - 1).expand(sounds.size(0), -1))
+            else:
+                sounds = F.pad(sounds, (pad, pad))
+
+        if sounds.size(1) < self.n_fft:
+            sounds = F.pad(sounds, (0, self.n_fft - sounds.size(1)))
+
+        return sounds.unfold(1, self.n_fft, self.hop_length)
+
+    def spectrum(self, frames: Tensor) -> Tensor:
+        """ Magnitude spectrum of frames, (batch, seq_len, n_fft) => (batch, seq_len, n_fft // 2 + 1) """
+        if self.feature_extraction == 'filterbank':
+            frames = frames - frames.mean(dim=-1, keepdim=True)
+            frames = frames - 0.97 * torch.cat((frames[..., :1], frames[..., :-1]), dim=-1)
+
+        frames = frames * self.window
+
+        return torch.fft.rfft(frames, n=self.padded_n_fft).abs()
+
+    def project(self, spectrum: Tensor) -> Tensor:
+        """ Feature before top_db clipping, (batch, seq_len, D) magnitude spectrum => (batch, n_dim, seq_len) """
+        if self.feature_extraction == 'spectrogram':
+            return torch.log1p(spectrum).transpose(1, 2)
+
+        mel = torch.matmul(spectrum.pow(2), self.mel_basis.t()).transpose(1, 2)
+
+        if self.feature_extraction == 'filterbank':
+            return torch.log(torch.clamp(mel, min=torch.finfo(torch.float32).eps))
+        elif self.feature_extraction == 'melspectrogram':
+            return 20.0 * torch.log10(torch.clamp(mel, min=1e-5))  # librosa.amplitude_to_db
+        elif self.feature_extraction == 'mfcc':
+            return 10.0 * torch.log10(torch.clamp(mel, min=1e-10))  # librosa.power_to_db
+
+    def clip(self, features: Tensor, mask: Tensor) -> Tensor:
+        """ Applies top_db clipping, relative to ref_db or to the maximum of each utterance as librosa """
+        if self.feature_extraction in ('melspectrogram', 'mfcc') and self.top_db is not None:
+            if self.ref_db is not None:
+                features = torch.clamp(features, min=self.ref_db - self.top_db)
+            else:
+                max_db = features.masked_fill(~mask, float('-inf')).amax(dim=(1, 2), keepdim=True)
+                features = torch.max(features, max_db - self.top_db)
+
+        if self.feature_extraction == 'mfcc':
+            features = torch.matmul(self.dct_matrix, features)
+
+        return features
+
+    def forward(
+            self,
+            sounds: Tensor,
+            sound_lengths: Tensor,
+            normalize: bool = False,
+    ) -> Tuple[Tensor, Tensor]:
+        sound_lengths = sound_lengths.to(sounds.device).long()
+        feature_lengths = self.get_feature_lengths(sound_lengths)
+
+        frames = self.frame(sounds.float(), sound_lengths)
+        features = self.project(self.spectrum(frames))  # (B, D, T)
+
+        mask = torch.arange(features.size(2), device=features.device) < feature_lengths.unsqueeze(1)
+        mask = mask.unsqueeze(1)  # (B, 1, T)
+
+        features = self.clip(features, mask)
+        features = features.masked_fill(~mask, 0)
+
+        if normalize:
+            num_elements = (feature_lengths * features.size(1)).clamp(min=1).view(-1, 1, 1)
+            mean = features.sum(dim=(1, 2), keepdim=True) / num_elements
+            std = ((features - mean).masked_fill(~mask, 0).pow(2).sum(dim=(1, 2), keepdim=True) / num_elements).sqrt()
+            features = ((features - mean) / std).masked_fill(~mask, 0)
+
+        return features, feature_lengths.int()
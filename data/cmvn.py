@@ -0,0 +1,111 @@
+# MIT License
+#
+# Copyright (c) 2021 Sangchun Ha
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+import numpy as np
+import torch
+from torch import Tensor
+from multiprocessing import Pool
+from typing import Tuple
+
+_dataset = None
+
+
+def _init_worker(dataset) -> None:
+    global _dataset
+    _dataset = dataset
+
+
+def _accumulate(indices: list) -> Tuple[int, np.ndarray, np.ndarray]:
+    count = 0
+    total = 0.0
+    total_square = 0.0
+
+    for idx in indices:
+        feature = _dataset[idx][0].numpy().astype(np.float64)  # (D, T)
+        count += feature.shape[1]
+        total = total + feature.sum(axis=1)
+        total_square = total_square + np.square(feature).sum(axis=1)
+
+    return count, total, total_square
+
+
+def compute_cmvn_stats(
+        dataset,
+        num_workers: int = 4,
+        chunk_size: int = 256,
+) -> Tuple[np.ndarray, np.ndarray, int]:
+    """
+    Computes per-dimension global mean and standard deviation of features in one streaming pass
+
+    Args:
+        dataset (SpectrogramDataset): dataset without normalize and spec augment
+        num_workers (int): the number of worker processes (default: 4)
+        chunk_size (int): the number of utterances accumulated by a worker per task (default: 256)
+
+    Returns: mean, std, count
+        - **mean** (np.ndarray): mean of each dimension
+        - **std** (np.ndarray): standard deviation of each dimension
+        - **count** (int): the number of frames
+    """
+    chunks = [list(range(begin, min(begin + chunk_size, len(dataset))))
+              for begin in range(0, len(dataset), chunk_size)]
+    count = 0
+    total = 0.0
+    total_square = 0.0
+
+    with Pool(num_workers, initializer=_init_worker, initargs=(dataset,)) as pool:
+        results = pool.imap_unordered(_accumulate, chunks)
+
+        for chunk_idx, (chunk_count, chunk_total, chunk_total_square) in enumerate(results):
+            count += chunk_count
+            total = total + chunk_total
+            total_square = total_square + chunk_total_square
+
+            if chunk_idx % 100 == 0:
+                print('{} / {} chunks'.format(chunk_idx, len(chunks)))
+
+    mean = total / count
+    std = np.sqrt(np.maximum(total_square / count - np.square(mean), 1e-20))
+
+    return mean, std, count
+
+
+class GlobalCMVN(object):
+    """
+    Normalizes a padded batch with global statistics as a fused affine transform, feature * scale + shift.
+    Padding frames stay zero.
+
+    Args:
+        cmvn_path (str): path of the statistics written by compute_cmvn.py
+
+    Inputs: features, feature_lengths
+        - **features** (batch, dimension, seq_len): padded features
+        - **feature_lengths** (batch): valid length of each feature
+
+    Returns: features
+        - **features** (batch, dimension, seq_len): normalized features
+    """
+    def __init__(self, cmvn_path: str) -> None:
+        stats = np.load(cmvn_path)
+        scale = 1.0 / np.maximum(stats['std'], 1e-10)
+
+        self.scale = torch.as_tensor(scale, dtype=torch.float32).unsqueeze(1)  # (D, 1)
+        self.shift = torch.as_tensor(-stats['mean'] * scale, dtype=torch.float32).unsqueeze(1)  # (D, 1)
+
+    def __call__(self, features: Tensor, feature_lengths: Tensor) -> Tensor:
+        if self.scale.device != features.device:
+            self.scale = self.scale.to(features.device)
+            self.shift = self.shift.to(features.device)
+
+        mask = torch.arange(features.size(2), device=features.device) < feature_lengths.to(features.device).unsqueeze(1)
+        features = torch.addcmul(self.shift, features, self.scale)
+
+        return features.masked_fill_(~mask.unsqueeze(1), 0)
@@ -11,14 +11,21 @@
 
 import torch
 import os
+import glob
+import zlib
+import random
+import warnings
 import numpy as np
-import librosa
 
 from torch import Tensor
-from typing import Tuple
-from torch.utils.data import Dataset, DataLoader, Sampler
+from typing import Tuple, Union
+from torch.utils.data import Dataset, IterableDataset, DataLoader, Sampler, get_worker_info
 from torch.nn.utils.rnn import pad_sequence
-from data.specaugment import SpecAugment
+from data.specaugment import SpecAugment, BatchSpecAugment
+from data.feature_cache import FeatureCache
+from data.packed_corpus import PackedCorpus
+from data.cmvn import GlobalCMVN
+from data.wav import load_wav, read_wav_header
 from data.feature import (
     Spectrogram,
     MelSpectrogram,
@@ -34,9 +41,60 @@ def load_audio(path: str, extension: str = 'pcm', sampling_rate: int = 16000) ->
         return sound / 32767
 
     elif extension == 'wav':
-        sound, _ = librosa.load(path, sr=sampling_rate)
+        return load_wav(path, sampling_rate)
 
-        return sound
+
+def get_audio_length(path: str, extension: str = 'pcm', sampling_rate: int = 16000) -> int:
+    """ Returns the number of samples of an audio file without decoding it """
+    if extension == 'pcm':
+        return os.path.getsize(path) // 2
+
+    elif extension == 'wav':
+        header = read_wav_header(path)
+
+        return int(header.num_frames * sampling_rate / header.sampling_rate)
+
+
+def get_feature_lengths(
+        default_audio_path: str,
+        audio_paths: list,
+        extension: str = 'pcm',
+        sampling_rate: int = 16000,
+        frame_stride: float = 0.010,
+) -> np.ndarray:
+    """ Returns the number of feature frames of each audio file, derived from the audio length """
+    hop_length = int(round(sampling_rate * frame_stride))
+
+    if hasattr(audio_paths, 'audio_lengths'):  # binary manifest already holds the audio lengths
+        return audio_paths.audio_lengths // hop_length + 1
+
+    feature_lengths = np.empty(len(audio_paths), dtype=np.int64)
+
+    for idx, audio_path in enumerate(audio_paths):
+        audio_length = get_audio_length(os.path.join(default_audio_path, audio_path), extension, sampling_rate)
+        feature_lengths[idx] = audio_length // hop_length + 1
+
+    return feature_lengths
+
+
+def build_feature_extractor(
+        feature_extraction: str = 'melspectrogram',
+        sampling_rate: int = 16000,
+        n_dim: int = 80,
+        frame_length: float = 0.020,
+        frame_stride: float = 0.010,
+):
+    n_fft = int(round(sampling_rate * frame_length))
+    hop_length = int(round(sampling_rate * frame_stride))
+
+    if feature_extraction == 'spectrogram':
+        return Spectrogram(n_fft, hop_length)
+    elif feature_extraction == 'melspectrogram':
+        return MelSpectrogram(n_fft, hop_length, sampling_rate, n_dim)
+    elif feature_extraction == 'mfcc':
+        return MFCC(n_fft, hop_length, sampling_rate, n_dim)
+    elif feature_extraction == 'filterbank':
+        return FilterBank(frame_length, frame_stride, sampling_rate, n_dim)
 
 
 class SpectrogramDataset(Dataset, object):
@@ -58,6 +116,8 @@ class SpectrogramDataset(Dataset, object):
             num_freq_mask: int = 1,
             sos_id: int = 1,
             eos_id: int = 2,
+            feature_cache_path: str = None,
+            corpus_path: str = None,
     ) -> None:
         super(SpectrogramDataset, self).__init__()
         self.default_audio_path = default_audio_path
@@ -70,33 +130,58 @@ class SpectrogramDataset(Dataset, object):
         self.normalize = normalize
         self.spec_augment = spec_augment
         self.specaugment = SpecAugment(freq_mask_parameter, num_freq_mask, num_time_mask)
-        n_fft = int(round(sampling_rate * frame_length))
-        hop_length = int(round(sampling_rate * frame_stride))
-
-        if feature_extraction == 'spectrogram':
-            self.feature_extractor = Spectrogram(n_fft, hop_length)
-        elif feature_extraction == 'melspectrogram':
-            self.feature_extractor = MelSpectrogram(n_fft, hop_length, sampling_rate, n_dim)
-        elif feature_extraction == 'mfcc':
-            self.feature_extractor = MFCC(n_fft, hop_length, sampling_rate, n_dim)
-        elif feature_extraction == 'filterbank':
-            self.feature_extractor = FilterBank(frame_length, frame_stride, sampling_rate, n_dim)
+        self.feature_extractor = build_feature_extractor(feature_extraction, sampling_rate, n_dim, frame_length,
+                                                         frame_stride)
+
+        self.feature_cache = None
+        if feature_cache_path:
+            self.feature_cache = FeatureCache(
+                feature_cache_path,
+                feature_extraction,
+                n_dim,
+                frame_length,
+                frame_stride,
+                normalize,
+                sampling_rate,
+            )
+
+        self.packed_corpus = PackedCorpus(corpus_path) if corpus_path else None
+
+    def load_sound(self, path: str) -> np.ndarray:
+        if self.packed_corpus is not None:
+            sound = self.packed_corpus.read(os.path.relpath(path, self.default_audio_path))
+            return sound.astype('float32') / 32767
+
+        return load_audio(path, self.extension, self.sampling_rate)
 
     def parse_audio(self, path: str) -> torch.FloatTensor:
-        sound = load_audio(path, self.extension, self.sampling_rate)
+        feature = None
+
+        if self.feature_cache is not None:
+            feature = self.feature_cache.get(path)
+
+        if feature is None:
+            sound = self.load_sound(path)
 
-        if sound is None:
-            print('Audio is None !!!')
-            return None
+            if sound is None:
+                print('Audio is None !!!')
+                return None
 
-        feature = self.feature_extractor(sound, self.normalize)
+            feature = self.feature_extractor(sound, self.normalize)
+
+            if self.feature_cache is not None:
+                self.feature_cache.put(path, feature)
 
         if self.spec_augment:
             feature = self.specaugment(feature)
 
         return feature
 
-    def parse_transcript(self, transcript: str) -> torch.LongTensor:
+    def parse_transcript(self, transcript: Union[str, np.ndarray]) -> torch.LongTensor:
+        if isinstance(transcript, np.ndarray):  # pre-tokenized transcript of binary manifest
+            transcript = np.concatenate(([self.sos_id], transcript, [self.eos_id])).astype(np.int64)
+            return torch.from_numpy(transcript)
+
         transcript = list(map(int, transcript.split()))
         transcript = [self.sos_id] + transcript + [self.eos_id]
         transcript = torch.LongTensor(transcript)
@@ -113,6 +198,186 @@ class SpectrogramDataset(Dataset, object):
         return len(self.audio_paths)
 
 
+def write_shards(
+        default_audio_path: str,
+        audio_paths: list,
+        transcript_list: list,
+        shard_path: str,
+        utterances_per_shard: int = 1000,
+        extension: str = 'pcm',
+        sampling_rate: int = 16000,
+) -> int:
+    """
+    Converts audio files and transcripts into shard files read by ShardedSpectrogramDataset.
+    Each shard holds the int16 audio and token ids of its utterances in flat arrays with offsets.
+
+    Returns: num_shards
+        - **num_shards** (int): the number of shards written to shard_path
+    """
+    os.makedirs(shard_path, exist_ok=True)
+    num_shards = 0
+
+    for begin in range(0, len(audio_paths), utterances_per_shard):
+        sounds = list()
+        transcripts = list()
+
+        for idx in range(begin, min(begin + utterances_per_shard, len(audio_paths))):
+            path = os.path.join(default_audio_path, audio_paths[idx])
+
+            if extension == 'pcm':
+                sounds.append(np.fromfile(path, dtype='h'))
+            else:
+                sounds.append(np.round(load_audio(path, extension, sampling_rate) * 32767).astype('h'))
+
+            transcript = transcript_list[idx]
+            if isinstance(transcript, str):
+                transcript = list(map(int, transcript.split()))
+            transcripts.append(np.asarray(transcript, dtype=np.int32))
+
+        np.savez(
+            os.path.join(shard_path, 'shard-{:05d}.npz'.format(num_shards)),
+            audio=np.concatenate(sounds),
+            audio_offsets=np.cumsum([0] + [len(sound) for sound in sounds]),
+            tokens=np.concatenate(transcripts),
+            token_offsets=np.cumsum([0] + [len(transcript) for transcript in transcripts]),
+        )
+        num_shards += 1
+
+    return num_shards
+
+
+class ShardedSpectrogramDataset(IterableDataset, object):
+    """
+    Streams utterances from shard files written by write_shards. Shards are read sequentially and split
+    across distributed ranks and DataLoader workers, and samples pass through a bounded shuffle buffer.
+    Shards are dealt to ranks round robin, so ranks get the same number of samples when the number of shards is
+    a multiple of world_size and shards are full (write_shards fills all but the last). Each DataLoader worker reads
+    whole shards, so at least world_size * num_workers shards are needed to keep every worker busy.
+    Yields the same (feature, transcript) samples as SpectrogramDataset, so it works with AudioDataLoader.
+
+    Args:
+        shard_path (str): directory of shard files
+        shuffle_buffer_size (int): number of samples held in the shuffle buffer, 0 means no shuffle
+        seed (int): seed of shard order and shuffle buffer
+        The other arguments are the same as SpectrogramDataset.
+    """
+    def __init__(
+            self,
+            shard_path: str,
+            sampling_rate: int = 16000,
+            n_dim: int = 80,
+            frame_length: float = 0.020,
+            frame_stride: float = 0.010,
+            feature_extraction: str = 'melspectrogram',
+            normalize: bool = True,
+            spec_augment: bool = True,
+            freq_mask_parameter: int = 18,
+            num_time_mask: int = 1,
+            num_freq_mask: int = 1,
+            sos_id: int = 1,
+            eos_id: int = 2,
+            shuffle_buffer_size: int = 1000,
+            seed: int = 0,
+    ) -> None:
+        super(ShardedSpectrogramDataset, self).__init__()
+        self.shard_paths = sorted(glob.glob(os.path.join(shard_path, 'shard-*.npz')))
+        self.sos_id = sos_id
+        self.eos_id = eos_id
+        self.normalize = normalize
+        self.spec_augment = spec_augment
+        self.specaugment = SpecAugment(freq_mask_parameter, num_freq_mask, num_time_mask)
+        self.feature_extractor = build_feature_extractor(feature_extraction, sampling_rate, n_dim, frame_length,
+                                                         frame_stride)
+        self.shuffle_buffer_size = shuffle_buffer_size
+        self.seed = seed
+        self.epoch = 0
+        self.num_utterances = None
+
+    def set_epoch(self, epoch: int) -> None:
+        self.epoch = epoch
+
+    @staticmethod
+    def get_rank() -> Tuple[int, int]:
+        if torch.distributed.is_available() and torch.distributed.is_initialized():
+            return torch.distributed.get_rank(), torch.distributed.get_world_size()
+        return 0, 1
+
+    def get_rank_shard_paths(self) -> list:
+        """ Shards of this rank, fixed across epochs so every rank knows its length """
+        rank, world_size = self.get_rank()
+
+        if len(self.shard_paths) < world_size:
+            raise ValueError('{} shards can not be split over {} ranks, write at least one shard per rank'.format(
+                len(self.shard_paths), world_size))
+
+        return self.shard_paths[rank::world_size]
+
+    def get_shard_paths(self) -> list:
+        """ Shards of this rank and DataLoader worker, in the order of the epoch """
+        worker_info = get_worker_info()
+        worker_id, num_workers = (0, 1) if worker_info is None else (worker_info.id, worker_info.num_workers)
+
+        shard_paths = self.get_rank_shard_paths()
+        if len(shard_paths) < num_workers:
+            warnings.warn('{} shards for {} DataLoader workers, {} workers get no data. '
+                          'Write at least world_size * num_workers shards.'.format(
+                              len(shard_paths), num_workers, num_workers - len(shard_paths)))
+
+        if self.shuffle_buffer_size > 0:
+            shard_paths = list(shard_paths)
+            random.Random(self.seed + self.epoch).shuffle(shard_paths)
+
+        return shard_paths[worker_id::num_workers]
+
+    def read_shard(self, shard_path: str):
+        with np.load(shard_path) as shard:
+            audio = shard['audio']
+            audio_offsets = shard['audio_offsets']
+            tokens = shard['tokens']
+            token_offsets = shard['token_offsets']
+
+        for idx in range(len(audio_offsets) - 1):
+            sound = audio[audio_offsets[idx]:audio_offsets[idx + 1]].astype('float32') / 32767
+            feature = self.feature_extractor(sound, self.normalize)
+
+            if self.spec_augment:
+                feature = self.specaugment(feature)
+
+            transcript = tokens[token_offsets[idx]:token_offsets[idx + 1]]
+            transcript = np.concatenate(([self.sos_id], transcript, [self.eos_id]))
+
+            yield feature, torch.from_numpy(transcript.astype(np.int64))
+
+    def __iter__(self):
+        worker_info = get_worker_info()
+        worker_id = 0 if worker_info is None else worker_info.id
+        generator = random.Random(hash((self.seed, self.epoch, worker_id)))
+        buffer = list()
+
+        for shard_path in self.get_shard_paths():
+            for sample in self.read_shard(shard_path):
+                buffer.append(sample)
+
+                if len(buffer) > self.shuffle_buffer_size:
+                    idx = generator.randrange(len(buffer))
+                    buffer[idx], buffer[-1] = buffer[-1], buffer[idx]
+                    yield buffer.pop()
+
+        generator.shuffle(buffer)
+        for sample in buffer:
+            yield sample
+
+    def __len__(self) -> int:
+        """ Utterances of this rank """
+        if self.num_utterances is None:
+            self.num_utterances = 0
+            for shard_path in self.get_rank_shard_paths():
+                with np.load(shard_path) as shard:
+                    self.num_utterances += len(shard['audio_offsets']) - 1
+
+        return self.num_utterances
+
+
 def _collate_fn(batch) -> Tuple[Tensor, Tensor, Tensor, Tensor]:
     batch = sorted(batch, key=lambda sample: sample[0].shape[1], reverse=True)
 
@@ -133,10 +398,146 @@ def _collate_fn(batch) -> Tuple[Tensor, Tensor, Tensor, Tensor]:
     return pad_seqs, pad_targets, seq_lengths, target_lengths
 
 
+class BufferedCollate(object):
+    """
+    Collates a batch by writing each sample straight into a preallocated (B, D, T) buffer and target buffer.
+    Gives the same tensors as _collate_fn, but the features are contiguous in (B, D, T) layout.
+
+    With reuse, buffers are kept in a ring of num_buffers + 1 and only grow when a larger batch arrives,
+    so a batch stays valid while the next num_buffers batches are collated. Reuse is only safe in the process
+    that consumes the batches, DataLoader workers hand their batches over through shared memory.
+
+    Args:
+        reuse (bool): flag indication reuse buffers or allocate one per batch (default: True)
+        pin_memory (bool): flag indication allocate reused buffers in pinned memory (default: False)
+        num_buffers (int): the number of batches collated before the buffer of a batch is reused (default: 3)
+    """
+    def __init__(
+            self,
+            reuse: bool = True,
+            pin_memory: bool = False,
+            num_buffers: int = 3,
+    ) -> None:
+        self.reuse = reuse
+        self.pin_memory = pin_memory
+        self.num_buffers = num_buffers
+        self.buffers = [dict() for _ in range(num_buffers + 1)]
+        self.step = 0
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state['buffers'] = [dict() for _ in range(self.num_buffers + 1)]
+        return state
+
+    def _get_buffer(self, name: str, numel: int, dtype: torch.dtype) -> Tensor:
+        if not self.reuse:
+            return torch.empty(numel, dtype=dtype)
+
+        buffers = self.buffers[self.step % len(self.buffers)]
+        buffer = buffers.get(name)
+
+        if buffer is None or buffer.numel() < numel:
+            buffer = torch.empty(numel, dtype=dtype, pin_memory=self.pin_memory)
+            buffers[name] = buffer
+
+        return buffer[:numel]
+
+    def __call__(self, batch) -> Tuple[Tensor, Tensor, Tensor, Tensor]:
+        batch = sorted(batch, key=lambda sample: sample[0].shape[1], reverse=True)
+
+        seq_lengths = torch.IntTensor([data[0].size(1) for data in batch])
+        target_lengths = torch.IntTensor([len(data[1]) for data in batch])
+
+        batch_size, n_dim, max_seq_length = len(batch), batch[0][0].size(0), batch[0][0].size(1)
+        max_target_length = int(target_lengths.max())
+
+        pad_seqs = self._get_buffer('seqs', batch_size * n_dim * max_seq_length, batch[0][0].dtype)
+        pad_seqs = pad_seqs.view(batch_size, n_dim, max_seq_length)  # (B, D, T)
+        pad_targets = self._get_buffer('targets', batch_size * max_target_length, batch[0][1].dtype)
+        pad_targets = pad_targets.view(batch_size, max_target_length)  # (B, T)
+
+        for idx, (seq, target) in enumerate(batch):
+            pad_seqs[idx, :, :seq.size(1)].copy_(seq)
+            pad_seqs[idx, :, seq.size(1):].zero_()
+            pad_targets[idx, :len(target)].copy_(target)
+            pad_targets[idx, len(target):].zero_()
+
+        self.step += 1
+
+        return pad_seqs, pad_targets, seq_lengths, target_lengths
+
+
+class BatchCollate(object):
+    """
+    Collates a batch, then applies global CMVN and BatchSpecAugment to the padded features.
+    The SpecAugment seed of each batch is derived from the seed, the epoch and the batch content,
+    so the masks are the same for any number of DataLoader workers.
+
+    Args:
+        collate_fn (callable): function that collates the batch (default: _collate_fn)
+        cmvn (GlobalCMVN): global CMVN instance, if None, not applied (default: None)
+        spec_augment (BatchSpecAugment): batch SpecAugment instance, if None, not applied (default: None)
+        seed (int): base seed of the masks (default: 0)
+    """
+    def __init__(
+            self,
+            collate_fn=_collate_fn,
+            cmvn: GlobalCMVN = None,
+            spec_augment: BatchSpecAugment = None,
+            seed: int = 0,
+    ) -> None:
+        self.collate_fn = collate_fn
+        self.cmvn = cmvn
+        self.spec_augment = spec_augment
+        self.seed = seed
+        self.epoch = 0
+
+    def get_seed(self, targets: Tensor, seq_lengths: Tensor) -> int:
+        digest = zlib.crc32(targets.numpy().tobytes())
+        digest = zlib.crc32(seq_lengths.numpy().tobytes(), digest)
+
+        return hash((self.seed, self.epoch, digest)) & 0x7FFFFFFFFFFFFFFF
+
+    def __call__(self, batch) -> Tuple[Tensor, Tensor, Tensor, Tensor]:
+        pad_seqs, pad_targets, seq_lengths, target_lengths = self.collate_fn(batch)
+
+        if self.cmvn is not None:
+            pad_seqs = self.cmvn(pad_seqs, seq_lengths)
+
+        if self.spec_augment is not None:
+            pad_seqs = self.spec_augment(pad_seqs, seq_lengths, self.get_seed(pad_targets, seq_lengths))
+
+        return pad_seqs, pad_targets, seq_lengths, target_lengths
+
+
 class AudioDataLoader(DataLoader, object):
-    def __init__(self, *args, **kwargs) -> None:
+    def __init__(
+            self,
+            *args,
+            spec_augment: BatchSpecAugment = None,
+            seed: int = 0,
+            preallocate: bool = False,
+            cmvn: GlobalCMVN = None,
+            num_buffers: int = 3,
+            **kwargs,
+    ) -> None:
         super(AudioDataLoader, self).__init__(*args, **kwargs)
-        self.collate_fn = _collate_fn
+        collate_fn = _collate_fn
+
+        if preallocate:  # buffers are only reused when batches are collated in this process
+            reuse = self.num_workers == 0
+            collate_fn = BufferedCollate(reuse, reuse and torch.cuda.is_available(), num_buffers)
+
+        if spec_augment is not None or cmvn is not None:
+            collate_fn = BatchCollate(collate_fn, cmvn, spec_augment, seed)
+
+        self.collate_fn = collate_fn
+
+    def set_epoch(self, epoch: int) -> None:
+        if isinstance(self.collate_fn, BatchCollate):
+            self.collate_fn.epoch = epoch
+        if isinstance(self.dataset, ShardedSpectrogramDataset):
+            self.dataset.set_epoch(epoch)
 
 
 class BucketingSampler(Sampler, object):
@@ -152,3 +553,90 @@ class BucketingSampler(Sampler, object):
 
     def __len__(self) -> int:
         return len(self.buckets)
+
+
+class DynamicBucketingSampler(Sampler, object):
+    """
+    Groups utterances of similar length into buckets and forms batches under a budget of padded frames
+
+    Args:
+        feature_lengths (list): number of feature frames of each utterance
+        max_frames (int): maximum number of padded frames (batch size * longest length) in a batch
+        num_buckets (int): number of length buckets, utterances are shuffled within a bucket and sorted by length
+            within chunks of about one batch (default: 10)
+        max_batch_size (int): maximum number of utterances in a batch, 0 means no limit (default: 0)
+        shuffle (bool): flag indication shuffle or not (default: True)
+    """
+    def __init__(
+            self,
+            feature_lengths: list,
+            max_frames: int,
+            num_buckets: int = 10,
+            max_batch_size: int = 0,
+            shuffle: bool = True,
+    ) -> None:
+        self.feature_lengths = np.asarray(feature_lengths, dtype=np.int64)
+        self.max_frames = max_frames
+        self.max_batch_size = max_batch_size
+        self.shuffle = shuffle
+
+        sorted_indices = np.argsort(self.feature_lengths, kind='stable')
+        self.buckets = [bucket for bucket in np.array_split(sorted_indices, num_buckets) if len(bucket) > 0]
+        self.batches = self._make_batches()
+
+    def _make_batches(self) -> list:
+        batches = list()
+
+        for bucket in self.buckets:
+            if self.shuffle:
+                # sorting the whole bucket would undo the shuffle, so only chunks of about one batch are sorted
+                bucket = bucket[np.random.permutation(len(bucket))]
+                chunk_size = self.max_batch_size or max(self.max_frames // int(self.feature_lengths[bucket].max()), 1)
+                bucket = np.concatenate([
+                    chunk[np.argsort(self.feature_lengths[chunk], kind='stable')]
+                    for chunk in np.array_split(bucket, max(len(bucket) // chunk_size, 1))
+                ])
+
+            batch = list()
+            max_length = 0
+
+            for idx in bucket.tolist():
+                length = max(max_length, self.feature_lengths[idx])
+                batch_full = self.max_batch_size and len(batch) >= self.max_batch_size
+
+                if batch and (length * (len(batch) + 1) > self.max_frames or batch_full):
+                    batches.append(batch)
+                    batch = list()
+                    length = self.feature_lengths[idx]
+
+                batch.append(idx)
+                max_length = length
+
+            if batch:
+                batches.append(batch)
+
+        if self.shuffle:
+            batches = [batches[idx] for idx in np.random.permutation(len(batches))]
+
+        return batches
+
+    def padding_efficiency(self) -> float:
+        """ Ratio of real frames to padded frames over the batches of the current epoch """
+        total_frames = 0
+        total_padded_frames = 0
+
+        for batch in self.batches:
+            lengths = self.feature_lengths[batch]
+            total_frames += lengths.sum()
+            total_padded_frames += lengths.max() * len(batch)
+
+        return float(total_frames) / max(float(total_padded_frames), 1.0)
+
+    def __iter__(self):
+        for batch in self.batches:
+            yield batch
+
+        self.batches = self._make_batches()
+
+    def __len__(self) -> int:
+        return len(self.batches)
@@ -108,9 +108,10 @@ class FilterBank(object):
         self.frame_stride = frame_stride * 1000
         self.sampling_rate = sampling_rate
         self.n_mel = n_mel
-        import torchaudio
 
     def __call__(self, sound: np.ndarray, normalize: bool):
+        import torchaudio
+
         filter_bank = torchaudio.compliance.kaldi.fbank(
             Tensor(sound).unsqueeze(0),
             num_mel_bins=self.n_mel,
@@ -123,6 +124,6 @@ class FilterBank(object):
 
         if normalize:
             filter_bank -= filter_bank.mean()
-            filter_bank /= np.std(filter_bank)
+            filter_bank /= filter_bank.std(unbiased=False)
 
         return filter_bank
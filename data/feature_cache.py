@@ -0,0 +1,179 @@
+# MIT License
+#
+# Copyright (c) 2021 Sangchun Ha
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+import os
+import glob
+import json
+import uuid
+import hashlib
+import numpy as np
+import torch
+from typing import Optional
+
+
+class FeatureCache(object):
+    """
+    Persistent cache of pre-augmentation feature matrices stored in sharded memory-mapped files.
+
+    Features live under a sub directory named after a hash of the feature config, so changing any of the
+    fields below starts a new cache instead of reading stale features.
+    Every process appends to its own shards and index file, which keeps DataLoader workers from
+    writing into the same file.
+
+    Args:
+        cache_dir (str): root directory of the cache
+        feature_extraction (str): type of feature (spectrogram, melspectrogram, mfcc, filterbank)
+        n_dim (int): dimension of feature (n_mel or n_mfcc)
+        frame_length (float): frame length in seconds
+        frame_stride (float): frame stride in seconds
+        normalize (bool): flag indication normalize or not
+        sampling_rate (int): sampling rate of audio (default: 16000)
+        dtype (str): dtype of stored features, float32 or float16, ignored if the cache exists (default: float32)
+        shard_size (int): maximum number of bytes written to a single shard (default: 1 GiB)
+
+    Inputs: path
+        - **path** (str): audio path used as key of the feature
+    """
+    def __init__(
+            self,
+            cache_dir: str,
+            feature_extraction: str,
+            n_dim: int,
+            frame_length: float,
+            frame_stride: float,
+            normalize: bool,
+            sampling_rate: int = 16000,
+            dtype: str = 'float32',
+            shard_size: int = 1 << 30,
+    ) -> None:
+        feature_config = {
+            'feature_extraction': feature_extraction,
+            'n_dim': int(n_dim),
+            'frame_length': float(frame_length),
+            'frame_stride': float(frame_stride),
+            'normalize': bool(normalize),
+            'sampling_rate': int(sampling_rate),
+        }
+        config_key = hashlib.sha1(json.dumps(feature_config, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+        self.cache_dir = os.path.join(cache_dir, config_key)
+        self.dtype = np.dtype(dtype)
+        self.shard_size = shard_size
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        config_path = os.path.join(self.cache_dir, 'config.json')
+        if os.path.exists(config_path):  # an existing cache keeps the dtype it was written with
+            with open(config_path) as f:
+                self.dtype = np.dtype(json.load(f)['dtype'])
+        else:
+            with open(config_path, 'w') as f:
+                json.dump(dict(feature_config, dtype=self.dtype.name), f, indent=2)
+
+        self._reset()
+
+    def _reset(self) -> None:
+        self.index = None
+        self.shards = dict()
+        self.writer_id = None
+        self.shard_file = None
+        self.shard_name = None
+        self.shard_count = 0
+        self.index_file = None
+
+    def __getstate__(self) -> dict:
+        # index, memmaps and file handles are opened again in each DataLoader worker
+        state = self.__dict__.copy()
+        for key in ('index', 'shards', 'writer_id', 'shard_file', 'shard_name', 'shard_count', 'index_file'):
+            state.pop(key)
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._reset()
+
+    def __contains__(self, path: str) -> bool:
+        return path in self._load_index()
+
+    def __len__(self) -> int:
+        return len(self._load_index())
+
+    def _load_index(self) -> dict:
+        if self.index is None:
+            self.index = dict()
+            shard_sizes = dict()
+
+            for index_path in sorted(glob.glob(os.path.join(self.cache_dir, 'index-*.tsv'))):
+                with open(index_path, encoding='utf-8') as f:
+                    for line in f:
+                        fields = line.rstrip('\n').split('\t')
+                        # the last line of an interrupted writer can be cut anywhere, even inside n_frames
+                        if not line.endswith('\n') or len(fields) != 5:
+                            continue
+                        path, shard_name, offset, n_dim, n_frames = fields
+                        offset, n_dim, n_frames = int(offset), int(n_dim), int(n_frames)
+
+                        if shard_name not in shard_sizes:
+                            shard_path = os.path.join(self.cache_dir, shard_name)
+                            shard_size = os.path.getsize(shard_path) if os.path.exists(shard_path) else 0
+                            shard_sizes[shard_name] = shard_size // self.dtype.itemsize
+                        if offset + n_dim * n_frames > shard_sizes[shard_name]:  # feature was never fully written
+                            continue
+
+                        self.index[path] = (shard_name, offset, n_dim, n_frames)
+
+        return self.index
+
+    def _open_shard(self, shard_name: str, end: int) -> np.memmap:
+        shard = self.shards.get(shard_name)
+
+        if shard is None or shard.size < end:  # shard has grown since it was mapped
+            shard = np.memmap(os.path.join(self.cache_dir, shard_name), dtype=self.dtype, mode='r')
+            self.shards[shard_name] = shard
+
+        return shard
+
+    def get(self, path: str) -> Optional[torch.FloatTensor]:
+        entry = self._load_index().get(path)
+
+        if entry is None:
+            return None
+
+        shard_name, offset, n_dim, n_frames = entry
+        shard = self._open_shard(shard_name, offset + n_dim * n_frames)
+        feature = np.array(shard[offset:offset + n_dim * n_frames], dtype=np.float32).reshape(n_dim, n_frames)
+
+        return torch.from_numpy(feature)
+
+    def put(self, path: str, feature: torch.FloatTensor) -> None:
+        index = self._load_index()
+        feature = np.ascontiguousarray(feature.numpy(), dtype=self.dtype)
+        n_dim, n_frames = feature.shape
+
+        if self.writer_id is None:
+            self.writer_id = '{}-{}'.format(os.getpid(), uuid.uuid4().hex[:8])
+            self.index_file = open(os.path.join(self.cache_dir, 'index-{}.tsv'.format(self.writer_id)), 'a',
+                                   encoding='utf-8')
+
+        if self.shard_file is None or self.shard_file.tell() + feature.nbytes > self.shard_size:
+            if self.shard_file is not None:
+                self.shard_file.close()
+            self.shard_name = 'shard-{}-{:05d}.bin'.format(self.writer_id, self.shard_count)
+            self.shard_file = open(os.path.join(self.cache_dir, self.shard_name), 'ab')
+            self.shard_count += 1
+
+        offset = self.shard_file.tell() // self.dtype.itemsize
+        self.shard_file.write(feature.tobytes())
+        self.shard_file.flush()
+
+        self.index_file.write('{}\t{}\t{}\t{}\t{}\n'.format(path, self.shard_name, offset, n_dim, n_frames))
+        self.index_file.flush()
+
+        index[path] = (self.shard_name, offset, n_dim, n_frames)
@@ -0,0 +1,100 @@
+# MIT License
+#
+# Copyright (c) 2021 Sangchun Ha
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+import os
+import numpy as np
+
+
+def pack_corpus(
+        default_audio_path: str,
+        audio_paths: list,
+        corpus_path: str,
+        extension: str = 'pcm',
+        sampling_rate: int = 16000,
+) -> int:
+    """
+    Concatenates all audio files into a single int16 blob with an (offset, length) index
+
+    Args:
+        default_audio_path (str): root directory of audio files
+        audio_paths (list): audio paths relative to default_audio_path
+        corpus_path (str): directory where the packed corpus is written
+        extension (str): audio extension (default: pcm)
+        sampling_rate (int): sampling rate of audio (default: 16000)
+
+    Returns: num_samples
+        - **num_samples** (int): the number of samples written to the corpus
+    """
+    from data.data_loader import load_audio
+
+    os.makedirs(corpus_path, exist_ok=True)
+    index = np.empty((len(audio_paths), 2), dtype=np.int64)
+    offset = 0
+
+    with open(os.path.join(corpus_path, 'audio.bin'), 'wb') as f:
+        for idx, audio_path in enumerate(audio_paths):
+            path = os.path.join(default_audio_path, audio_path)
+
+            if extension == 'pcm':
+                sound = np.fromfile(path, dtype='h')
+            else:
+                sound = np.round(load_audio(path, extension, sampling_rate) * 32767).astype('h')
+
+            f.write(sound.tobytes())
+            index[idx] = (offset, len(sound))
+            offset += len(sound)
+
+    np.save(os.path.join(corpus_path, 'index.npy'), index)
+    np.save(os.path.join(corpus_path, 'paths.npy'), np.array([os.path.normpath(path).encode('utf-8')
+                                                              for path in audio_paths]))
+
+    return offset
+
+
+class PackedCorpus(object):
+    """
+    Reads audio from a corpus written by pack_corpus. The blob is memory-mapped once per process
+    and every read is a zero-copy int16 slice of it.
+
+    Args:
+        corpus_path (str): directory of the packed corpus
+
+    Inputs: audio_path
+        - **audio_path** (str): audio path relative to the audio root, same as the path used to pack
+    """
+    def __init__(self, corpus_path: str) -> None:
+        self.corpus_path = corpus_path
+        self.audio = None
+        self.index = None
+        self.rows = None
+
+    def __getstate__(self) -> dict:
+        return {'corpus_path': self.corpus_path, 'audio': None, 'index': None, 'rows': None}
+
+    def _load(self) -> None:
+        self.audio = np.memmap(os.path.join(self.corpus_path, 'audio.bin'), dtype='h', mode='r')
+        self.index = np.load(os.path.join(self.corpus_path, 'index.npy'))
+        paths = np.load(os.path.join(self.corpus_path, 'paths.npy'))
+        self.rows = {path.decode('utf-8'): row for row, path in enumerate(paths)}
+
+    def __contains__(self, audio_path: str) -> bool:
+        if self.rows is None:
+            self._load()
+
+        return os.path.normpath(audio_path) in self.rows
+
+    def read(self, audio_path: str) -> np.ndarray:
+        if self.rows is None:
+            self._load()
+
+        offset, length = self.index[self.rows[os.path.normpath(audio_path)]]
+
+        return self.audio[offset:offset + length]
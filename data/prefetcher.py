@@ -0,0 +1,152 @@
+# MIT License
+#
+# Copyright (c) 2021 Sangchun Ha
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+import queue
+import threading
+import time
+import torch
+from torch import Tensor
+from typing import Callable, Iterator, Optional, Tuple
+
+
+class DevicePrefetcher(object):
+    """
+    Wraps an AudioDataLoader and stages the next batches on the device from a background thread,
+    so collation and host to device copies overlap with the forward and backward pass.
+    On CUDA, batches are pinned and copied with non_blocking on a side stream, and the training stream waits
+    for the copy of each batch right before it is returned.
+
+    Args:
+        loader (AudioDataLoader): loader yielding (feature, target, feature_lengths, target_lengths)
+        device (torch.device): device where batches are placed
+        num_prefetch (int): the number of batches staged ahead, if 0, batches are moved in the calling thread (default: 2)
+        transform (callable): batch-level transform applied on the device, transform(feature, feature_lengths) -> feature,
+            e.g. GlobalCMVN or BatchSpecAugment (default: None)
+        dtype (torch.dtype): dtype of the feature on the device, if None, unchanged (default: None)
+
+    Attributes:
+        wait_time (float): seconds the caller was blocked waiting for a batch in the last epoch
+    """
+    def __init__(
+            self,
+            loader,
+            device: torch.device,
+            num_prefetch: int = 2,
+            transform: Optional[Callable[[Tensor, Tensor], Tensor]] = None,
+            dtype: Optional[torch.dtype] = None,
+    ) -> None:
+        self.loader = loader
+        self.device = torch.device(device)
+        self.num_prefetch = num_prefetch
+        self.transform = transform
+        self.dtype = dtype
+        self.wait_time = 0.0
+
+    def __len__(self) -> int:
+        return len(self.loader)
+
+    def to_device(self, batch: Tuple[Tensor, ...]) -> Tuple[Tensor, ...]:
+        feature, target, feature_lengths, target_lengths = batch
+        non_blocking = self.device.type == 'cuda'
+
+        if non_blocking:
+            feature, target, feature_lengths, target_lengths = (
+                tensor if tensor.is_pinned() else tensor.pin_memory()
+                for tensor in (feature, target, feature_lengths, target_lengths)
+            )
+
+        feature = feature.to(self.device, dtype=self.dtype, non_blocking=non_blocking)
+        target = target.to(self.device, non_blocking=non_blocking)
+        feature_lengths = feature_lengths.to(self.device, non_blocking=non_blocking)
+        target_lengths = target_lengths.to(self.device, non_blocking=non_blocking)
+
+        if self.transform is not None:
+            feature = self.transform(feature, feature_lengths)
+
+        return feature, target, feature_lengths, target_lengths
+
+    def _produce(self, batches: queue.Queue, stop: threading.Event) -> None:
+        stream = torch.cuda.Stream(self.device) if self.device.type == 'cuda' else None
+
+        def put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    batches.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        try:
+            for batch in self.loader:
+                event = None
+
+                if stream is not None:
+                    with torch.cuda.stream(stream):
+                        batch = self.to_device(batch)
+                        event = torch.cuda.Event()
+                        event.record(stream)
+                    event.synchronize()  # host buffers of the batch can be reused by the collate function
+                else:
+                    batch = self.to_device(batch)
+
+                if not put((batch, event)):
+                    return
+
+        except Exception as e:  # raised again in the consumer thread
+            put((e, None))
+            return
+
+        put((None, None))
+
+    def __iter__(self) -> Iterator[Tuple[Tensor, ...]]:
+        self.wait_time = 0.0
+
+        if self.num_prefetch <= 0:
+            iterator = iter(self.loader)
+
+            while True:
+                start = time.perf_counter()
+                batch = next(iterator, None)
+                self.wait_time += time.perf_counter() - start
+
+                if batch is None:
+                    return
+
+                yield self.to_device(batch)
+
+        batches = queue.Queue(maxsize=self.num_prefetch)
+        stop = threading.Event()
+        thread = threading.Thread(target=self._produce, args=(batches, stop), daemon=True)
+        thread.start()
+
+        try:
+            while True:
+                start = time.perf_counter()
+                batch, event = batches.get()
+                self.wait_time += time.perf_counter() - start
+
+                if batch is None:
+                    return
+                if isinstance(batch, Exception):
+                    raise batch
+
+                if event is not None:
+                    current_stream = torch.cuda.current_stream(self.device)
+                    current_stream.wait_event(event)
+                    for tensor in batch:  # memory allocated on the side stream is used on the current stream
+                        tensor.record_stream(current_stream)
+
+                yield batch
+
+        finally:
+            stop.set()
+            thread.join()
@@ -41,3 +41,72 @@ class SpecAugment(object):
             feature[f0: f0 + f, :] = 0
 
         return feature
+
+
+class BatchSpecAugment(object):
+    """
+    SpecAugment applied to a whole padded batch at once with tensor operations.
+    Time masks are drawn within the valid length of each utterance, same as SpecAugment.
+
+    Args:
+        freq_mask_parameter (int): maximum width of frequency mask
+        num_freq_mask (int): the number of frequency masks
+        num_time_mask (int): the number of time masks
+
+    Inputs: features, feature_lengths, seed
+        - **features** (batch, dimension, seq_len): padded features, masked in place
+        - **feature_lengths** (batch): valid length of each feature
+        - **seed** (int): seed of the masks of this batch, if None, torch global random state is used
+
+    Returns: features
+        - **features** (batch, dimension, seq_len): masked features
+    """
+    def __init__(
+            self,
+            freq_mask_parameter: int,
+            num_freq_mask: int,
+            num_time_mask: int,
+    ) -> None:
+        self.freq_mask_parameter = freq_mask_parameter
+        self.num_freq_mask = num_freq_mask
+        self.num_time_mask = num_time_mask
+
+    @staticmethod
+    def _get_mask(
+            widths: torch.Tensor,
+            starts: torch.Tensor,
+            length: int,
+    ) -> torch.Tensor:
+        positions = torch.arange(length, device=widths.device)
+        mask = (positions >= starts.unsqueeze(-1)) & (positions < (starts + widths).unsqueeze(-1))  # (N, B, L)
+
+        return mask.any(dim=0)  # (B, L)
+
+    def __call__(
+            self,
+            features: torch.Tensor,
+            feature_lengths: torch.Tensor,
+            seed: int = None,
+    ) -> torch.Tensor:
+        batch, freq_length, time_length = features.size()
+        generator = None
+
+        if seed is not None:
+            generator = torch.Generator()
+            generator.manual_seed(seed)
+
+        feature_lengths = feature_lengths.cpu().float()
+        time_noise = torch.rand(2, self.num_time_mask, batch, generator=generator)
+        freq_noise = torch.rand(2, self.num_freq_mask, batch, generator=generator)
+
+        t = (time_noise[0] * feature_lengths / 20).floor()
+        t0 = (time_noise[1] * (feature_lengths - t + 1)).floor()
+        time_mask = self._get_mask(t.long().to(features.device), t0.long().to(features.device), time_length)
+
+        f = (freq_noise[0] * self.freq_mask_parameter).floor()
+        f0 = (freq_noise[1] * (freq_length - f + 1)).floor()
+        freq_mask = self._get_mask(f.long().to(features.device), f0.long().to(features.device), freq_length)
+
+        features.masked_fill_(freq_mask.unsqueeze(2) | time_mask.unsqueeze(1), 0)
+
+        return features
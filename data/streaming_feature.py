@@ -0,0 +1,157 @@
+# MIT License
+#
+# Copyright (c) 2021 Sangchun Ha
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+import numpy as np
+import torch
+from torch import Tensor
+from typing import Optional, Union
+from data.batch_feature import BatchFeatureExtractor
+from data.cmvn import GlobalCMVN
+
+
+class StreamingFeatureExtractor(object):
+    """
+    Extracts features of one audio stream chunk by chunk with the stages of BatchFeatureExtractor.
+    Chunks can have any number of samples. The samples a frame still needs are kept between calls, so the frames
+    are the same as batch extraction of the concatenated signal: frames are emitted once their window is complete,
+    and finish adds the right padding of librosa center framing (kaldi framing has none).
+
+    Spectrogram and filterbank are exact, and so are melspectrogram and mfcc with a fixed ref_db or without
+    top_db clipping. By default the clipping is relative to the maximum of the frames seen so far instead of the
+    whole utterance, so a mel bin more than top_db below a louder frame that comes later is clipped higher than
+    in batch extraction. For mfcc the DCT spreads such a bin over every coefficient of the frame.
+    Per-utterance normalize needs the whole utterance, so global statistics of compute_cmvn.py are used instead.
+
+    Args:
+        feature_extraction (str): type of feature (spectrogram, melspectrogram, mfcc, filterbank)
+        sampling_rate (int): sampling rate of audio (default: 16000)
+        n_dim (int): dimension of feature, n_mel or n_mfcc (default: 80)
+        frame_length (float): frame length in seconds (default: 0.020)
+        frame_stride (float): frame stride in seconds (default: 0.010)
+        cmvn_path (str): path of the statistics written by compute_cmvn.py, if empty, not normalized (default: '')
+        top_db (float): melspectrogram and mfcc are clipped to top_db below the reference, if None, not clipped
+            (default: 80.0)
+        ref_db (float): fixed reference of the top_db clipping, if None, the maximum of the frames seen so far
+            (default: None)
+
+    Inputs: sound
+        - **sound** (num_samples): next samples of the stream, np.ndarray or Tensor
+
+    Returns: feature
+        - **feature** (1, n_dim, num_frames): frames completed by sound
+    """
+    def __init__(
+            self,
+            feature_extraction: str = 'melspectrogram',
+            sampling_rate: int = 16000,
+            n_dim: int = 80,
+            frame_length: float = 0.020,
+            frame_stride: float = 0.010,
+            cmvn_path: str = '',
+            top_db: Optional[float] = 80.0,
+            ref_db: Optional[float] = None,
+    ) -> None:
+        self.extractor = BatchFeatureExtractor(feature_extraction, sampling_rate, n_dim, frame_length, frame_stride,
+                                               top_db, ref_db)
+        self.feature_extraction = feature_extraction
+        self.n_fft = self.extractor.n_fft
+        self.hop_length = self.extractor.hop_length
+        self.pad = 0 if feature_extraction == 'filterbank' else self.n_fft // 2
+        self.reflect = feature_extraction != 'filterbank' and self.extractor.pad_mode == 'reflect'
+        self.feature_size = self.n_fft // 2 + 1 if feature_extraction == 'spectrogram' else n_dim
+        self.cmvn = GlobalCMVN(cmvn_path) if cmvn_path else None
+        self.reset()
+
+    def reset(self) -> None:
+        """ Starts a new stream """
+        self.buffer = torch.zeros(0)
+        self.started = False  # left padding is in the buffer
+        self.tail = torch.zeros(0)  # last samples of the stream, mirrored by the right reflect padding
+        self.max_db = float('-inf')
+        self.num_samples = 0
+
+    def _left_pad(self, sound: Tensor) -> Tensor:
+        if self.reflect:
+            return sound[1:self.pad + 1].flip(0)
+        return sound.new_zeros(self.pad)
+
+    def _right_pad(self) -> Tensor:
+        if self.reflect:
+            return self.tail[:-1].flip(0)[:self.pad]
+        return self.buffer.new_zeros(self.pad)
+
+    def _features(self, frames: Tensor) -> Tensor:
+        """ (num_frames, n_fft) => (1, n_dim, num_frames) """
+        extractor = self.extractor
+
+        if frames.size(0) == 0:
+            return frames.new_zeros(1, self.feature_size, 0)
+
+        with torch.no_grad():
+            features = extractor.project(extractor.spectrum(frames.unsqueeze(0)))
+
+            if self.feature_extraction in ('melspectrogram', 'mfcc') and extractor.top_db is not None:
+                if extractor.ref_db is None:
+                    self.max_db = max(self.max_db, features.max().item())
+                ref_db = self.max_db if extractor.ref_db is None else extractor.ref_db
+                features = torch.clamp(features, min=ref_db - extractor.top_db)
+
+            if self.feature_extraction == 'mfcc':
+                features = torch.matmul(extractor.dct_matrix, features)
+
+            if self.cmvn is not None:
+                features = self.cmvn(features, torch.LongTensor([features.size(2)]))
+
+        return features
+
+    def _emit(self) -> Tensor:
+        if self.buffer.size(0) < self.n_fft:
+            return self._features(self.buffer.new_zeros(0, self.n_fft))
+
+        frames = self.buffer.unfold(0, self.n_fft, self.hop_length)
+        self.buffer = self.buffer[frames.size(0) * self.hop_length:]
+
+        return self._features(frames)
+
+    def __call__(self, sound: Union[np.ndarray, Tensor]) -> Tensor:
+        sound = torch.as_tensor(sound, dtype=torch.float32).reshape(-1)
+        self.num_samples += sound.size(0)
+        self.tail = torch.cat((self.tail, sound))[-(self.pad + 1):]
+        self.buffer = torch.cat((self.buffer, sound))
+
+        if not self.started:
+            if self.reflect and self.buffer.size(0) <= self.pad:  # the left reflection needs pad + 1 samples
+                return self._features(self.buffer.new_zeros(0, self.n_fft))
+
+            self.buffer = torch.cat((self._left_pad(self.buffer), self.buffer))
+            self.started = True
+
+        return self._emit()
+
+    def finish(self, sound: Optional[Union[np.ndarray, Tensor]] = None) -> Tensor:
+        """ Frames of the last samples, if any, and of the right padding, then the stream can be reset """
+        features = [self(sound)] if sound is not None else list()
+
+        if not self.started:  # shorter than the left padding, the whole stream is still in the buffer
+            extractor = self.extractor
+            sound_lengths = torch.LongTensor([self.buffer.size(0)])
+            num_frames = int(extractor.get_feature_lengths(sound_lengths)[0])
+            frames = extractor.frame(self.buffer.unsqueeze(0), sound_lengths)[0, :num_frames]
+            self.buffer = self.buffer[:0]
+            self.started = True
+            features.append(self._features(frames))
+
+        else:
+            self.buffer = torch.cat((self.buffer, self._right_pad()))
+            features.append(self._emit())
+            self.buffer = self.buffer[:0]
+
+        return torch.cat(features, dim=2)
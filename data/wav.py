@@ -0,0 +1,150 @@
+# MIT License
+#
+# Copyright (c) 2021 Sangchun Ha
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+import math
+import os
+import struct
+import numpy as np
+from functools import lru_cache
+from typing import NamedTuple
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class WavHeader(NamedTuple):
+    format_tag: int
+    num_channels: int
+    sampling_rate: int
+    bits_per_sample: int
+    data_offset: int
+    num_frames: int
+
+
+def read_wav_header(path: str) -> WavHeader:
+    """
+    Parses the RIFF chunks of a wav file up to the data chunk, without reading the payload
+
+    Args:
+        path (str): path of wav file
+
+    Returns: header
+        - **header** (WavHeader): format tag, number of channels, sampling rate, bits per sample,
+          byte offset of the data chunk and number of frames
+    """
+    with open(path, 'rb') as f:
+        riff, _, wave = struct.unpack('<4sI4s', f.read(12))
+
+        if riff != b'RIFF' or wave != b'WAVE':
+            raise ValueError('{} is not a RIFF WAVE file'.format(path))
+
+        fmt = None
+
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                raise ValueError('{} has no data chunk'.format(path))
+
+            chunk_id, chunk_size = struct.unpack('<4sI', chunk)
+
+            if chunk_id == b'fmt ':
+                fmt = f.read(chunk_size)
+                format_tag, num_channels, sampling_rate, _, _, bits_per_sample = struct.unpack('<HHIIHH', fmt[:16])
+
+                if format_tag == WAVE_FORMAT_EXTENSIBLE and chunk_size >= 26:
+                    format_tag = struct.unpack('<H', fmt[24:26])[0]  # first two bytes of the sub-format GUID
+
+                if chunk_size % 2:
+                    f.seek(1, 1)
+
+            elif chunk_id == b'data':
+                if fmt is None:
+                    raise ValueError('{} has no fmt chunk before the data chunk'.format(path))
+
+                frame_size = num_channels * bits_per_sample // 8
+                # streamed wav files are written with an unknown size, e.g. 0xFFFFFFFF, the data runs to the end
+                data_size = min(chunk_size, os.fstat(f.fileno()).st_size - f.tell())
+
+                return WavHeader(format_tag, num_channels, sampling_rate, bits_per_sample,
+                                 f.tell(), data_size // frame_size)
+
+            else:
+                f.seek(chunk_size + chunk_size % 2, 1)
+
+
+@lru_cache(maxsize=None)
+def get_resample_filter(up: int, down: int, zero_crossings: int = 32, beta: float = 8.6) -> np.ndarray:
+    """ Kaiser windowed sinc low-pass filter for resample_poly, designed once per rate pair """
+    from scipy.signal import firwin
+
+    max_rate = max(up, down)
+    taps = firwin(2 * zero_crossings * max_rate + 1, 1.0 / max_rate, window=('kaiser', beta))
+    taps.setflags(write=False)
+
+    return taps
+
+
+def resample(sound: np.ndarray, orig_rate: int, target_rate: int) -> np.ndarray:
+    """ Polyphase resampling with a cached filter """
+    from scipy.signal import resample_poly
+
+    gcd = math.gcd(orig_rate, target_rate)
+    up, down = target_rate // gcd, orig_rate // gcd
+
+    return resample_poly(sound, up, down, window=get_resample_filter(up, down)).astype('float32')
+
+
+def load_wav(path: str, sampling_rate: int = 16000) -> np.ndarray:
+    """
+    Loads a wav file as float32 mono in [-1, 1).
+    16-bit PCM and 32-bit float payloads are memory-mapped from the data chunk, multi-channel audio is averaged,
+    and a polyphase resampler is applied only if the file rate differs from sampling_rate.
+    Other encodings fall back to librosa.
+
+    Args:
+        path (str): path of wav file
+        sampling_rate (int): target sampling rate (default: 16000)
+
+    Returns: sound
+        - **sound** (np.ndarray): float32 waveform
+    """
+    header = read_wav_header(path)
+
+    if header.format_tag == WAVE_FORMAT_PCM and header.bits_per_sample == 16:
+        dtype, scale = '<i2', 1.0 / 32768
+    elif header.format_tag == WAVE_FORMAT_IEEE_FLOAT and header.bits_per_sample == 32:
+        dtype, scale = '<f4', 1.0
+    else:
+        import librosa
+
+        sound, _ = librosa.load(path, sr=sampling_rate)
+
+        return sound
+
+    if header.num_frames == 0:
+        return np.zeros(0, dtype='float32')
+
+    sound = np.memmap(path, dtype=dtype, mode='r', offset=header.data_offset,
+                      shape=(header.num_frames, header.num_channels))
+
+    if header.num_channels == 1:
+        sound = sound[:, 0].astype('float32')
+    else:
+        sound = sound.mean(axis=1, dtype='float32')
+
+    if scale != 1.0:
+        sound *= scale
+
+    if header.sampling_rate != sampling_rate:
+        sound = resample(sound, header.sampling_rate, sampling_rate)
+
+    return sound
@@ -0,0 +1,70 @@
+# MIT License
+#
+# Copyright (c) 2021 Sangchun Ha
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+import json
+import os
+import torch
+from torch import Tensor
+from typing import List, Optional
+
+
+class Recognizer(object):
+    """
+    Runtime of the TorchScript artifacts written by export.py. It only needs torch, not the training code,
+    so this file can be copied to a serving image on its own.
+
+    Args:
+        export_dir (str): directory of model.pt and meta.json
+        device (str): device where the graphs run (default: cpu)
+        num_threads (int): the number of intra-op threads, if None, unchanged (default: None)
+
+    Inputs: feature, feature_lengths
+        - **feature** (batch, dimension, seq_len): padded features, extracted as for training
+        - **feature_lengths** (batch): valid length of each feature
+
+    Returns: y_hat
+        - **y_hat** (batch, max_len): predicted tokens, padded with eos
+    """
+    def __init__(self, export_dir: str, device: str = 'cpu', num_threads: Optional[int] = None) -> None:
+        if num_threads is not None:
+            torch.set_num_threads(num_threads)
+
+        with open(os.path.join(export_dir, 'meta.json'), encoding='utf-8') as f:
+            self.meta = json.load(f)
+
+        self.device = torch.device(device)
+        self.model = torch.jit.load(os.path.join(export_dir, 'model.pt'), map_location=self.device).eval()
+        self.eos_id = self.meta['eos_id']
+        self.blank_id = self.meta['blank_id']
+        self.id2char = {int(idx): char for idx, char in self.meta.get('id2char', dict()).items()}
+
+    def __call__(self, feature: Tensor, feature_lengths: Tensor) -> Tensor:
+        with torch.no_grad():
+            return self.model(feature.to(self.device), feature_lengths.to(self.device))
+
+    def to_string(self, y_hat: Tensor) -> List[str]:
+        """ Tokens up to eos without blank as strings, needs the vocabulary in meta.json """
+        sentences = list()
+
+        for tokens in y_hat.tolist():
+            sentence = str()
+            for token in tokens:
+                if token == self.eos_id:
+                    break
+                if token == self.blank_id:
+                    continue
+                sentence += self.id2char[token]
+            sentences.append(sentence)
+
+        return sentences
+
+    def transcribe(self, feature: Tensor, feature_lengths: Tensor) -> List[str]:
+        return self.to_string(self(feature, feature_lengths))
@@ -0,0 +1,132 @@
+# MIT License
+#
+# Copyright (c) 2021 Sangchun Ha
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+import os
+import time
+import numpy as np
+import hydra
+
+from multiprocessing import Pool
+from typing import Tuple
+from hydra.core.config_store import ConfigStore
+from omegaconf import OmegaConf, DictConfig
+from data import (
+    MelSpectrogramConfig,
+    SpectrogramConfig,
+    MFCCConfig,
+    FilterBankConfig,
+    PreprocessConfig,
+)
+from data.data_loader import SpectrogramDataset
+from data.feature_cache import FeatureCache
+from vocabulary import (
+    load_dataset,
+    load_manifest,
+)
+
+
+cs = ConfigStore.instance()
+cs.store(group="audio", name="melspectrogram", node=MelSpectrogramConfig, package="audio")
+cs.store(group="audio", name="filterbank", node=FilterBankConfig, package="audio")
+cs.store(group="audio", name="mfcc", node=MFCCConfig, package="audio")
+cs.store(group="audio", name="spectrogram", node=SpectrogramConfig, package="audio")
+cs.store(group="preprocess", name="default", node=PreprocessConfig, package="preprocess")
+
+_dataset = None
+
+
+def _init_worker(dataset: SpectrogramDataset) -> None:
+    global _dataset
+    _dataset = dataset
+
+
+def _dump(paths: list) -> Tuple[int, int, float]:
+    start = time.perf_counter()
+
+    for path in paths:
+        _dataset.parse_audio(path)  # a cache miss extracts the feature and appends it to this worker's shard
+
+    return os.getpid(), len(paths), time.perf_counter() - start
+
+
+@hydra.main(config_path='configs', config_name='preprocess')
+def main(config: DictConfig) -> None:
+    print(OmegaConf.to_yaml(config))
+
+    if not config.audio.feature_cache_path:
+        raise ValueError('audio.feature_cache_path is required to dump features')
+
+    np.random.seed(config.preprocess.seed)
+
+    if config.preprocess.manifest_path:
+        audio_paths, _, valid_audio_paths, _ = load_manifest(config.preprocess.manifest_path, config.preprocess.mode)
+    else:
+        audio_paths, _, valid_audio_paths, _ = load_dataset(config.preprocess.dataset_path, config.preprocess.mode)
+
+    audio_paths = list(audio_paths) + (list(valid_audio_paths) if valid_audio_paths is not None else list())
+    n_dim = config.audio.n_mfcc if config.audio.feature_extraction == 'mfcc' else config.audio.n_mel
+    normalize = config.audio.normalize and not config.audio.cmvn_path  # same flag as the training dataset
+
+    feature_cache = FeatureCache(
+        config.audio.feature_cache_path,
+        config.audio.feature_extraction,
+        n_dim,
+        config.audio.frame_length,
+        config.audio.frame_stride,
+        normalize,
+        config.audio.sampling_rate,
+        config.preprocess.feature_dtype,
+    )
+    dataset = SpectrogramDataset(
+        config.preprocess.audio_path,
+        audio_paths,
+        None,
+        config.audio.sampling_rate,
+        n_dim,
+        config.audio.frame_length,
+        config.audio.frame_stride,
+        config.audio.extension,
+        config.audio.feature_extraction,
+        normalize,
+        False,
+        corpus_path=config.preprocess.corpus_path,
+    )
+    dataset.feature_cache = feature_cache
+
+    # keys already in the index were written before an interruption
+    paths = [os.path.join(config.preprocess.audio_path, audio_path) for audio_path in audio_paths]
+    pending = [path for path in paths if path not in feature_cache]
+    print('{} / {} utterances are already dumped in {}'.format(len(paths) - len(pending), len(paths),
+                                                             feature_cache.cache_dir))
+
+    chunk_size = config.preprocess.chunk_size
+    chunks = [pending[begin:begin + chunk_size] for begin in range(0, len(pending), chunk_size)]
+    worker_stats = dict()
+    num_done = 0
+    start = time.perf_counter()
+
+    with Pool(config.preprocess.num_workers, initializer=_init_worker, initargs=(dataset,)) as pool:
+        for chunk_idx, (pid, count, elapsed) in enumerate(pool.imap_unordered(_dump, chunks)):
+            worker_count, worker_elapsed = worker_stats.get(pid, (0, 0.0))
+            worker_stats[pid] = (worker_count + count, worker_elapsed + elapsed)
+            num_done += count
+
+            if chunk_idx % 10 == 0 or num_done == len(pending):
+                per_worker = ' '.join('{:.1f}'.format(worker_count / max(worker_elapsed, 1e-9))
+                                      for worker_count, worker_elapsed in worker_stats.values())
+                print('{} / {} utterances, {:.1f} utt/s, per worker utt/s: {}'.format(
+                    num_done, len(pending), num_done / (time.perf_counter() - start), per_worker))
+
+    print('Features are written to {}'.format(feature_cache.cache_dir))
+
+
+if __name__ == "__main__":
+    main()
@@ -16,7 +16,7 @@ import hydra
 
 from hydra.core.config_store import ConfigStore
 from omegaconf import OmegaConf, DictConfig
-from evaluator.evaluator import Evaluator
+from evaluator.evaluator import Evaluator, build_test_loader
 from model_builder import load_test_model
 from data import (
     MelSpectrogramConfig,
@@ -25,14 +25,7 @@ from data import (
     FilterBankConfig
 )
 from evaluator import EvaluateConfig
-from data.data_loader import (
-    SpectrogramDataset,
-    AudioDataLoader,
-)
-from vocabulary import (
-    load_label,
-    load_dataset,
-)
+from vocabulary import load_label
 
 
 cs = ConfigStore.instance()
@@ -56,25 +49,7 @@ def main(config: DictConfig) -> None:
     device = torch.device('cuda' if use_cuda else 'cpu')
 
     char2id, id2char = load_label(config.eval.label_path, config.eval.blank_id)
-    audio_paths, transcripts, _, _ = load_dataset(config.eval.dataset_path, config.eval.mode)
-
-    test_dataset = SpectrogramDataset(
-        config.eval.audio_path,
-        audio_paths,
-        transcripts,
-        config.audio.sampling_rate,
-        config.audio.n_mel,
-        config.audio.frame_length,
-        config.audio.frame_stride,
-        config.audio.extension,
-        config.train.sos_id,
-        config.train.eos_id,
-    )
-    test_loader = AudioDataLoader(
-        test_dataset,
-        batch_size=config.eval.batch_size,
-        num_workers=config.eval.num_workers,
-    )
+    test_loader = build_test_loader(config)
 
     model = load_test_model(config, device)
 
@@ -15,6 +15,8 @@ from dataclasses import dataclass
 @dataclass
 class EvaluateConfig:
     dataset_path: str = ''
+    manifest_path: str = ''
+    corpus_path: str = ''
     audio_path: str = ''
     label_path: str = 'D:/label/aihub_labels.csv'
     model_path: str = ''
@@ -26,6 +28,23 @@ class EvaluateConfig:
     blank_id: int = 2000
     batch_size: int = 4
     num_workers: int = 4
+    beam_size: int = 1
+    max_len: int = 120
+    decode_mode: str = 'attention'
+    ctc_weight: float = 0.3
+    top_k: int = 10
+    blank_threshold: float = 0.999
+    decode_workers: int = 0
+    lm_path: str = ''
+    lm_weight: float = 0.0
     cuda: bool = True
     seed: int = 22
-    mode: str = eval
+    mode: str = 'eval'
+
+
+@dataclass
+class QuantizeConfig:
+    quantized_model_path: str = 'quantized_model.pt'
+    dtype: str = 'qint8'
+    num_threads: int = 1
+    num_latency_samples: int = 20
@@ -13,12 +13,50 @@ import os
 import torch
 import torch.nn as nn
 import pandas as pd
-from models.search import GreedySearch
-from data.data_loader import AudioDataLoader
-from vocabulary import label_to_string, get_distance
+from models.search import GreedySearch, BeamSearch, CTCPrefixBeamSearch
+from models.deepspeech2.model import DeepSpeech2
+from models.lm import NGramLanguageModel
+from data.cmvn import GlobalCMVN
+from data.data_loader import SpectrogramDataset, AudioDataLoader
+from vocabulary import label_to_string, get_distance, load_dataset, load_manifest
 from omegaconf import DictConfig
 
 
+def build_test_loader(config: DictConfig, batch_size: int = None) -> AudioDataLoader:
+    """ Loader of the held-out set of config.eval, if batch_size is None, config.eval.batch_size """
+    if config.eval.manifest_path:
+        audio_paths, transcripts, _, _ = load_manifest(config.eval.manifest_path, config.eval.mode)
+    else:
+        audio_paths, transcripts, _, _ = load_dataset(config.eval.dataset_path, config.eval.mode)
+
+    cmvn = GlobalCMVN(config.audio.cmvn_path) if config.audio.cmvn_path else None
+
+    test_dataset = SpectrogramDataset(
+        config.eval.audio_path,
+        audio_paths,
+        transcripts,
+        config.audio.sampling_rate,
+        config.audio.n_mfcc if config.audio.feature_extraction == 'mfcc' else config.audio.n_mel,
+        config.audio.frame_length,
+        config.audio.frame_stride,
+        config.audio.extension,
+        config.audio.feature_extraction,
+        config.audio.normalize and cmvn is None,
+        False,
+        sos_id=config.eval.sos_id,
+        eos_id=config.eval.eos_id,
+        feature_cache_path=config.audio.feature_cache_path,
+        corpus_path=config.eval.corpus_path,
+    )
+
+    return AudioDataLoader(
+        test_dataset,
+        batch_size=config.eval.batch_size if batch_size is None else batch_size,
+        num_workers=config.eval.num_workers,
+        cmvn=cmvn,
+    )
+
+
 class Evaluator(object):
     def __init__(
             self,
@@ -31,9 +69,35 @@ class Evaluator(object):
         self.device = device
         self.test_loader = test_loader
         self.id2char = id2char
-        self.decoder = GreedySearch(device)
 
-    def evaluate(self, model: nn.Module) -> None:
+    def build_decoder(self, model: nn.Module) -> nn.Module:
+        """ DeepSpeech2 is decoded with CTC, ListenAttendSpell with the attention decoder, the CTC head or both """
+        lm = NGramLanguageModel(self.config.eval.lm_path) if self.config.eval.lm_path else None
+        lm_weight = self.config.eval.lm_weight
+
+        if isinstance(model, DeepSpeech2) or self.config.eval.decode_mode in ('ctc', 'joint'):
+            return CTCPrefixBeamSearch(
+                self.device,
+                self.config.eval.blank_id,
+                self.config.eval.sos_id,
+                self.config.eval.eos_id,
+                self.config.eval.beam_size,
+                self.config.eval.top_k,
+                self.config.eval.blank_threshold,
+                self.config.eval.decode_workers,
+                self.config.eval.decode_mode == 'joint',
+                self.config.eval.ctc_weight,
+                lm,
+                lm_weight,
+            )
+
+        if self.config.eval.beam_size > 1:
+            return BeamSearch(self.device, self.config.eval.beam_size, self.config.eval.max_len, lm=lm, lm_weight=lm_weight)
+
+        return GreedySearch(self.device, self.config.eval.max_len, lm, lm_weight)
+
+    def evaluate(self, model: nn.Module, result_path: str = 'inference_result.csv') -> float:
+        """ Decodes the test set, writes the predictions to result_path and returns the CER """
         target_list = list()
         prediction_list = list()
         cer_list = list()
@@ -42,6 +106,7 @@ class Evaluator(object):
         total_length = 0
 
         model.eval()
+        decoder = self.build_decoder(model)
 
         with torch.no_grad():
             for batch_idx, data in enumerate(self.test_loader):
@@ -52,25 +117,30 @@ class Evaluator(object):
 
                 result = target[:, 1:]
 
-                y_hat = self.decoder.search(model, feature, feature_lengths, result)
+                y_hat = decoder(model, feature, feature_lengths)
 
-                result = label_to_string(self.config.eval.eos_id, self.config.eval.blank_id, result[idx], self.id2char)
-                y_hat = label_to_string(self.config.eval.eos_id, self.config.eval.blank_id, y_hat[idx], self.id2char)
+                result = label_to_string(self.config.eval.eos_id, self.config.eval.blank_id, result, self.id2char)
+                y_hat = label_to_string(self.config.eval.eos_id, self.config.eval.blank_id, y_hat, self.id2char)
 
-                distance, length = get_distance(result, y_hat)
+                for sentence, prediction in zip(result, y_hat):
+                    distance, length = get_distance([sentence], [prediction])
 
-                total_distance += distance
-                total_length += length
+                    total_distance += distance
+                    total_length += length
 
-                cer = total_distance / total_length
-                cer_list.append(cer)
+                    target_list.append(sentence)
+                    prediction_list.append(prediction)
+                    cer_list.append(distance / max(length, 1))
 
-                for idx in range(result.size(0)):
-                    target_list.append(result[idx])
-                    prediction_list.append(y_hat[idx])
+                cer = total_distance / max(total_length, 1)
 
-                if batch_idx % self.config.train.print_interval == 0:
+                if batch_idx % self.config.eval.print_interval == 0:
                     print('cer: {:.2f}'.format(cer))
 
+        if isinstance(decoder, CTCPrefixBeamSearch):
+            decoder.close()
+
         inference_result = pd.DataFrame(inference_result)
-        inference_result.to_csv(os.path.join(os.getcwd(), 'inference_result.csv') , index=False, encoding='cp949')
+        inference_result.to_csv(os.path.join(os.getcwd(), result_path), index=False, encoding='cp949')
+
+        return total_distance / max(total_length, 1)
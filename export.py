@@ -0,0 +1,41 @@
+# MIT License
+#
+# Copyright (c) 2021 Sangchun Ha
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+import argparse
+import torch
+from model_builder import load_model
+from models.export import export_model, export_onnx
+from vocabulary import load_label
+
+
+parser = argparse.ArgumentParser(description='export TorchScript or ONNX deployment artifacts')
+parser.add_argument('--model_path', type=str, default='')
+parser.add_argument('--export_dir', type=str, default='')
+parser.add_argument('--label_path', type=str, default='')
+parser.add_argument('--input_size', type=int, default=80)
+parser.add_argument('--blank_id', type=int, default=1999)
+parser.add_argument('--sos_id', type=int, default=1)
+parser.add_argument('--eos_id', type=int, default=2)
+parser.add_argument('--max_len', type=int, default=120)
+parser.add_argument('--format', type=str, default='torchscript', help='torchscript or onnx')
+parser.add_argument('--opset_version', type=int, default=17)
+args = parser.parse_args()
+
+model = load_model(args.model_path, torch.device('cpu'))
+id2char = load_label(args.label_path, args.blank_id)[1] if args.label_path else None
+
+if args.format == 'onnx':
+    meta = export_onnx(model, args.export_dir, args.input_size, args.opset_version)
+else:
+    meta = export_model(model, args.export_dir, args.blank_id, args.sos_id, args.eos_id, args.max_len, id2char,
+                        args.input_size)
+
+print('{} is exported to {} : {}'.format(meta['architecture'], args.export_dir, ', '.join(meta['files'])))
@@ -1,11 +1,13 @@
 import argparse
 import torch
-import torch.nn as nn
 import librosa
 from torch import Tensor
 from data.data_loader import load_audio
 from vocabulary import label_to_string, load_label
-from models.search import GreedySearch
+from model_builder import load_model
+from models.search import GreedySearch, ctc_greedy_decode
+from models.long_form import LongFormTranscriber
+from models.deepspeech2.model import DeepSpeech2
 
 
 def parse_audio(audio_path: str, audio_extension: str = 'pcm') -> Tensor:
@@ -28,29 +30,38 @@ parser = argparse.ArgumentParser(description='inference')
 parser.add_argument('--model_path', type=str, default='')
 parser.add_argument('--audio_path', type=str, default='')
 parser.add_argument('--label_path', type=str, default='')
+parser.add_argument('--sos_id', type=int, default=1)
 parser.add_argument('--eos_id', type=int, default=2)
 parser.add_argument('--blank_id', type=int, default=1999)
+parser.add_argument('--max_len', type=int, default=120)
+parser.add_argument('--cuda', action='store_true', help='quantized models from quantize.py run on CPU only')
+parser.add_argument('--long_form', action='store_true', help='transcribe a long recording in overlapping windows')
+parser.add_argument('--window_size', type=int, default=1000, help='feature frames per window of --long_form')
+parser.add_argument('--overlap', type=int, default=200, help='feature frames shared by consecutive windows')
 args = parser.parse_args()
 
-use_cuda = args.device and torch.cuda.is_available()
+use_cuda = args.cuda and torch.cuda.is_available()
 device = torch.device('cuda' if use_cuda else 'cpu')
 
 feature = parse_audio(args.audio_path)
 input_length = torch.LongTensor([feature.size(1)])
-target = torch.LongTensor(1, 120)
-y_hats = None
 
 char2id, id2char = load_label(args.label_path, args.blank_id)
-greedy_search = GreedySearch(device)
-
-model = torch.load(args.model_path, map_location=device)
-
-if isinstance(model, nn.DataParallel):
-    model = model.module
 
+model = load_model(args.model_path, device)
 model.eval()
 
-y_hats = greedy_search(model, feature.unsqueeze(0).to(device), input_length.to(device), target)
+with torch.no_grad():
+    if args.long_form:
+        transcriber = LongFormTranscriber(model, device, args.blank_id, args.sos_id, args.eos_id, args.window_size,
+                                          args.overlap, max_len=args.max_len)
+        y_hats = torch.LongTensor(transcriber(feature)).unsqueeze(0)
+    elif isinstance(model, DeepSpeech2):
+        log_probs, output_lengths = model(feature.unsqueeze(0).to(device), input_length.to(device))
+        y_hats = ctc_greedy_decode(log_probs, output_lengths, args.blank_id, args.sos_id, args.eos_id)
+    else:
+        greedy_search = GreedySearch(device, args.max_len)
+        y_hats = greedy_search(model, feature.unsqueeze(0).to(device), input_length.to(device))
 
 y_hats = y_hats.squeeze(0)
 sentence = label_to_string(args.eos_id, args.blank_id, y_hats, id2char)
@@ -16,6 +16,7 @@ import random
 import os
 import hydra
 import warnings
+from typing import Tuple, Any
 
 from hydra.core.config_store import ConfigStore
 from omegaconf import OmegaConf, DictConfig
@@ -24,12 +25,18 @@ from model_builder import build_model
 from data.data_loader import (
     SpectrogramDataset,
     BucketingSampler,
+    DynamicBucketingSampler,
+    ShardedSpectrogramDataset,
     AudioDataLoader,
+    get_feature_lengths,
 )
 from vocabulary import (
     load_label,
     load_dataset,
+    load_manifest,
 )
+from data.specaugment import BatchSpecAugment
+from data.cmvn import GlobalCMVN
 from data import (
     MelSpectrogramConfig,
     SpectrogramConfig,
@@ -40,7 +47,10 @@ from models.las import (
     ListenAttendSpellConfig,
     JointCTCAttentionLASConfig,
 )
-from models.deepspeech2 import DeepSpeech2Config
+from models.deepspeech2 import (
+    DeepSpeech2Config,
+    StreamingDeepSpeech2Config,
+)
 from trainer import (
     ListenAttendSpellTrainConfig,
     DeepSpeech2TrainConfig,
@@ -55,25 +65,34 @@ cs.store(group="audio", name="melspectrogram", node=MelSpectrogramConfig, packag
 cs.store(group="model", name="las", node=ListenAttendSpellConfig, package="model")
 cs.store(group="model", name="joint_ctc_attention_las", node=JointCTCAttentionLASConfig, package="model")
 cs.store(group="model", name="deepspeech2", node=DeepSpeech2Config, package="model")
+cs.store(group="model", name="streaming_deepspeech2", node=StreamingDeepSpeech2Config, package="model")
 cs.store(group="train", name="las_train", node=ListenAttendSpellTrainConfig, package="train")
 cs.store(group="train", name="deepspeech2_train", node=DeepSpeech2TrainConfig, package="train")
 
 
-@hydra.main(config_path='configs', config_name='train')
-def main(config: DictConfig) -> None:
-    warnings.filterwarnings('ignore')
-    print(OmegaConf.to_yaml(config))
+def build_data_loaders(config: DictConfig) -> Tuple[AudioDataLoader, AudioDataLoader, Any]:
+    batch_spec_augment = None
+    if config.audio.spec_augment and config.audio.batch_spec_augment:
+        batch_spec_augment = BatchSpecAugment(
+            config.audio.freq_mask_parameter,
+            config.audio.num_freq_mask,
+            config.audio.num_time_mask,
+        )
 
-    torch.manual_seed(config.train.seed)
-    torch.cuda.manual_seed_all(config.train.seed)
-    np.random.seed(config.train.seed)
-    random.seed(config.train.seed)
+    cmvn = GlobalCMVN(config.audio.cmvn_path) if config.audio.cmvn_path else None
+    normalize = config.audio.normalize and cmvn is None  # global statistics replace per-utterance normalize
 
-    use_cuda = config.train.cuda and torch.cuda.is_available()
-    device = torch.device('cuda' if use_cuda else 'cpu')
+    if config.train.shard_path:
+        return build_sharded_data_loaders(config, batch_spec_augment, cmvn)
 
-    char2id, id2char = load_label(config.train.label_path, config.train.blank_id)
-    train_audio_paths, train_transcripts, valid_audio_paths, valid_transcripts = load_dataset(config.train.dataset_path, config.train.mode)
+    if config.train.manifest_path:
+        train_audio_paths, train_transcripts, valid_audio_paths, valid_transcripts = load_manifest(
+            config.train.manifest_path, config.train.mode
+        )
+    else:
+        train_audio_paths, train_transcripts, valid_audio_paths, valid_transcripts = load_dataset(
+            config.train.dataset_path, config.train.mode
+        )
 
     train_dataset = SpectrogramDataset(
         config.train.audio_path,
@@ -85,20 +104,42 @@ def main(config: DictConfig) -> None:
         config.audio.frame_stride,
         config.audio.extension,
         config.audio.feature_extraction,
-        config.audio.normalize,
-        config.audio.spec_augment,
+        normalize,
+        config.audio.spec_augment and not config.audio.batch_spec_augment,
         config.audio.freq_mask_parameter,
         config.audio.num_time_mask,
         config.audio.num_freq_mask,
         config.train.sos_id,
         config.train.eos_id,
+        config.audio.feature_cache_path,
+        config.train.corpus_path,
     )
 
-    train_sampler = BucketingSampler(train_dataset, batch_size=config.train.batch_size)
+    if config.train.max_frames > 0:
+        train_feature_lengths = get_feature_lengths(
+            config.train.audio_path,
+            train_audio_paths,
+            config.audio.extension,
+            config.audio.sampling_rate,
+            config.audio.frame_stride,
+        )
+        train_sampler = DynamicBucketingSampler(
+            train_feature_lengths,
+            config.train.max_frames,
+            config.train.num_buckets,
+        )
+    else:
+        train_sampler = BucketingSampler(train_dataset, batch_size=config.train.batch_size)
+
     train_loader = AudioDataLoader(
         train_dataset,
         batch_sampler=train_sampler,
         num_workers=config.train.num_workers,
+        spec_augment=batch_spec_augment,
+        seed=config.train.seed,
+        preallocate=config.train.preallocate,
+        cmvn=cmvn,
+        num_buffers=config.train.num_prefetch + 3,  # batches staged by the prefetcher keep their buffers
     )
 
     valid_dataset = SpectrogramDataset(
@@ -111,27 +152,96 @@ def main(config: DictConfig) -> None:
         config.audio.frame_stride,
         config.audio.extension,
         config.audio.feature_extraction,
-        config.audio.normalize,
-        config.audio.spec_augment,
+        normalize,
+        config.audio.spec_augment and not config.audio.batch_spec_augment,
         config.audio.freq_mask_parameter,
         config.audio.num_time_mask,
         config.audio.num_freq_mask,
         config.train.sos_id,
         config.train.eos_id,
+        config.audio.feature_cache_path,
+        config.train.corpus_path,
     )
     valid_sampler = BucketingSampler(valid_dataset, batch_size=config.train.batch_size)
     valid_loader = AudioDataLoader(
         valid_dataset,
         batch_sampler=valid_sampler,
         num_workers=config.train.num_workers,
+        spec_augment=batch_spec_augment,
+        seed=config.train.seed,
+        preallocate=config.train.preallocate,
+        cmvn=cmvn,
+        num_buffers=config.train.num_prefetch + 3,  # batches staged by the prefetcher keep their buffers
     )
 
+    return train_loader, valid_loader, train_sampler
+
+
+def build_sharded_data_loaders(
+        config: DictConfig,
+        batch_spec_augment: BatchSpecAugment,
+        cmvn: GlobalCMVN = None,
+) -> Tuple[AudioDataLoader, AudioDataLoader, Any]:
+    data_loaders = list()
+
+    for split in ('train', 'valid'):
+        dataset = ShardedSpectrogramDataset(
+            os.path.join(config.train.shard_path, split),
+            config.audio.sampling_rate,
+            config.audio.n_mfcc if config.audio.feature_extraction == 'mfcc' else config.audio.n_mel,
+            config.audio.frame_length,
+            config.audio.frame_stride,
+            config.audio.feature_extraction,
+            config.audio.normalize and cmvn is None,
+            config.audio.spec_augment and not config.audio.batch_spec_augment,
+            config.audio.freq_mask_parameter,
+            config.audio.num_time_mask,
+            config.audio.num_freq_mask,
+            config.train.sos_id,
+            config.train.eos_id,
+            config.train.shuffle_buffer_size if split == 'train' else 0,
+            config.train.seed,
+        )
+        data_loaders.append(AudioDataLoader(
+            dataset,
+            batch_size=config.train.batch_size,
+            num_workers=config.train.num_workers,
+            spec_augment=batch_spec_augment,
+            seed=config.train.seed,
+            preallocate=config.train.preallocate,
+            cmvn=cmvn,
+            num_buffers=config.train.num_prefetch + 3,
+        ))
+
+    train_loader, valid_loader = data_loaders
+
+    return train_loader, valid_loader, None
+
+
+@hydra.main(config_path='configs', config_name='train')
+def main(config: DictConfig) -> None:
+    warnings.filterwarnings('ignore')
+    print(OmegaConf.to_yaml(config))
+
+    torch.manual_seed(config.train.seed)
+    torch.cuda.manual_seed_all(config.train.seed)
+    np.random.seed(config.train.seed)
+    random.seed(config.train.seed)
+
+    use_cuda = config.train.cuda and torch.cuda.is_available()
+    device = torch.device('cuda' if use_cuda else 'cpu')
+
+    char2id, id2char = load_label(config.train.label_path, config.train.blank_id)
+    train_loader, valid_loader, train_sampler = build_data_loaders(config)
+
     model = build_model(config, device)
 
     optimizer = optim.Adam(model.parameters(), lr=config.train.lr)
 
     print('Start Train !!!')
     for epoch in range(0, config.train.epochs):
+        train_loader.set_epoch(epoch)
+        valid_loader.set_epoch(epoch)
         train(config, model, device, train_loader, valid_loader, train_sampler, optimizer, epoch, id2char, epoch)
 
         if epoch % 2 == 0:
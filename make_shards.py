@@ -0,0 +1,48 @@
+# MIT License
+#
+# Copyright (c) 2021 Sangchun Ha
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+import os
+import argparse
+import numpy as np
+from data.data_loader import write_shards
+from vocabulary import load_dataset
+
+
+parser = argparse.ArgumentParser(description='convert transcripts and audio into shards')
+parser.add_argument('--dataset_path', type=str, default='')
+parser.add_argument('--audio_path', type=str, default='')
+parser.add_argument('--shard_path', type=str, default='')
+parser.add_argument('--utterances_per_shard', type=int, default=1000)
+parser.add_argument('--extension', type=str, default='pcm')
+parser.add_argument('--sampling_rate', type=int, default=16000)
+parser.add_argument('--mode', type=str, default='train')
+parser.add_argument('--seed', type=int, default=22)
+args = parser.parse_args()
+
+np.random.seed(args.seed)
+audio_paths, transcripts, valid_audio_paths, valid_transcripts = load_dataset(args.dataset_path, args.mode)
+
+if args.mode == 'train':
+    splits = {'train': (audio_paths, transcripts), 'valid': (valid_audio_paths, valid_transcripts)}
+else:
+    splits = {'eval': (audio_paths, transcripts)}
+
+for split, (split_audio_paths, split_transcripts) in splits.items():
+    num_shards = write_shards(
+        args.audio_path,
+        split_audio_paths,
+        split_transcripts,
+        os.path.join(args.shard_path, split),
+        args.utterances_per_shard,
+        args.extension,
+        args.sampling_rate,
+    )
+    print('{} : {} utterances are written to {} shards'.format(split, len(split_audio_paths), num_shards))
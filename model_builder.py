@@ -9,12 +9,14 @@
 # copies of the Software, and to permit persons to whom the Software is
 # furnished to do so, subject to the following conditions:
 
+import inspect
 import torch
 import torch.nn as nn
 from models.las.encoder import Encoder
 from models.las.decoder import Decoder
 from models.las.model import ListenAttendSpell
 from models.deepspeech2.model import DeepSpeech2
+from models.quantization import is_quantized
 from omegaconf import DictConfig
 
 
@@ -26,18 +28,31 @@ def build_model(config: DictConfig, device: torch.device):
         return build_ds2_model(config, device)
 
 
-def load_test_model(config: DictConfig, device: torch.device) -> nn.Module:
-    model = torch.load(config.eval.model_path, map_location=lambda storage, loc: storage).to(device)
+def load_model(model_path: str, device: torch.device) -> nn.Module:
+    """ Loads a whole model saved with torch.save, fp32 or dynamically quantized by quantize.py """
+    # checkpoints are pickled modules, not only weights
+    kwargs = {'weights_only': False} if 'weights_only' in inspect.signature(torch.load).parameters else {}
+    model = torch.load(model_path, map_location=lambda storage, loc: storage, **kwargs)
 
     if isinstance(model, nn.DataParallel):
         model = model.module
 
-    model.encoder.device = device
-    model.decoder.device = device
+    if is_quantized(model) and device.type != 'cpu':
+        raise ValueError('{} is a quantized model, which runs on CPU only'.format(model_path))
+
+    model = model.to(device)
+
+    if isinstance(model, ListenAttendSpell):
+        model.encoder.device = device
+        model.decoder.device = device
 
     return model
 
 
+def load_test_model(config: DictConfig, device: torch.device) -> nn.Module:
+    return load_model(config.eval.model_path, device)
+
+
 def build_encoder(config: DictConfig) -> Encoder:
     return Encoder(
         config.train.num_vocabs,
@@ -85,4 +100,5 @@ def build_ds2_model(config: DictConfig, device: torch.device) -> DeepSpeech2:
         config.model.dropout,
         config.model.bidirectional,
         config.model.rnn_type,
+        config.model.lookahead_context,
     ).to(device)
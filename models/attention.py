@@ -11,12 +11,27 @@
 
 import torch
 from torch import Tensor
-from typing import Tuple
+from typing import NamedTuple, Optional, Tuple
 import numpy as np
 import torch.nn as nn
 import torch.nn.functional as F
 
 
+class AttentionCache(NamedTuple):
+    """
+    Keys and values of an attention computed once per utterance from the encoder output and reused by every
+    decoder step, with the padding mask of the keys if the attention supports it. All are batch-first,
+    so hypotheses of finished utterances are dropped with select.
+    """
+    key: Tensor
+    value: Tensor
+    mask: Optional[Tensor] = None
+
+    def select(self, indices: Tensor) -> 'AttentionCache':
+        mask = self.mask[indices] if self.mask is not None else None
+        return AttentionCache(self.key[indices], self.value[indices], mask)
+
+
 class ScaledDotProductAttention(nn.Module):
     """
     Compute the dot products of the query with all keys, divide each by sqrt(key_dim),
@@ -25,10 +40,11 @@ class ScaledDotProductAttention(nn.Module):
     Args: key_dim
         key_dim (int): dimension of key
 
-    Inputs: query, key, value
+    Inputs: query, key, value, cache
         - **query** (batch, q_len, hidden_dim): tensor containing projection vector for decoder
         - **key** (batch, k_len, hidden_dim): tensor containing projection vector for encoder
         - **value** (batch, v_len, hidden_dim): value and key are the same in the las structure
+        - **cache** (AttentionCache): keys and values from precompute, if given, key and value are not used
 
     Returns: context, attn_distribution
         - **context** (batch, dec_len, dec_hidden): tensor containing the context vector from attention mechanism
@@ -41,13 +57,21 @@ class ScaledDotProductAttention(nn.Module):
         super(ScaledDotProductAttention, self).__init__()
         self.sqrt_key_dim = np.sqrt(key_dim)
 
+    def precompute(self, key: Tensor, value: Tensor) -> AttentionCache:
+        """ Transposed keys ``(batch, hidden_dim, k_len)`` and values """
+        return AttentionCache(key.transpose(-2, -1).contiguous(), value)
+
     def forward(
             self,
             query: Tensor,
             key: Tensor,
             value: Tensor,
+            cache: Optional[AttentionCache] = None,
     ) -> Tuple[Tensor, Tensor]:
-        key = key.transpose(-2, -1)  # transpose 이후 key shape : (batch, enc_D << 1, enc_T)
+        if cache is None:
+            cache = self.precompute(key, value)
+
+        key, value = cache.key, cache.value  # key shape : (batch, enc_D << 1, enc_T)
         attn_distribution = torch.bmm(query, key) / self.sqrt_key_dim
         attn_distribution = F.softmax(attn_distribution, dim=-1)  # (batch, dec_T, enc_T)
         context = torch.bmm(attn_distribution, value)  # context shape : (batch, dec_T, enc_D << 1)
@@ -56,6 +80,23 @@ class ScaledDotProductAttention(nn.Module):
 
 
 class MultiHeadAttention(nn.Module):
+    """
+    Splits the query, key and value into num_head heads and applies scaled dot-product attention to each head
+
+    Args:
+        key_dim (int): dimension of key
+        num_head (int): the number of heads
+
+    Inputs: query, key, value, cache
+        - **query** (batch, q_len, hidden_dim): tensor containing projection vector for decoder
+        - **key** (batch, k_len, hidden_dim): tensor containing projection vector for encoder
+        - **value** (batch, v_len, hidden_dim): value and key are the same in the las structure
+        - **cache** (AttentionCache): keys and values split into heads by precompute, if given, key and value are not used
+
+    Returns: context, attn_distribution
+        - **context** (batch, q_len, hidden_dim): tensor containing the context vector from attention mechanism
+        - **attn_distribution** (batch * num_head, q_len, k_len): tensor containing the attention of each head
+    """
     def __init__(
             self,
             key_dim: int,
@@ -66,23 +107,33 @@ class MultiHeadAttention(nn.Module):
         self.head_dim = key_dim // num_head
         self.scaled_dot = ScaledDotProductAttention(self.head_dim)
 
+    def precompute(self, key: Tensor, value: Tensor) -> AttentionCache:
+        """ Keys ``(batch, num_head, head_dim, k_len)`` and values ``(batch, num_head, v_len, head_dim)`` """
+        batch = key.size(0)
+
+        key = key.view(batch, -1, self.num_head, self.head_dim).permute(0, 2, 3, 1).contiguous()
+        value = value.view(batch, -1, self.num_head, self.head_dim).permute(0, 2, 1, 3).contiguous()
+
+        return AttentionCache(key, value)
+
     def forward(
             self,
             query: Tensor,
             key: Tensor,
             value: Tensor,
+            cache: Optional[AttentionCache] = None,
     ) -> Tuple[Tensor, Tensor]:
         batch = query.size(0)
 
-        query = query.view(batch, -1, self.num_head, self.head_dim)
-        key = key.view(batch, -1, self.num_head, self.head_dim)
-        value = value.view(batch, -1, self.num_head, self.head_dim)
+        if cache is None:
+            cache = self.precompute(key, value)
 
+        query = query.view(batch, -1, self.num_head, self.head_dim)
         query = query.permute(0, 2, 1, 3).contiguous().view(batch * self.num_head, -1, self.head_dim)
-        key = key.permute(0, 2, 1, 3).contiguous().view(batch * self.num_head, -1, self.head_dim)
-        value = value.permute(0, 2, 1, 3).contiguous().view(batch * self.num_head, -1, self.head_dim)
+        cache = AttentionCache(cache.key.view(batch * self.num_head, self.head_dim, -1),
+                               cache.value.view(batch * self.num_head, -1, self.head_dim))
 
-        context, attn_distribution = self.scaled_dot(query, key, value)
+        context, attn_distribution = self.scaled_dot(query, None, None, cache)
 
         context = context.view(batch, self.num_head, -1, self.head_dim)
         context = context.permute(0, 2, 1, 3).contiguous().view(batch, -1, self.num_head * self.head_dim)  # (B, T, D)
@@ -90,6 +141,90 @@ class MultiHeadAttention(nn.Module):
         return context, attn_distribution
 
 
+class FusedMultiHeadAttention(nn.Module):
+    """
+    Multi-head attention that ignores padded encoder frames.
+    Heads are strided views of the query, key and value instead of contiguous copies, and the attention is computed
+    with torch.nn.functional.scaled_dot_product_attention where available, which does not materialize the
+    attention weights. The weights are computed explicitly only if need_weights is set, e.g. for visualization.
+    Without padding, the output is the same as MultiHeadAttention.
+
+    Args:
+        key_dim (int): dimension of key
+        num_head (int): the number of heads
+
+    Inputs: query, key, value, cache, key_lengths, need_weights
+        - **query** (batch, q_len, hidden_dim): tensor containing projection vector for decoder
+        - **key** (batch, k_len, hidden_dim): tensor containing projection vector for encoder
+        - **value** (batch, v_len, hidden_dim): value and key are the same in the las structure
+        - **cache** (AttentionCache): keys, values and padding mask from precompute, if given, key, value and
+          key_lengths are not used
+        - **key_lengths** (batch): valid length of each key, if None, no frame is masked
+        - **need_weights** (bool): flag indication returning the attention weights or not (default: False)
+
+    Returns: context, attn_distribution
+        - **context** (batch, q_len, hidden_dim): tensor containing the context vector from attention mechanism
+        - **attn_distribution** (batch * num_head, q_len, k_len): tensor containing the attention of each head,
+          None unless need_weights
+    """
+    def __init__(
+            self,
+            key_dim: int,
+            num_head: int,
+    ) -> None:
+        super(FusedMultiHeadAttention, self).__init__()
+        self.num_head = num_head
+        self.head_dim = key_dim // num_head
+        self.sqrt_head_dim = np.sqrt(self.head_dim)
+
+    def precompute(self, key: Tensor, value: Tensor, key_lengths: Optional[Tensor] = None) -> AttentionCache:
+        """ Keys and values ``(batch, num_head, k_len, head_dim)`` as views, padding mask ``(batch, 1, 1, k_len)`` """
+        batch, k_len = key.size(0), key.size(1)
+
+        key = key.view(batch, k_len, self.num_head, self.head_dim).transpose(1, 2)
+        value = value.view(batch, k_len, self.num_head, self.head_dim).transpose(1, 2)
+        mask = None
+
+        if key_lengths is not None:
+            positions = torch.arange(k_len, device=key.device)
+            mask = (positions < key_lengths.to(key.device).unsqueeze(1)).view(batch, 1, 1, k_len)
+
+        return AttentionCache(key, value, mask)
+
+    def forward(
+            self,
+            query: Tensor,
+            key: Tensor,
+            value: Tensor,
+            cache: Optional[AttentionCache] = None,
+            key_lengths: Optional[Tensor] = None,
+            need_weights: bool = False,
+    ) -> Tuple[Tensor, Optional[Tensor]]:
+        batch, q_len = query.size(0), query.size(1)
+
+        if cache is None:
+            cache = self.precompute(key, value, key_lengths)
+
+        key, value, mask = cache
+        query = query.view(batch, q_len, self.num_head, self.head_dim).transpose(1, 2)  # (B, H, Q, head_dim)
+        attn_distribution = None
+
+        if need_weights or not hasattr(F, 'scaled_dot_product_attention'):
+            score = torch.matmul(query, key.transpose(-2, -1)) / self.sqrt_head_dim  # (B, H, Q, enc_T)
+            if mask is not None:
+                score = score.masked_fill(~mask, float('-inf'))
+            attn_distribution = F.softmax(score, dim=-1)
+            context = torch.matmul(attn_distribution, value)
+            attn_distribution = attn_distribution.view(batch * self.num_head, q_len, -1)
+
+        else:
+            context = F.scaled_dot_product_attention(query, key, value, attn_mask=mask)  # (B, H, Q, head_dim)
+
+        context = context.transpose(1, 2).reshape(batch, q_len, self.num_head * self.head_dim)  # (B, Q, D)
+
+        return context, attn_distribution
+
+
 class LocationAwareAttention(nn.Module):
     """
     Applies a location-aware attention mechanism on the output features from the decoder.
@@ -101,15 +236,18 @@ class LocationAwareAttention(nn.Module):
         attn_dim (int): dimension of attention
         smoothing (bool): flag indication smoothing or not.
 
-    Inputs: query, value, last_attn
+    Inputs: query, key, value, last_attn_distribution, cache
         - **query** (batch, q_len, hidden_dim): tensor containing the output features from the decoder.
         - **key** (batch, k_len, hidden_dim): tensor containing features of the encoded input sequence.
         - **value** (batch, v_len, hidden_dim): value and key are the same in the las structure
-        - **last_attn_distribution** (batch_size, k_len): tensor containing previous timestep`s attention weight
+        - **last_attn_distribution** (batch, k_len) or (batch, q_len, k_len): tensor containing previous timestep`s
+          attention weight of each query, e.g. each beam hypothesis of an utterance
+        - **cache** (AttentionCache): projected keys and values from precompute, if given, key and value are not used
 
     Returns: context, attn_distribution
-        - **context** (batch, output_len, hidden_dim): tensor containing the feature from encoder outputs
-        - **attn_distribution** (batch, k_len): tensor containing the attention weight from the encoder outputs.
+        - **context** (batch, q_len, hidden_dim): tensor containing the feature from encoder outputs
+        - **attn_distribution** (batch, k_len) or (batch, q_len, k_len): tensor containing the attention weight
+          from the encoder outputs, same shape as last_attn_distribution
     """
     def __init__(
             self,
@@ -127,32 +265,49 @@ class LocationAwareAttention(nn.Module):
         self.fc = nn.Linear(attn_dim, 1, bias=True)
         self.smoothing = smoothing
 
+    def precompute(self, key: Tensor, value: Tensor) -> AttentionCache:
+        """ Keys projected to ``(batch, k_len, attn_dim)`` once per utterance and values """
+        return AttentionCache(self.key_linear(key), value)
+
     def forward(
             self,
             query: Tensor,
             key: Tensor,
             value: Tensor,
             last_attn_distribution: Tensor,
+            cache: Optional[AttentionCache] = None,
     ) -> Tuple[Tensor, Tensor]:
+        if cache is None:
+            cache = self.precompute(key, value)
+
+        key, value = cache.key, cache.value
+        batch, q_len = query.size(0), query.size(1)
+        k_len = key.size(1)
+        squeeze = last_attn_distribution is None or last_attn_distribution.dim() == 2
 
         if last_attn_distribution is None:
-            last_attn_distribution = key.new_zeros(key.size(0), key.size(1))  # (B, enc_T)
+            last_attn_distribution = key.new_zeros(batch, q_len, k_len)  # (B, Q, enc_T)
 
-        last_attn_distribution = last_attn_distribution.unsqueeze(1)
-        last_attn_distribution = self.conv(last_attn_distribution).transpose(1, 2)  # (B, enc_T, attn_dim)
+        last_attn_distribution = last_attn_distribution.reshape(batch * q_len, 1, k_len)
+        last_attn_distribution = self.conv(last_attn_distribution).transpose(1, 2)  # (B * Q, enc_T, attn_dim)
+        last_attn_distribution = last_attn_distribution.view(batch, q_len, k_len, self.attn_dim)
 
-        attn_distribution = self.fc(torch.tanh(self.query_linear(query)
-                                               + self.key_linear(key)
+        # the key projection is computed once per utterance and broadcast over the queries
+        attn_distribution = self.fc(torch.tanh(self.query_linear(query).unsqueeze(2)
+                                               + key.unsqueeze(1)
                                                + last_attn_distribution
-                                               + self.bias)).squeeze(-1)
+                                               + self.bias)).squeeze(-1)  # (B, Q, enc_T)
 
         if self.smoothing:
             attn_distribution = torch.sigmoid(attn_distribution)
-            attn_distribution = torch.div(attn_distribution, attn_distribution.sum(dim=1).unsqueeze(1))
+            attn_distribution = torch.div(attn_distribution, attn_distribution.sum(dim=-1).unsqueeze(-1))
 
         else:
-            attn_distribution = F.softmax(attn_distribution, dim=-1)  # (B, enc_T)
+            attn_distribution = F.softmax(attn_distribution, dim=-1)  # (B, Q, enc_T)
+
+        context = torch.bmm(attn_distribution, value)  # (B, Q, enc_D << 1)
 
-        context = torch.bmm(attn_distribution.unsqueeze(1), value)  # (B, 1, enc_D << 1)
+        if squeeze and q_len == 1:
+            attn_distribution = attn_distribution.squeeze(1)  # (B, enc_T)
 
         return context, attn_distribution
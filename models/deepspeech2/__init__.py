@@ -21,4 +21,11 @@ class DeepSpeech2Config:
     dropout: float = 0.3
     bidirectional: bool = True
     rnn_type: str = 'gru'
+    lookahead_context: int = 0
     mode: str = 'train'
+
+
+@dataclass
+class StreamingDeepSpeech2Config(DeepSpeech2Config):
+    bidirectional: bool = False
+    lookahead_context: int = 20
@@ -10,71 +10,12 @@
 # furnished to do so, subject to the following conditions:
 
 import math
-import torch
 import torch.nn as nn
 import torch.nn.functional as F
 from torch import Tensor
 from typing import Tuple
 from torch.nn.utils.rnn import pack_padded_sequence, pad_packed_sequence
-
-
-class MaskConv(nn.Module):
-    """
-        Masking Convolutional Neural Network
-
-        Refer to https://github.com/sooftware/KoSpeech/blob/jasper/kospeech/models/modules.py
-        Copyright (c) 2020 Soohwan Kim
-
-    """
-
-    def __init__(
-            self,
-            sequential: nn.Sequential
-    ) -> None:
-        super(MaskConv, self).__init__()
-        self.sequential = sequential
-
-    def forward(
-            self,
-            inputs: Tensor,
-            seq_lens: Tensor
-    ) -> Tuple[Tensor, Tensor]:
-        output = None
-
-        for module in self.sequential:
-            output = module(inputs)
-
-            mask = torch.BoolTensor(output.size()).fill_(0)
-            if output.is_cuda:
-                mask = mask.cuda()
-
-            seq_lens = self.get_seq_lens(module, seq_lens)
-
-            for idx, seq_len in enumerate(seq_lens):
-                seq_len = seq_len.item()
-
-                if (mask[idx].size(2) - seq_len) > 0:
-                    mask[idx].narrow(2, seq_len, mask[idx].size(2) - seq_len).fill_(1)
-
-            output = output.masked_fill(mask, 0)
-            inputs = output
-
-        return output, seq_lens
-
-    def get_seq_lens(
-            self,
-            module: nn.Module,
-            seq_lens: Tensor
-    ) -> Tensor:
-        if isinstance(module, nn.Conv2d):
-            seq_lens = seq_lens + (2 * module.padding[1]) - module.dilation[1] * (module.kernel_size[1] - 1) - 1
-            seq_lens = seq_lens.float() / float(module.stride[1])
-            seq_lens = seq_lens.int() + 1
-
-        if isinstance(module, nn.MaxPool2d):
-            seq_lens >>= 1
-
-        return seq_lens.int()
+from models.modules import Lookahead, MaskConv
 
 
 class DeepSpeech2(nn.Module):
@@ -89,6 +30,8 @@ class DeepSpeech2(nn.Module):
         dropout (float): dropout probability of encoder (default: 0.3)
         bidirectional (bool): if True, becomes a bidirectional encoder (default: True)
         rnn_type (str): type of RNN cell (default: gru)
+        lookahead_context (int): the number of future frames of the lookahead convolution after a unidirectional
+            RNN, if 0, not used (default: 0)
 
     Inputs: inputs, input_lengths
         - **inputs**: Parsed audio of batch size number
@@ -111,6 +54,7 @@ class DeepSpeech2(nn.Module):
                  dropout: float = 0.3,
                  bidirectional: bool = True,
                  rnn_type: str = 'gru',
+                 lookahead_context: int = 0,
                  ) -> None:
         super(DeepSpeech2, self).__init__()
         input_size = int(math.floor(input_size + 2 * 20 - 41) / 2 + 1)
@@ -123,6 +67,7 @@ class DeepSpeech2(nn.Module):
         self.num_layers = num_layers
         self.dropout = dropout
         self.bidirectional = bidirectional
+        self.lookahead_context = lookahead_context
         self.conv = MaskConv(nn.Sequential(
             nn.Conv2d(in_channels=1, out_channels=32, kernel_size=(41, 11), stride=(2, 2), padding=(20, 5)),
             nn.BatchNorm2d(num_features=32),
@@ -132,8 +77,20 @@ class DeepSpeech2(nn.Module):
             nn.Hardtanh(min_val=0, max_val=20, inplace=True)
         ))
         self.rnn_output_size = hidden_size << 1 if bidirectional else hidden_size
+        self.lookahead = None
+        if lookahead_context > 0 and not bidirectional:
+            self.lookahead = nn.Sequential(
+                Lookahead(self.rnn_output_size, lookahead_context),
+                nn.Hardtanh(min_val=0, max_val=20, inplace=True),
+            )
         self.fc = nn.Linear(self.rnn_output_size, num_vocabs)
 
+    def __setstate__(self, state: dict) -> None:
+        super(DeepSpeech2, self).__setstate__(state)
+        if 'lookahead' not in self._modules:  # saved before the lookahead convolution was added
+            self.lookahead_context = 0
+            self.lookahead = None
+
     def forward(self,
                 inputs: Tensor,
                 input_lengths: Tensor
@@ -149,6 +106,9 @@ class DeepSpeech2(nn.Module):
         rnn_output, _ = self.rnn(conv_output)
         rnn_output, _ = pad_packed_sequence(rnn_output, batch_first=True)
 
+        if self.lookahead is not None:
+            rnn_output = self.lookahead(rnn_output)
+
         rnn_output_prob = self.fc(rnn_output)
         rnn_output_prob = F.log_softmax(rnn_output_prob, dim=-1)  # (B, T, num_vocabs)
 
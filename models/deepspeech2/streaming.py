@@ -0,0 +1,208 @@
+# MIT License
+#
+# Copyright (c) 2021 Sangchun Ha
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from torch import Tensor
+from typing import List, Optional, Union
+from models.deepspeech2.model import DeepSpeech2
+
+
+class StreamingDeepSpeech2(object):
+    """
+    Chunked, stateful inference of a unidirectional DeepSpeech2 (bidirectional=False, e.g. model=streaming_deepspeech2).
+    Feature chunks of any length are accepted, and the log probabilities of every frame whose receptive field
+    is complete are returned, the same as running the model on the concatenated features.
+
+    Between calls, each convolution keeps the input frames its next window still needs, starting from its zero
+    padding, the RNN keeps its hidden state, and the lookahead convolution keeps its last context frames.
+    The right padding of the convolutions and the lookahead is added by finish. The output of a frame is thus
+    delayed by the right context of the convolutions (15 feature frames for the default model) and
+    lookahead_context output frames.
+
+    Args:
+        model (DeepSpeech2): unidirectional model in eval mode
+        blank_id (int): index of the blank token
+        sos_id (int): index of the start of sentence, dropped from the output (default: 1)
+        eos_id (int): index of the end of sentence, dropped from the output (default: 2)
+        feature_extractor (StreamingFeatureExtractor): extractor of the features the model was trained with,
+            needed to feed audio with accept_waveform (default: None)
+
+    Inputs: feature
+        - **feature** (batch, dimension, chunk_len): next frames of each stream, streams are fed in lockstep
+
+    Returns: tokens
+        - **tokens** (list): for each stream, the tokens decoded by greedy CTC since the previous call
+    """
+    def __init__(
+            self,
+            model: DeepSpeech2,
+            blank_id: int,
+            sos_id: int = 1,
+            eos_id: int = 2,
+            feature_extractor=None,
+    ) -> None:
+        if model.bidirectional:
+            raise ValueError('Streaming inference needs a unidirectional DeepSpeech2 (bidirectional=False)')
+
+        self.model = model.eval()
+        self.blank_id = blank_id
+        self.sos_id = sos_id
+        self.eos_id = eos_id
+        self.feature_extractor = feature_extractor
+        self.reset()
+
+    def reset(self) -> None:
+        """ Starts new streams """
+        self.conv_buffers = [None] * len(self.model.conv.sequential)
+        self.hidden = None
+        self.lookahead_buffer = None
+        self.last_tokens = None
+        self.hypotheses = None
+        self.num_frames = 0
+
+        if self.feature_extractor is not None:
+            self.feature_extractor.reset()
+
+    @property
+    def right_context(self) -> int:
+        """ Feature frames needed after a frame before its log probabilities are final """
+        context, rate = 0, 1
+
+        for module in self.model.conv.sequential:
+            if isinstance(module, nn.Conv2d):
+                context += module.padding[1] * rate
+                rate *= module.stride[1]
+
+        if self.model.lookahead is not None:
+            context += self.model.lookahead[0].context * rate
+
+        return context
+
+    def _conv(self, idx: int, conv: nn.Conv2d, inputs: Tensor, is_last: bool) -> Tensor:
+        padding, stride = conv.padding[1], conv.stride[1]
+        kernel_size = conv.dilation[1] * (conv.kernel_size[1] - 1) + 1
+
+        buffer = self.conv_buffers[idx]
+        if buffer is None:  # left padding of the stream
+            buffer = inputs.new_zeros(inputs.size()[:3] + (padding, ))
+
+        buffer = torch.cat((buffer, inputs), dim=3)
+        if is_last:
+            buffer = F.pad(buffer, (0, padding))
+
+        num_frames = (buffer.size(3) - kernel_size) // stride + 1 if buffer.size(3) >= kernel_size else 0
+
+        if num_frames > 0:
+            output = F.conv2d(buffer[..., :(num_frames - 1) * stride + kernel_size], conv.weight, conv.bias,
+                              conv.stride, (conv.padding[0], 0), conv.dilation, conv.groups)
+        else:
+            output_size = (inputs.size(2) + 2 * conv.padding[0] - conv.dilation[0] * (conv.kernel_size[0] - 1)
+                           - 1) // conv.stride[0] + 1
+            output = inputs.new_zeros(inputs.size(0), conv.out_channels, output_size, 0)
+
+        self.conv_buffers[idx] = buffer[..., num_frames * stride:]
+
+        return output
+
+    def _lookahead(self, inputs: Tensor, is_last: bool) -> Tensor:
+        lookahead, activation = self.model.lookahead
+        context = lookahead.context
+
+        buffer = inputs if self.lookahead_buffer is None else torch.cat((self.lookahead_buffer, inputs), dim=1)
+        if is_last:
+            buffer = F.pad(buffer, (0, 0, 0, context))
+
+        num_frames = max(buffer.size(1) - context, 0)
+        self.lookahead_buffer = buffer[:, num_frames:]
+
+        if num_frames == 0:
+            return buffer[:, :0]
+
+        output = lookahead.conv(buffer[:, :num_frames + context].transpose(1, 2)).transpose(1, 2)
+
+        return activation(output)
+
+    @torch.no_grad()
+    def forward_chunk(self, feature: Tensor, is_last: bool = False) -> Tensor:
+        """
+        Log probabilities of the frames completed by feature, ``(batch, dimension, chunk_len)`` =>
+        ``(batch, num_frames, num_vocabs)``. With is_last, the stream is flushed.
+        """
+        model = self.model
+        output = feature.to(next(model.parameters()).device).unsqueeze(1)  # (B, 1, D, T)
+
+        for idx, module in enumerate(model.conv.sequential):
+            if isinstance(module, nn.Conv2d):
+                output = self._conv(idx, module, output, is_last)
+            elif output.size(3) > 0:
+                output = module(output)
+
+        batch, num_channels, hidden_size, seq_len = output.size()
+        output = output.permute(0, 3, 1, 2).reshape(batch, seq_len, num_channels * hidden_size)  # (B, T, C * D)
+
+        if output.size(1) > 0:
+            output, self.hidden = model.rnn(output, self.hidden)
+        else:
+            output = output.new_zeros(output.size(0), 0, model.rnn_output_size)
+
+        if model.lookahead is not None:
+            output = self._lookahead(output, is_last)
+
+        self.num_frames += output.size(1)
+
+        return F.log_softmax(model.fc(output), dim=-1)
+
+    def decode(self, log_probs: Tensor) -> List[List[int]]:
+        """ Greedy CTC over the next frames, repeated tokens are collapsed across chunk boundaries """
+        batch = log_probs.size(0)
+
+        if self.last_tokens is None:
+            self.last_tokens = [self.blank_id] * batch
+            self.hypotheses = [list() for _ in range(batch)]
+
+        new_tokens = list()
+
+        for idx, tokens in enumerate(log_probs.argmax(dim=-1).tolist()):
+            emitted = list()
+
+            for token in tokens:
+                if token != self.last_tokens[idx] and token not in (self.blank_id, self.sos_id, self.eos_id):
+                    emitted.append(token)
+                self.last_tokens[idx] = token
+
+            self.hypotheses[idx].extend(emitted)
+            new_tokens.append(emitted)
+
+        return new_tokens
+
+    def __call__(self, feature: Tensor) -> List[List[int]]:
+        return self.decode(self.forward_chunk(feature))
+
+    def accept_waveform(self, sound: Union[np.ndarray, Tensor]) -> List[int]:
+        """ Extracts the features of the next samples of a single stream and decodes them """
+        return self(self.feature_extractor(sound))[0]
+
+    def finish_waveform(self, sound: Optional[Union[np.ndarray, Tensor]] = None) -> List[int]:
+        """ Decodes the last samples, if any, with the right padding of the feature extractor and of the model """
+        return self.finish(self.feature_extractor.finish(sound))[0]
+
+    def finish(self, feature: Optional[Tensor] = None) -> List[List[int]]:
+        """ Decodes the last chunk, if any, and the frames held back for the right context """
+        if feature is None:
+            buffer = self.conv_buffers[0]  # (B, 1, D, T)
+            if buffer is None:
+                return list()
+            feature = buffer.new_zeros(buffer.size(0), buffer.size(2), 0)
+
+        return self.decode(self.forward_chunk(feature, is_last=True))
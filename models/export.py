@@ -0,0 +1,335 @@
+# MIT License
+#
+# Copyright (c) 2021 Sangchun Ha
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+import copy
+import inspect
+import json
+import os
+import torch
+import torch.nn as nn
+from torch import Tensor
+from typing import Optional, Tuple
+from models.attention import AttentionCache
+from models.deepspeech2.model import DeepSpeech2
+from models.las.model import ListenAttendSpell
+from models.quantization import is_quantized
+from models.search import ctc_greedy_decode
+
+
+class EncoderExport(nn.Module):
+    """
+    LAS encoder returning only tensors, (feature, feature_lengths) => (encoder_output, encoder_output_lengths),
+    with the CTC log probabilities in between if with_ctc and the encoder has a CTC head
+    """
+    def __init__(self, encoder: nn.Module, with_ctc: bool = False) -> None:
+        super(EncoderExport, self).__init__()
+        self.encoder = encoder
+        self.with_ctc = with_ctc and encoder.use_joint_ctc_attention
+
+    def forward(self, feature: Tensor, feature_lengths: Tensor) -> Tuple[Tensor, ...]:
+        encoder_output, log_probs, encoder_output_lengths = self.encoder(feature, feature_lengths)
+
+        if self.with_ctc:
+            return encoder_output, log_probs, encoder_output_lengths
+
+        return encoder_output, encoder_output_lengths
+
+
+class DecoderPrecomputeExport(nn.Module):
+    """
+    Attention cache of the LAS decoder as tensors, (encoder_output, encoder_output_lengths) => (key, value, mask).
+    The mask is all True for attentions without padding mask.
+    """
+    def __init__(self, decoder: nn.Module) -> None:
+        super(DecoderPrecomputeExport, self).__init__()
+        self.decoder = decoder
+
+    def forward(self, encoder_output: Tensor, encoder_output_lengths: Tensor) -> Tuple[Tensor, Tensor, Tensor]:
+        cache = self.decoder.precompute(encoder_output, encoder_output_lengths)
+        mask = cache.mask
+        if mask is None:
+            mask = torch.ones(encoder_output.size(0), 1, 1, encoder_output.size(1), dtype=torch.bool,
+                              device=encoder_output.device)
+
+        return cache.key, cache.value, mask
+
+
+class DecoderStepExport(nn.Module):
+    """
+    Single step of the LAS decoder with the state as tensors,
+    (inputs, key, value, mask, attn_distribution, h, c) => (log_probs, attn_distribution, h, c).
+    attn_distribution ``(batch, enc_T)`` is used only by location-aware attention and c only by LSTM,
+    otherwise they are passed through. Zero attn_distribution, h and c are the initial state.
+    """
+    def __init__(self, decoder: nn.Module) -> None:
+        super(DecoderStepExport, self).__init__()
+        self.decoder = decoder
+        self.use_location = decoder.attn_mechanism == 'location'
+        self.use_mask = decoder.attn_mechanism == 'fused_multi_head'
+        self.use_cell = decoder.rnn.mode == 'LSTM'  # also for dynamically quantized LSTM
+
+    def forward(
+            self,
+            inputs: Tensor,
+            key: Tensor,
+            value: Tensor,
+            mask: Tensor,
+            attn_distribution: Tensor,
+            h: Tensor,
+            c: Tensor,
+    ) -> Tuple[Tensor, Tensor, Tensor, Tensor]:
+        cache = AttentionCache(key, value, mask if self.use_mask else None)
+        hidden = (h, c) if self.use_cell else h
+
+        # encoder_output is only used for its batch size when the cache is given
+        output, step_attn_distribution, hidden = self.decoder.forward_step(
+            inputs, value, attn_distribution if self.use_location else None, hidden, cache,
+        )
+
+        if self.use_location:
+            attn_distribution = step_attn_distribution
+        if self.use_cell:
+            h, c = hidden
+        else:
+            h = hidden
+
+        return output.squeeze(1), attn_distribution, h, c
+
+
+class LASGreedyRecognizer(nn.Module):
+    """
+    Scripted greedy decoding of ListenAttendSpell over traced encoder, attention cache and decoder step graphs.
+    The decoding loop runs in TorchScript, finished sequences are padded with eos and decoding stops once all of
+    them emitted eos, as Decoder.decode.
+
+    Inputs: feature, feature_lengths
+        - **feature** (batch, dimension, seq_len): padded features
+        - **feature_lengths** (batch): valid length of each feature
+
+    Returns: y_hat
+        - **y_hat** (batch, max_len): predicted tokens, padded with eos
+    """
+    def __init__(
+            self,
+            encoder: nn.Module,
+            precompute: nn.Module,
+            step: nn.Module,
+            sos_id: int,
+            eos_id: int,
+            max_len: int,
+            num_layers: int,
+            hidden_size: int,
+    ) -> None:
+        super(LASGreedyRecognizer, self).__init__()
+        self.encoder = encoder
+        self.precompute = precompute
+        self.step = step
+        self.sos_id = sos_id
+        self.eos_id = eos_id
+        self.max_len = max_len
+        self.num_layers = num_layers
+        self.hidden_size = hidden_size
+
+    def forward(self, feature: Tensor, feature_lengths: Tensor) -> Tensor:
+        encoder_output, encoder_output_lengths = self.encoder(feature, feature_lengths)
+        key, value, mask = self.precompute(encoder_output, encoder_output_lengths)
+
+        batch = encoder_output.size(0)
+        device = encoder_output.device
+        inputs = torch.full([batch], self.sos_id, dtype=torch.long, device=device)
+        attn_distribution = torch.zeros(batch, encoder_output.size(1), device=device)
+        h = torch.zeros(self.num_layers, batch, self.hidden_size, device=device)
+        c = torch.zeros(self.num_layers, batch, self.hidden_size, device=device)
+        finished = torch.zeros(batch, dtype=torch.bool, device=device)
+        y_hat = torch.full([batch, self.max_len], self.eos_id, dtype=torch.long, device=device)
+
+        for step in range(self.max_len):
+            log_probs, attn_distribution, h, c = self.step(inputs, key, value, mask, attn_distribution, h, c)
+            inputs = log_probs.argmax(dim=-1).masked_fill(finished, self.eos_id)
+            y_hat[:, step] = inputs
+            finished = finished | (inputs == self.eos_id)
+
+            if bool(finished.all()):
+                break
+
+        return y_hat
+
+
+class CTCGreedyRecognizer(nn.Module):
+    """ Scripted best path decoding of a traced DeepSpeech2, (feature, feature_lengths) => y_hat padded with eos """
+    def __init__(self, model: nn.Module, blank_id: int, sos_id: int, eos_id: int) -> None:
+        super(CTCGreedyRecognizer, self).__init__()
+        self.model = model
+        self.blank_id = blank_id
+        self.sos_id = sos_id
+        self.eos_id = eos_id
+
+    def forward(self, feature: Tensor, feature_lengths: Tensor) -> Tensor:
+        log_probs, output_lengths = self.model(feature, feature_lengths)
+        return ctc_greedy_decode(log_probs, output_lengths, self.blank_id, self.sos_id, self.eos_id)
+
+
+def _trace(module: nn.Module, example_inputs: tuple) -> torch.jit.ScriptModule:
+    with torch.no_grad():
+        return torch.jit.trace(module.eval(), example_inputs, check_trace=False)
+
+
+def export_model(
+        model: nn.Module,
+        export_dir: str,
+        blank_id: int,
+        sos_id: int = 1,
+        eos_id: int = 2,
+        max_len: int = 120,
+        id2char: Optional[dict] = None,
+        input_size: int = 80,
+) -> dict:
+    """
+    Exports DeepSpeech2, or the encoder, attention cache and single-step decoder of ListenAttendSpell, as TorchScript.
+    Every module is traced on CPU with an example batch of different lengths, so batch and time axes stay dynamic,
+    and wrapped in a scripted greedy recognizer written to model.pt. The LAS graphs are also written separately
+    (encoder.pt, decoder_precompute.pt, decoder_step.pt) for other search algorithms.
+    meta.json holds the token ids and the vocabulary, read by deploy.runtime without project imports.
+    A copy of the model is exported, so a model in training keeps its device and training mode.
+
+    Args:
+        model (nn.Module): trained DeepSpeech2 or ListenAttendSpell
+        export_dir (str): directory where the artifacts are written
+        blank_id (int): index of blank
+        sos_id (int): index of the start of sentence (default: 1)
+        eos_id (int): index of the end of sentence (default: 2)
+        max_len (int): maximum number of decoding steps of ListenAttendSpell (default: 120)
+        id2char (dict): dictionary that converts id to char, if None, not written (default: None)
+        input_size (int): dimension of the feature (default: 80)
+
+    Returns: meta
+        - **meta** (dict): architecture, token ids and files of the artifacts
+    """
+    os.makedirs(export_dir, exist_ok=True)
+    model = copy.deepcopy(model).cpu().eval()  # cpu, eval and the device attributes below change the model
+
+    feature = torch.randn(2, input_size, 160)
+    feature_lengths = torch.IntTensor([160, 120])
+    meta = {'blank_id': blank_id, 'sos_id': sos_id, 'eos_id': eos_id, 'max_len': max_len, 'input_size': input_size}
+
+    if isinstance(model, DeepSpeech2):
+        traced_model = _trace(model, (feature, feature_lengths))
+        recognizer = torch.jit.script(CTCGreedyRecognizer(traced_model, blank_id, sos_id, eos_id))
+        meta.update({'architecture': 'deepspeech2', 'files': ['model.pt']})
+
+    elif isinstance(model, ListenAttendSpell):
+        decoder = model.decoder
+        decoder.device = torch.device('cpu')
+        model.encoder.device = torch.device('cpu')
+
+        encoder = _trace(EncoderExport(model.encoder), (feature, feature_lengths))
+        with torch.no_grad():
+            encoder_output, encoder_output_lengths = encoder(feature, feature_lengths)
+        precompute = _trace(DecoderPrecomputeExport(decoder), (encoder_output, encoder_output_lengths))
+        with torch.no_grad():
+            key, value, mask = precompute(encoder_output, encoder_output_lengths)
+
+        batch, k_len = encoder_output.size(0), encoder_output.size(1)
+        state = torch.zeros(decoder.num_layers, batch, decoder.hidden_size)
+        step = _trace(DecoderStepExport(decoder), (
+            torch.full((batch,), sos_id, dtype=torch.long), key, value, mask, torch.zeros(batch, k_len), state, state,
+        ))
+
+        recognizer = torch.jit.script(LASGreedyRecognizer(
+            encoder, precompute, step, sos_id, eos_id, max_len, decoder.num_layers, decoder.hidden_size,
+        ))
+        encoder.save(os.path.join(export_dir, 'encoder.pt'))
+        precompute.save(os.path.join(export_dir, 'decoder_precompute.pt'))
+        step.save(os.path.join(export_dir, 'decoder_step.pt'))
+        meta.update({
+            'architecture': 'las',
+            'attn_mechanism': decoder.attn_mechanism,
+            'num_layers': decoder.num_layers,
+            'hidden_size': decoder.hidden_size,
+            'files': ['model.pt', 'encoder.pt', 'decoder_precompute.pt', 'decoder_step.pt'],
+        })
+
+    else:
+        raise ValueError('Unsupported model {}'.format(type(model).__name__))
+
+    recognizer.save(os.path.join(export_dir, 'model.pt'))
+
+    if id2char is not None:
+        meta['id2char'] = {str(idx): char for idx, char in id2char.items()}
+
+    with open(os.path.join(export_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+
+    return meta
+
+
+def export_onnx(
+        model: nn.Module,
+        export_dir: str,
+        input_size: int = 80,
+        opset_version: int = 17,
+) -> dict:
+    """
+    Exports DeepSpeech2 (model.onnx) or the encoder of ListenAttendSpell (encoder.onnx) to ONNX, for OnnxDeepSpeech2
+    and OnnxListenAttendSpell. Batch and time axes are dynamic. The MaskConv lengths are exported as tensor ops and
+    the packed sequences as the sequence_lens input of the ONNX RNN, so padded batches give the same output as torch.
+    The architecture is written to the metadata of the graph. A copy of the model is exported, so a model in training
+    keeps its device and training mode.
+
+    Args:
+        model (nn.Module): trained fp32 DeepSpeech2 or ListenAttendSpell
+        export_dir (str): directory where the graph is written
+        input_size (int): dimension of the feature (default: 80)
+        opset_version (int): ONNX opset (default: 17)
+
+    Returns: meta
+        - **meta** (dict): architecture, inputs, outputs and files of the graph
+    """
+    import onnx
+
+    if is_quantized(model):
+        raise ValueError('Dynamically quantized models can not be exported to ONNX, export the fp32 model')
+
+    os.makedirs(export_dir, exist_ok=True)
+    model = copy.deepcopy(model).cpu().eval()  # cpu, eval and the device attributes below change the model
+
+    feature = torch.randn(2, input_size, 160)
+    feature_lengths = torch.IntTensor([160, 120])
+    inputs = ['feature', 'feature_lengths']
+
+    if isinstance(model, DeepSpeech2):
+        module, file_name, architecture = model, 'model.onnx', 'deepspeech2'
+        outputs = ['log_probs', 'output_lengths']
+    elif isinstance(model, ListenAttendSpell):
+        module, file_name, architecture = EncoderExport(model.encoder, with_ctc=True).eval(), 'encoder.onnx', 'las'
+        model.encoder.device = torch.device('cpu')
+        outputs = ['encoder_output', 'log_probs', 'output_lengths'] if module.with_ctc else \
+            ['encoder_output', 'output_lengths']
+    else:
+        raise ValueError('Unsupported model {}'.format(type(model).__name__))
+
+    dynamic_axes = {'feature': {0: 'batch', 2: 'seq_len'}, 'feature_lengths': {0: 'batch'}}
+    for name in outputs:
+        dynamic_axes[name] = {0: 'batch'} if name == 'output_lengths' else {0: 'batch', 1: 'output_len'}
+
+    # packed sequences are supported by the TorchScript-based exporter
+    kwargs = {'dynamo': False} if 'dynamo' in inspect.signature(torch.onnx.export).parameters else {}
+    onnx_path = os.path.join(export_dir, file_name)
+
+    with torch.no_grad():
+        torch.onnx.export(module, (feature, feature_lengths), onnx_path, input_names=inputs, output_names=outputs,
+                          dynamic_axes=dynamic_axes, opset_version=opset_version, **kwargs)
+
+    graph = onnx.load(onnx_path)
+    graph.metadata_props.add(key='architecture', value=architecture)
+    onnx.save(graph, onnx_path)
+
+    return {'architecture': architecture, 'inputs': inputs, 'outputs': outputs, 'files': [file_name]}
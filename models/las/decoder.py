@@ -16,6 +16,8 @@ import torch.nn.functional as F
 from torch import Tensor
 from typing import Optional, Any, Tuple
 from models.attention import (
+    AttentionCache,
+    FusedMultiHeadAttention,
     ScaledDotProductAttention,
     LocationAwareAttention,
     MultiHeadAttention,
@@ -35,16 +37,18 @@ class Decoder(nn.Module):
         max_len (int): max length of label (default : 120)
         dropout (float): dropout probability of encoder (default: 0.3)
         rnn_type (str): type of RNN cell (default: lstm)
-        attn_mechanism (str): type of attention mechanism (default: location)
+        attn_mechanism (str): type of attention mechanism, location, scaled_dot, multi_head or fused_multi_head,
+            fused_multi_head ignores padded encoder frames (default: multi_head)
         smoothing (bool) : flag indication smoothing or not (default: False)
         sos_id (int): index of the start of sentence (default: 1)
         eos_id (int): index of the end of sentence (default: 2)
 
-    Inputs: inputs, encoder_output, teacher_forcing_ratio
+    Inputs: inputs, encoder_output, teacher_forcing_ratio, encoder_output_lengths
         - **inputs** (batch, seq_len): Used as ground truth when using teacher_forcing.
         - **encoder_output** (batch, seq_len, dimension): Tensor with containing the outputs of the encoder.
           Used in the attention mechanism.
         - **teacher_forcing_ratio** (float): The probability that teacher forcing will be used.
+        - **encoder_output_lengths** (batch): valid length of each encoder output, used by fused_multi_head
 
     Returns: decoder_output_prob
         - **decoder_output_prob** (batch, seq_len, num_vocabs): Tensor expressing the log probability value of each word
@@ -93,13 +97,44 @@ class Decoder(nn.Module):
             self.attention = ScaledDotProductAttention(hidden_size)
         elif self.attn_mechanism == 'multi_head':
             self.attention = MultiHeadAttention(hidden_size, num_head)
+        elif self.attn_mechanism == 'fused_multi_head':
+            self.attention = FusedMultiHeadAttention(hidden_size, num_head)
+
+    def precompute(self, encoder_output: Tensor, encoder_output_lengths: Optional[Tensor] = None) -> AttentionCache:
+        """
+        Keys and values of the attention, computed once per utterance and passed to every forward_step.
+        The padding mask from encoder_output_lengths is kept only by fused_multi_head.
+        """
+        if self.attn_mechanism == 'fused_multi_head':
+            return self.attention.precompute(encoder_output, encoder_output, encoder_output_lengths)
+
+        return self.attention.precompute(encoder_output, encoder_output)
 
     def forward_step(
             self,
             inputs: Tensor,
             encoder_output: Tensor,
             attn_distribution: Optional[Any] = None,
-    ) -> Tuple[Tensor, Tensor]:
+            hidden: Optional[Any] = None,
+            cache: Optional[AttentionCache] = None,
+    ) -> Tuple[Tensor, Tensor, Any]:
+        """
+        Decodes the input tokens from the given RNN hidden state.
+        The batch of inputs can be a multiple K of the batch of encoder_output, then every K consecutive inputs
+        are hypotheses of the same utterance and attend to its encoder output without copying it.
+
+        Args:
+            inputs (torch.LongTensor): input tokens ``(batch * K)`` or ``(batch, dec_T)``
+            encoder_output (torch.FloatTensor): Result value received from encoder ``(batch, seq_len, dimension)``
+            attn_distribution (torch.FloatTensor): previous attention of the location-aware attention ``(batch * K, seq_len)``
+            hidden (Tensor or tuple): previous RNN hidden state, (h, c) for lstm, if None, starts from zeros
+            cache (AttentionCache): keys and values from precompute, if None, computed from encoder_output
+
+        Returns:
+            **output** (Tensor): ``(batch, dec_T, num_vocabs)``
+            **attn_distribution** (Tensor): attention of this step
+            **hidden** (Tensor or tuple): RNN hidden state after the last input token
+        """
         context_vector = None
 
         if inputs.dim() == 1:
@@ -108,27 +143,37 @@ class Decoder(nn.Module):
         embedded = self.embedding(inputs).to(self.device)  # embedded shape : (batch, dec_T, embedding_dim)
         embedded = self.embedding_dropout(embedded)
 
-        rnn_output, _ = self.rnn(embedded)  # rnn_output shape : (batch, dec_T, dec_D)
+        rnn_output, hidden = self.rnn(embedded, hidden)  # rnn_output shape : (batch, dec_T, dec_D)
+
+        # beam hypotheses of an utterance are queries of the same encoder output, (batch * K, 1, dec_D) => (batch, K, dec_D)
+        batch = encoder_output.size(0)
+        query = rnn_output.reshape(batch, -1, rnn_output.size(-1))
 
         if self.attn_mechanism == 'location':
-            context_vector, attn_distribution = self.attention(rnn_output, encoder_output, encoder_output, attn_distribution)
+            if attn_distribution is not None:
+                attn_distribution = attn_distribution.view(batch, -1, attn_distribution.size(-1))
+            context_vector, attn_distribution = self.attention(query, encoder_output, encoder_output,
+                                                               attn_distribution, cache)
+            attn_distribution = attn_distribution.reshape(rnn_output.size(0), -1)  # (batch * K, enc_T)
         elif self.attn_mechanism == 'scaled_dot':
-            context_vector, attn_distribution = self.attention(rnn_output, encoder_output, encoder_output)
-        elif self.attn_mechanism == 'multi_head':
-            context_vector, attn_distribution = self.attention(rnn_output, encoder_output, encoder_output)
+            context_vector, attn_distribution = self.attention(query, encoder_output, encoder_output, cache)
+        elif self.attn_mechanism in ('multi_head', 'fused_multi_head'):
+            context_vector, attn_distribution = self.attention(query, encoder_output, encoder_output, cache)
 
+        context_vector = context_vector.reshape(rnn_output.size(0), rnn_output.size(1), -1)
         context_vector = torch.cat((context_vector, rnn_output), dim=-1)  # shape : (batch, dec_T, dec_D << 1)
 
         output = self.fc(torch.tanh(context_vector))  # output shape : (batch, dec_T, num_vocabs)
         output = F.log_softmax(output, dim=-1)
 
-        return output, attn_distribution
+        return output, attn_distribution, hidden
 
     def forward(
             self,
             inputs: Tensor,
             encoder_output: Tensor,
             teacher_forcing_ratio: float = 1.0,
+            encoder_output_lengths: Optional[Tensor] = None,
     ) -> Tensor:
         """
         Forward propagate a `encoder_output` for decoder training.
@@ -138,6 +183,7 @@ class Decoder(nn.Module):
                 `LongTensor` of size ``(batch, seq_length)``.
             encoder_output (torch.FloatTensor): Result value received from encoder ``(batch, seq_len, dimension)``
             teacher_forcing_ratio (float): Ratio of teacher forcing
+            encoder_output_lengths (torch.IntTensor): valid length of each encoder output ``(batch)``, if None, no mask
 
         Returns:
             **decoder_output_prob** (Tensor): ``(batch, seq_length, num_vocabs)``
@@ -146,7 +192,9 @@ class Decoder(nn.Module):
             self.rnn.flatten_parameters()
             
         attn_distribution = None
+        hidden = None
         decoder_output_prob = list()
+        cache = self.precompute(encoder_output, encoder_output_lengths)
 
         use_teacher_forcing = True if random.random() < teacher_forcing_ratio else False
         inputs, batch, max_len = self._validate_args(inputs, encoder_output, use_teacher_forcing)
@@ -156,17 +204,20 @@ class Decoder(nn.Module):
             if self.attn_mechanism == 'location':
                 for i in range(inputs.size(1)):
                     input_data = inputs[:, i]
-                    output, attn_distribution = self.forward_step(input_data, encoder_output, attn_distribution)
+                    output, attn_distribution, hidden = self.forward_step(input_data, encoder_output,
+                                                                          attn_distribution, hidden, cache)
                     output = output.squeeze(1)
                     decoder_output_prob.append(output)
                 decoder_output_prob = torch.stack(decoder_output_prob, dim=1)
 
             else:
-                decoder_output_prob, attn_distribution = self.forward_step(inputs, encoder_output, attn_distribution)
+                decoder_output_prob, attn_distribution, _ = self.forward_step(inputs, encoder_output,
+                                                                              attn_distribution, cache=cache)
 
         else:
             for _ in range(max_len):
-                output, attn_distribution = self.forward_step(inputs, encoder_output, attn_distribution)
+                output, attn_distribution, hidden = self.forward_step(inputs, encoder_output, attn_distribution,
+                                                                      hidden, cache)
                 output = output.squeeze(1)
                 decoder_output_prob.append(output)
                 inputs = output.topk(1)[1]  # [value, index]
@@ -175,6 +226,83 @@ class Decoder(nn.Module):
 
         return decoder_output_prob  # (B, T, D)
 
+    @torch.no_grad()
+    def decode(
+            self,
+            encoder_output: Tensor,
+            max_len: Optional[int] = None,
+            lm: Optional[Any] = None,
+            lm_weight: float = 0.0,
+            encoder_output_lengths: Optional[Tensor] = None,
+    ) -> Tensor:
+        """
+        Greedy decoding that carries the RNN and attention state across steps.
+        Sequences that emitted eos are dropped from the active batch and decoding stops once all of them finished,
+        so the number of steps follows the longest transcript instead of max_len.
+
+        Args:
+            encoder_output (torch.FloatTensor): Result value received from encoder ``(batch, seq_len, dimension)``
+            max_len (int): maximum number of decoding steps, if None, max_len of the decoder (default: None)
+            lm (NGramLanguageModel): language model for shallow fusion, if None, not used (default: None)
+            lm_weight (float): weight of the language model log probability (default: 0.0)
+            encoder_output_lengths (torch.IntTensor): valid length of each encoder output ``(batch)``, if None, no mask
+
+        Returns:
+            **y_hat** (Tensor): ``(batch, max_len)``, predicted tokens, padded with eos after the end of each sequence
+        """
+        max_len = self.max_len if max_len is None else max_len
+        batch = encoder_output.size(0)
+        device = encoder_output.device
+
+        y_hat = torch.full((batch, max_len), self.eos_id, dtype=torch.long, device=device)
+        active = torch.arange(batch, device=device)
+        inputs = torch.full((batch,), self.sos_id, dtype=torch.long, device=device)
+        attn_distribution = None
+        hidden = None
+        lm_states = lm.initial_state(batch) if lm is not None else None
+        cache = self.precompute(encoder_output, encoder_output_lengths)
+
+        for step in range(max_len):
+            output, attn_distribution, hidden = self.forward_step(inputs, encoder_output, attn_distribution,
+                                                                  hidden, cache)
+            log_probs = output.squeeze(1)
+
+            if lm is not None:
+                log_probs = log_probs + lm_weight * lm.score(lm_states, self.num_vocabs).to(device)
+
+            inputs = log_probs.argmax(dim=-1)  # (active)
+            y_hat[active, step] = inputs
+
+            if lm is not None:
+                lm_states = lm.advance(lm_states, inputs)
+
+            unfinished = inputs != self.eos_id
+
+            if not unfinished.all():
+                if not unfinished.any():
+                    break
+
+                active = active[unfinished]
+                inputs = inputs[unfinished]
+                encoder_output = encoder_output[unfinished]
+                cache = cache.select(unfinished)
+                hidden = self._select_hidden(hidden, unfinished)
+
+                if lm is not None:
+                    lm_states = lm_states[unfinished.cpu()]
+
+                if self.attn_mechanism == 'location':
+                    attn_distribution = attn_distribution[unfinished]
+
+        return y_hat
+
+    @staticmethod
+    def _select_hidden(hidden: Any, indices: Tensor) -> Any:
+        if isinstance(hidden, tuple):  # lstm (h, c)
+            return tuple(state[:, indices] for state in hidden)
+
+        return hidden[:, indices]
+
     def _validate_args(
             self,
             inputs: Tensor,
@@ -12,69 +12,10 @@
 import math
 from torch import Tensor
 from typing import Tuple
-import torch
 import torch.nn as nn
 import torch.nn.functional as F
 from torch.nn.utils.rnn import pack_padded_sequence, pad_packed_sequence
-
-
-class MaskConv(nn.Module):
-    """
-        Masking Convolutional Neural Network
-
-        Refer to https://github.com/sooftware/KoSpeech/blob/jasper/kospeech/models/modules.py
-        Copyright (c) 2020 Soohwan Kim
-
-    """
-
-    def __init__(
-            self,
-            sequential: nn.Sequential,
-    ) -> None:
-        super(MaskConv, self).__init__()
-        self.sequential = sequential
-
-    def forward(
-            self,
-            inputs: Tensor,
-            seq_lens: Tensor,
-    ) -> Tuple[Tensor, Tensor]:
-        output = None
-
-        for module in self.sequential:
-            output = module(inputs)
-
-            mask = torch.BoolTensor(output.size()).fill_(0)
-            if output.is_cuda:
-                mask = mask.cuda()
-
-            seq_lens = self.get_seq_lens(module, seq_lens)
-
-            for idx, seq_len in enumerate(seq_lens):
-                seq_len = seq_len.item()
-
-                if (mask[idx].size(2) - seq_len) > 0:
-                    mask[idx].narrow(2, seq_len, mask[idx].size(2) - seq_len).fill_(1)
-
-            output = output.masked_fill(mask, 0)
-            inputs = output
-
-        return output, seq_lens
-
-    def get_seq_lens(
-            self,
-            module: nn.Module,
-            seq_lens: Tensor,
-    ) -> Tensor:
-        if isinstance(module, nn.Conv2d):
-            seq_lens = seq_lens + (2 * module.padding[1]) - module.dilation[1] * (module.kernel_size[1] - 1) - 1
-            seq_lens = seq_lens.float() / float(module.stride[1])
-            seq_lens = seq_lens.int() + 1
-
-        if isinstance(module, nn.MaxPool2d):
-            seq_lens >>= 1
-
-        return seq_lens.int()
+from models.modules import MaskConv
 
 
 class Encoder(nn.Module):
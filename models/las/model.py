@@ -67,7 +67,7 @@ class ListenAttendSpell(nn.Module):
             **decoder_output_prob** (Tensor): ``(batch, seq_length, num_vocabs)``
         """
         encoder_output, encoder_output_prob, encoder_output_lens = self.encoder(encoder_inputs, encoder_inputs_lens)
-        decoder_output_prob = self.decoder(decoder_inputs, encoder_output, teacher_forcing_ratio)
+        decoder_output_prob = self.decoder(decoder_inputs, encoder_output, teacher_forcing_ratio, encoder_output_lens)
 
         return encoder_output_prob, encoder_output_lens, decoder_output_prob
 
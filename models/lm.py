@@ -0,0 +1,270 @@
+# MIT License
+#
+# Copyright (c) 2021 Sangchun Ha
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+import os
+import json
+import math
+import numpy as np
+import torch
+from torch import Tensor
+from typing import Tuple
+
+LOG_10 = math.log(10.0)
+
+
+def compile_arpa(
+        arpa_path: str,
+        char2id: dict,
+        lm_path: str,
+        sos_id: int = 1,
+        eos_id: int = 2,
+        space_token: str = '<space>',
+) -> dict:
+    """
+    Compiles an ARPA n-gram model over characters into the array trie read by NGramLanguageModel.
+
+    Every order n is stored as arrays sorted by key = (index of the (n - 1)-gram prefix) * vocab_size + word id,
+    with log probabilities and backoff weights in natural log. Unigrams are dense arrays indexed by the word id.
+    <s> and </s> map to sos_id and eos_id, space_token maps to the id of ' '. N-grams with a word that is
+    not in char2id are skipped.
+
+    Args:
+        arpa_path (str): path of ARPA file
+        char2id (dict): dictionary that converts char to id, from vocabulary.load_label
+        lm_path (str): directory where the compiled model is written
+        sos_id (int): index of the start of sentence (default: 1)
+        eos_id (int): index of the end of sentence (default: 2)
+        space_token (str): word of the ARPA file used for space (default: <space>)
+
+    Returns: meta
+        - **meta** (dict): order, vocab size and the number of n-grams of each order
+    """
+    vocab = {char: idx for char, idx in char2id.items()}
+    vocab['<s>'] = sos_id
+    vocab['</s>'] = eos_id
+    if ' ' in char2id:
+        vocab[space_token] = char2id[' ']
+    vocab_size = max(vocab.values()) + 1
+
+    ngrams = dict()  # order => list of (word ids, log prob, backoff)
+    unk_log_prob = -99.0
+    num_skipped = 0
+    order = 0
+
+    with open(arpa_path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+
+            if not line or line.startswith('ngram ') or line == '\\data\\' or line == '\\end\\':
+                continue
+
+            if line.startswith('\\') and line.endswith('-grams:'):
+                order = int(line[1:line.index('-')])
+                ngrams[order] = list()
+                continue
+
+            fields = line.split()
+            log_prob = float(fields[0])
+            words = fields[1:order + 1]
+            backoff = float(fields[order + 1]) if len(fields) > order + 1 else 0.0
+
+            if order == 1 and words[0] == '<unk>':
+                unk_log_prob = log_prob
+                continue
+
+            if any(word not in vocab for word in words):
+                num_skipped += 1
+                continue
+
+            ngrams[order].append((tuple(vocab[word] for word in words), log_prob * LOG_10, backoff * LOG_10))
+
+    os.makedirs(lm_path, exist_ok=True)
+    max_order = max(ngrams)
+
+    unigram_log_probs = np.full(vocab_size, unk_log_prob * LOG_10, dtype=np.float32)
+    unigram_backoffs = np.zeros(vocab_size, dtype=np.float32)
+    for (word, ), log_prob, backoff in ngrams[1]:
+        unigram_log_probs[word] = log_prob
+        unigram_backoffs[word] = backoff
+
+    np.save(os.path.join(lm_path, 'log_probs_1.npy'), unigram_log_probs)
+    np.save(os.path.join(lm_path, 'backoffs_1.npy'), unigram_backoffs)
+
+    prefix_index = {(word, ): word for word in range(vocab_size)}
+    num_ngrams = {1: len(ngrams[1])}
+
+    for n in range(2, max_order + 1):
+        keys, log_probs, backoffs, words = list(), list(), list(), list()
+
+        for ngram, log_prob, backoff in ngrams.get(n, list()):
+            parent = prefix_index.get(ngram[:-1])
+            if parent is None:  # prefix was skipped
+                num_skipped += 1
+                continue
+            keys.append(parent * vocab_size + ngram[-1])
+            log_probs.append(log_prob)
+            backoffs.append(backoff)
+            words.append(ngram)
+
+        keys = np.array(keys, dtype=np.int64)
+        order_index = np.argsort(keys, kind='stable')
+
+        np.save(os.path.join(lm_path, 'keys_{}.npy'.format(n)), keys[order_index])
+        np.save(os.path.join(lm_path, 'log_probs_{}.npy'.format(n)), np.array(log_probs, dtype=np.float32)[order_index])
+        np.save(os.path.join(lm_path, 'backoffs_{}.npy'.format(n)), np.array(backoffs, dtype=np.float32)[order_index])
+
+        prefix_index = {words[idx]: node for node, idx in enumerate(order_index.tolist())}
+        num_ngrams[n] = len(keys)
+
+    meta = {'order': max_order, 'vocab_size': vocab_size, 'num_ngrams': num_ngrams, 'num_skipped': num_skipped,
+            'sos_id': sos_id, 'eos_id': eos_id, 'unk_log_prob': unk_log_prob * LOG_10}
+
+    with open(os.path.join(lm_path, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2)
+
+    return meta
+
+
+class NGramLanguageModel(object):
+    """
+    Character n-gram language model compiled by compile_arpa. Arrays are memory-mapped, so loading is immediate
+    and DataLoader or decoding workers share the pages.
+
+    The state of a hypothesis is the trie node of each suffix of its history, (batch, order - 1) with -1 for a suffix
+    that is not in the model. Scoring all next tokens of a batch starts from the unigram distribution and,
+    for each suffix from the shortest, adds its backoff weight and overwrites the tokens it has explicit n-grams for.
+
+    Args:
+        lm_path (str): directory of the compiled model
+    """
+    def __init__(self, lm_path: str) -> None:
+        self.lm_path = lm_path
+
+        with open(os.path.join(lm_path, 'meta.json')) as f:
+            meta = json.load(f)
+
+        self.order = meta['order']
+        self.vocab_size = meta['vocab_size']
+        self.sos_id = meta['sos_id']
+        self.eos_id = meta['eos_id']
+        self.unk_log_prob = meta['unk_log_prob']
+        self._load()
+
+    def __getstate__(self) -> dict:
+        return {'lm_path': self.lm_path}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(state['lm_path'])
+
+    def _load(self) -> None:
+        self.keys = [None, None]
+        self.log_probs = [None]
+        self.backoffs = [None]
+
+        for n in range(1, self.order + 1):
+            if n > 1:
+                self.keys.append(np.load(os.path.join(self.lm_path, 'keys_{}.npy'.format(n)), mmap_mode='r'))
+            self.log_probs.append(np.load(os.path.join(self.lm_path, 'log_probs_{}.npy'.format(n)), mmap_mode='r'))
+            self.backoffs.append(np.load(os.path.join(self.lm_path, 'backoffs_{}.npy'.format(n)), mmap_mode='r'))
+
+    def _lookup(self, n: int, parents: np.ndarray, words: np.ndarray) -> np.ndarray:
+        """ Node indices of the n-grams (parent (n - 1)-gram, word), -1 if missing """
+        keys = self.keys[n]
+        queries = parents.astype(np.int64) * self.vocab_size + words
+        positions = np.searchsorted(keys, queries)
+        found = (parents >= 0) & (positions < len(keys))
+        found[found] = keys[positions[found]] == queries[found]
+
+        return np.where(found, positions, -1)
+
+    def initial_state(self, batch: int) -> Tensor:
+        """ State after <s>, (batch, order - 1) """
+        states = np.full((batch, max(self.order - 1, 1)), -1, dtype=np.int64)
+        states[:, 0] = self.sos_id
+
+        return torch.from_numpy(states)
+
+    def advance(self, states: Tensor, tokens: Tensor) -> Tensor:
+        """ Appends tokens ``(batch)`` to the histories of states ``(batch, order - 1)`` """
+        states = states.cpu().numpy()
+        tokens = tokens.cpu().numpy().astype(np.int64)
+        next_states = np.full_like(states, -1)
+        next_states[:, 0] = tokens
+
+        for j in range(1, states.shape[1]):  # suffix of length j + 1 is (suffix of length j) + token
+            next_states[:, j] = self._lookup(j + 1, states[:, j - 1], tokens)
+
+        return torch.from_numpy(next_states)
+
+    def score(self, states: Tensor, num_vocabs: int = None) -> Tensor:
+        """
+        Log probabilities of every next token, (batch, order - 1) => (batch, num_vocabs).
+        Tokens beyond the vocabulary of the model, such as blank, get the <unk> log probability.
+        """
+        states = states.cpu().numpy()
+        batch = states.shape[0]
+        log_probs = np.repeat(np.asarray(self.log_probs[1])[None, :], batch, axis=0)
+
+        for j in range(min(states.shape[1], self.order - 1)):
+            nodes = states[:, j]
+            valid = nodes >= 0
+            if not valid.any():
+                break
+
+            log_probs[valid] += np.asarray(self.backoffs[j + 1])[nodes[valid], None]
+
+            # explicit (j + 2)-grams continuing each suffix are a contiguous range of the sorted keys
+            keys = self.keys[j + 2]
+            rows = np.nonzero(valid)[0]
+            starts = np.searchsorted(keys, nodes[rows] * self.vocab_size)
+            ends = np.searchsorted(keys, (nodes[rows] + 1) * self.vocab_size)
+            counts = ends - starts
+
+            if counts.sum() == 0:
+                continue
+
+            row_indices = np.repeat(rows, counts)
+            offsets = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+            log_probs[row_indices, np.asarray(keys[offsets]) % self.vocab_size] = self.log_probs[j + 2][offsets]
+
+        if num_vocabs is not None and num_vocabs != self.vocab_size:
+            padded_log_probs = np.full((batch, num_vocabs), self.unk_log_prob, dtype=np.float32)
+            padded_log_probs[:, :min(num_vocabs, self.vocab_size)] = log_probs[:, :num_vocabs]
+            log_probs = padded_log_probs
+
+        return torch.from_numpy(log_probs)
+
+    def score_token(self, state: Tuple[int, ...], token: int) -> Tuple[float, Tuple[int, ...]]:
+        """ Log probability of one token after a single state tuple and the next state, for prefix search """
+        if token >= self.vocab_size:
+            return self.unk_log_prob, tuple([-1] * len(state))
+
+        states = torch.LongTensor([state])
+        tokens = torch.LongTensor([token])
+        log_prob = 0.0
+
+        for j in range(len(state) - 1, -1, -1):  # from the longest suffix
+            node = state[j]
+            if node < 0:
+                continue
+
+            if j + 2 <= self.order:
+                child = self._lookup(j + 2, np.array([node]), np.array([token]))[0]
+                if child >= 0:
+                    log_prob += float(self.log_probs[j + 2][child])
+                    break
+
+            log_prob += float(self.backoffs[j + 1][node])
+
+        else:
+            log_prob += float(self.log_probs[1][token])
+
+        return log_prob, tuple(self.advance(states, tokens)[0].tolist())
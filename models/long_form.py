@@ -0,0 +1,198 @@
+# MIT License
+#
+# Copyright (c) 2021 Sangchun Ha
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+import math
+import numpy as np
+import torch
+import torch.nn as nn
+from difflib import SequenceMatcher
+from torch import Tensor
+from typing import List, Optional, Tuple
+from models.deepspeech2.model import DeepSpeech2
+from models.search import CTCPrefixBeamSearch, GreedySearch, get_ctc_output
+
+
+def merge_overlap(left: List[int], right: List[int], num_left: int, num_right: int) -> List[int]:
+    """
+    Joins two hypotheses whose audio overlaps. The longest common run of tokens between the end of left and
+    the beginning of right, searched over twice the estimated overlap for speaking rate changes, is cut in its middle.
+    Without a common token, half of the estimated overlap is dropped from each side.
+
+    Args:
+        left (list): tokens decoded so far
+        right (list): tokens of the next window
+        num_left (int): the number of tokens of left estimated to be in the overlap
+        num_right (int): the number of tokens of right estimated to be in the overlap
+
+    Returns: tokens
+        - **tokens** (list): merged tokens
+    """
+    offset = max(len(left) - 2 * num_left, 0)
+    tail, head = left[offset:], right[:2 * num_right]
+
+    match = SequenceMatcher(None, tail, head, autojunk=False).find_longest_match(0, len(tail), 0, len(head))
+
+    if match.size == 0:
+        return left[:len(left) - num_left // 2] + right[num_right - num_right // 2:]
+
+    middle = match.size // 2
+    return left[:offset + match.a + middle] + right[match.b + middle:]
+
+
+class LongFormTranscriber(object):
+    """
+    Transcribes recordings longer than the model was trained on, e.g. hour-long calls, with bounded memory.
+    The feature is split into windows of window_size frames, consecutive windows share overlap frames, and
+    batch_size windows at a time are encoded as one padded batch, so memory and attention cost depend on the window,
+    not on the length of the recording.
+
+    With merge='frame' (DeepSpeech2 and the CTC head of the joint CTC/attention LAS), the CTC outputs are stitched:
+    each window keeps the frames up to the middle of its overlaps, then the stitched frames are decoded
+    by greedy CTC or by CTCPrefixBeamSearch once, as one utterance. Only the argmax (or the top_k of the prefix search)
+    of each frame is kept. With merge='text' (LAS), the windows of a batch are decoded in parallel by search and
+    consecutive hypotheses are joined with merge_overlap.
+
+    Args:
+        model (nn.Module): DeepSpeech2 or ListenAttendSpell in eval mode
+        device (torch.device): device of the model
+        blank_id (int): index of blank
+        sos_id (int): index of the start of sentence (default: 1)
+        eos_id (int): index of the end of sentence (default: 2)
+        window_size (int): the number of feature frames of a window (default: 1000)
+        overlap (int): the number of feature frames shared by consecutive windows (default: 200)
+        batch_size (int): the number of windows encoded together (default: 16)
+        merge (str): frame or text, if None, frame for DeepSpeech2 and text for ListenAttendSpell (default: None)
+        search (nn.Module): GreedySearch or BeamSearch for merge='text', CTCPrefixBeamSearch for merge='frame',
+            if None, greedy (default: None)
+        max_len (int): maximum number of tokens of a window for the default GreedySearch (default: 120)
+
+    Inputs: feature
+        - **feature** (dimension, seq_len): feature of the whole recording
+
+    Returns: tokens
+        - **tokens** (list): token ids of the recording without sos and eos
+    """
+    def __init__(
+            self,
+            model: nn.Module,
+            device: torch.device,
+            blank_id: int,
+            sos_id: int = 1,
+            eos_id: int = 2,
+            window_size: int = 1000,
+            overlap: int = 200,
+            batch_size: int = 16,
+            merge: Optional[str] = None,
+            search: Optional[nn.Module] = None,
+            max_len: int = 120,
+    ) -> None:
+        self.model = model
+        self.device = device
+        self.blank_id = blank_id
+        self.sos_id = sos_id
+        self.eos_id = eos_id
+        self.batch_size = batch_size
+        self.merge = merge or ('frame' if isinstance(model, DeepSpeech2) else 'text')
+
+        conv = model.conv if isinstance(model, DeepSpeech2) else model.encoder.conv
+        self.subsampling = math.prod(module.stride[1] for module in conv.sequential if isinstance(module, nn.Conv2d))
+
+        # window starts and stitching points fall on output frames
+        self.cut = overlap // 2 // self.subsampling * self.subsampling
+        self.overlap = overlap
+        self.stride = (window_size - overlap) // self.subsampling * self.subsampling
+        self.window_size = window_size
+
+        if self.stride <= 0:
+            raise ValueError('overlap ({}) must be smaller than window_size ({}) by at least {} frames'.format(
+                overlap, window_size, self.subsampling))
+        if self.merge == 'text' and isinstance(model, DeepSpeech2):
+            raise ValueError("DeepSpeech2 has no attention decoder, use merge='frame'")
+
+        if search is None and self.merge == 'text':
+            search = GreedySearch(device, max_len)
+        self.search = search
+
+    def windows(self, seq_len: int) -> List[Tuple[int, int]]:
+        """ (begin, end) feature frames of each window """
+        num_windows = max(math.ceil((seq_len - self.window_size) / self.stride), 0) + 1
+        return [(idx * self.stride, min(idx * self.stride + self.window_size, seq_len)) for idx in range(num_windows)]
+
+    def _batches(self, feature: Tensor, windows: List[Tuple[int, int]]):
+        for begin in range(0, len(windows), self.batch_size):
+            batch_windows = windows[begin:begin + self.batch_size]
+            lengths = [end - start for start, end in batch_windows]
+            inputs = feature.new_zeros(len(batch_windows), feature.size(0), max(lengths))
+
+            for idx, (start, end) in enumerate(batch_windows):
+                inputs[idx, :, :end - start] = feature[:, start:end]
+
+            yield begin, inputs.to(self.device), torch.IntTensor(lengths).to(self.device)
+
+    def _transcribe_frames(self, feature: Tensor, windows: List[Tuple[int, int]]) -> List[int]:
+        prefix_search = isinstance(self.search, CTCPrefixBeamSearch)
+        frames = list()
+
+        for first, inputs, input_lengths in self._batches(feature, windows):
+            log_probs, output_lengths, _ = get_ctc_output(self.model, inputs, input_lengths)
+            outputs = self.search.prune(log_probs) if prefix_search else (log_probs.argmax(dim=-1).cpu().numpy(), )
+
+            for idx, length in enumerate(output_lengths.tolist()):
+                window_idx = first + idx
+                begin = self.cut // self.subsampling if window_idx > 0 else 0
+                end = (self.stride + self.cut) // self.subsampling if window_idx < len(windows) - 1 else length
+                frames.append(tuple(output[idx, begin:end] for output in outputs))
+
+        outputs = [np.concatenate(output)[None] for output in zip(*frames)]
+
+        if prefix_search:
+            beam = self.search.search_pruned(*outputs, torch.IntTensor([outputs[0].shape[1]]))[0]
+            return list(beam[0][0])
+
+        tokens = outputs[0][0]
+        keep = np.ones_like(tokens, dtype=bool)
+        keep[1:] = tokens[1:] != tokens[:-1]
+        keep &= (tokens != self.blank_id) & (tokens != self.sos_id) & (tokens != self.eos_id)
+
+        return tokens[keep].tolist()
+
+    def _transcribe_text(self, feature: Tensor, windows: List[Tuple[int, int]]) -> List[int]:
+        hypotheses = list()
+
+        for _, inputs, input_lengths in self._batches(feature, windows):
+            for y_hat in self.search(self.model, inputs, input_lengths).tolist():
+                hypothesis = list()
+                for token in y_hat:
+                    if token == self.eos_id:
+                        break
+                    if token not in (self.sos_id, self.blank_id):
+                        hypothesis.append(token)
+                hypotheses.append(hypothesis)
+
+        tokens = hypotheses[0]
+
+        for idx in range(1, len(hypotheses)):
+            (begin, end), (next_begin, next_end) = windows[idx - 1], windows[idx]
+            overlap = end - next_begin
+            num_left = round(len(hypotheses[idx - 1]) * overlap / (end - begin))
+            num_right = round(len(hypotheses[idx]) * overlap / (next_end - next_begin))
+            tokens = merge_overlap(tokens, hypotheses[idx], num_left, num_right)
+
+        return tokens
+
+    @torch.no_grad()
+    def __call__(self, feature: Tensor) -> List[int]:
+        windows = self.windows(feature.size(1))
+
+        if self.merge == 'frame':
+            return self._transcribe_frames(feature, windows)
+
+        return self._transcribe_text(feature, windows)
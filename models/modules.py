@@ -0,0 +1,113 @@
+# MIT License
+#
+# Copyright (c) 2021 Sangchun Ha
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+import torch
+import torch.nn as nn
+from torch import Tensor
+from typing import Tuple
+
+
+class MaskConv(nn.Module):
+    """
+        Masking Convolutional Neural Network
+
+        Refer to https://github.com/sooftware/KoSpeech/blob/jasper/kospeech/models/modules.py
+        Copyright (c) 2020 Soohwan Kim
+
+        The padding mask is built once per conv stage with a broadcast comparison and reused by the following
+        modules. Modules that map zero to zero, such as Hardtanh with min_val <= 0 <= max_val or ReLU,
+        keep the padding zero, so their outputs are not masked again.
+
+    """
+
+    def __init__(
+            self,
+            sequential: nn.Sequential,
+    ) -> None:
+        super(MaskConv, self).__init__()
+        self.sequential = sequential
+
+    def forward(
+            self,
+            inputs: Tensor,
+            seq_lens: Tensor,
+    ) -> Tuple[Tensor, Tensor]:
+        output = inputs
+        mask = None
+
+        for module in self.sequential:
+            output = module(output)
+
+            if mask is None or self.changes_length(module):
+                seq_lens = self.get_seq_lens(module, seq_lens)
+                positions = torch.arange(output.size(3), device=output.device)
+                mask = (positions >= seq_lens.to(output.device).unsqueeze(1)).view(output.size(0), 1, 1, -1)
+
+            elif self.preserves_zero(module):
+                continue
+
+            output = output.masked_fill_(mask, 0)
+
+        return output, seq_lens
+
+    @staticmethod
+    def changes_length(module: nn.Module) -> bool:
+        return isinstance(module, (nn.Conv2d, nn.MaxPool2d))
+
+    @staticmethod
+    def preserves_zero(module: nn.Module) -> bool:
+        if isinstance(module, nn.Hardtanh):
+            return module.min_val <= 0 <= module.max_val
+
+        return isinstance(module, (nn.ReLU, nn.ReLU6, nn.LeakyReLU, nn.ELU, nn.GELU, nn.Tanh, nn.Dropout))
+
+    def get_seq_lens(
+            self,
+            module: nn.Module,
+            seq_lens: Tensor,
+    ) -> Tensor:
+        if isinstance(module, nn.Conv2d):
+            seq_lens = seq_lens + (2 * module.padding[1]) - module.dilation[1] * (module.kernel_size[1] - 1) - 1
+            seq_lens = seq_lens.float() / float(module.stride[1])
+            seq_lens = seq_lens.int() + 1
+
+        if isinstance(module, nn.MaxPool2d):
+            seq_lens >>= 1
+
+        return seq_lens.int()
+
+
+class Lookahead(nn.Module):
+    """
+        Lookahead (row) convolution of Deep Speech 2, https://arxiv.org/abs/1512.02595
+
+        Mixes each frame of a unidirectional RNN output with the next context frames, channel by channel,
+        so the model sees a small fixed amount of future audio. The input is padded with zeros on the right.
+
+        Args:
+            num_features (int): dimension of the input
+            context (int): the number of future frames
+
+        Inputs: inputs
+            - **inputs** (batch, seq_len, num_features): RNN output
+
+        Returns: output
+            - **output** (batch, seq_len, num_features)
+    """
+    def __init__(self, num_features: int, context: int) -> None:
+        super(Lookahead, self).__init__()
+        self.num_features = num_features
+        self.context = context
+        self.conv = nn.Conv1d(num_features, num_features, kernel_size=context + 1, groups=num_features, bias=False)
+
+    def forward(self, inputs: Tensor) -> Tensor:
+        output = nn.functional.pad(inputs.transpose(1, 2), (0, self.context))
+        return self.conv(output).transpose(1, 2)
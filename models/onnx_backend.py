@@ -0,0 +1,102 @@
+# MIT License
+#
+# Copyright (c) 2021 Sangchun Ha
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+import numpy as np
+import torch
+import torch.nn as nn
+from torch import Tensor
+from typing import List, Optional, Tuple
+
+
+class OnnxModel(object):
+    """
+    onnxruntime session of a graph from export_onnx, called with torch tensors like the torch module it replaces.
+    Inputs are copied to numpy on CPU and outputs are returned as torch tensors on CPU.
+
+    Args:
+        onnx_path (str): path of the graph
+        num_threads (int): the number of intra-op threads, if 0, chosen by onnxruntime (default: 0)
+        session (onnxruntime.InferenceSession): session already created for onnx_path (default: None)
+    """
+    def __init__(self, onnx_path: str, num_threads: int = 0, session=None) -> None:
+        if session is None:
+            import onnxruntime
+
+            options = onnxruntime.SessionOptions()
+            options.intra_op_num_threads = num_threads
+            options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+            session = onnxruntime.InferenceSession(onnx_path, options, providers=['CPUExecutionProvider'])
+
+        self.onnx_path = onnx_path
+        self.session = session
+        self.output_names = [output.name for output in self.session.get_outputs()]
+        self.architecture = self.session.get_modelmeta().custom_metadata_map.get('architecture')
+
+    def eval(self) -> 'OnnxModel':
+        return self
+
+    def run(self, feature: Tensor, feature_lengths: Tensor) -> List[Tensor]:
+        outputs = self.session.run(None, {
+            'feature': feature.detach().cpu().float().numpy(),
+            'feature_lengths': feature_lengths.detach().cpu().numpy().astype(np.int32),
+        })
+
+        return [torch.from_numpy(output) for output in outputs]
+
+
+class OnnxDeepSpeech2(OnnxModel):
+    """
+    DeepSpeech2 on onnxruntime, ``(feature, feature_lengths) => (log_probs, output_lengths)``
+    as DeepSpeech2.forward, for ctc_greedy_decode and CTCPrefixBeamSearch
+    """
+    def __call__(self, feature: Tensor, feature_lengths: Tensor) -> Tuple[Tensor, Tensor]:
+        log_probs, output_lengths = self.run(feature, feature_lengths)
+        return log_probs, output_lengths
+
+
+class OnnxEncoder(OnnxModel):
+    """ LAS encoder on onnxruntime, ``(feature, feature_lengths) => (encoder_output, log_probs, output_lengths)`` """
+    def __call__(self, feature: Tensor, feature_lengths: Tensor) -> Tuple[Tensor, Optional[Tensor], Tensor]:
+        outputs = dict(zip(self.output_names, self.run(feature, feature_lengths)))
+        return outputs['encoder_output'], outputs.get('log_probs'), outputs['output_lengths']
+
+
+class OnnxListenAttendSpell(object):
+    """
+    ListenAttendSpell with the encoder on onnxruntime and the torch decoder, for GreedySearch, BeamSearch and
+    CTCPrefixBeamSearch
+
+    Args:
+        onnx_path (str): path of encoder.onnx
+        decoder (Decoder): decoder of the exported model
+        num_threads (int): the number of intra-op threads of the encoder, if 0, chosen by onnxruntime (default: 0)
+        session (onnxruntime.InferenceSession): session already created for onnx_path (default: None)
+    """
+    def __init__(self, onnx_path: str, decoder: nn.Module, num_threads: int = 0, session=None) -> None:
+        self.encoder = OnnxEncoder(onnx_path, num_threads, session)
+        self.decoder = decoder.cpu().eval()
+        self.decoder.device = torch.device('cpu')
+
+    def eval(self) -> 'OnnxListenAttendSpell':
+        return self
+
+
+def load_onnx_model(onnx_path: str, decoder: Optional[nn.Module] = None, num_threads: int = 0):
+    """ OnnxDeepSpeech2 or OnnxListenAttendSpell from the architecture in the graph metadata """
+    model = OnnxModel(onnx_path, num_threads)
+
+    if model.architecture == 'deepspeech2':
+        return OnnxDeepSpeech2(onnx_path, session=model.session)
+
+    if decoder is None:
+        raise ValueError('{} is a LAS encoder, the decoder of the model is required'.format(onnx_path))
+
+    return OnnxListenAttendSpell(onnx_path, decoder, session=model.session)
@@ -0,0 +1,63 @@
+# MIT License
+#
+# Copyright (c) 2021 Sangchun Ha
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+import copy
+import io
+import torch
+import torch.nn as nn
+
+try:
+    from torch.ao.quantization import quantize_dynamic
+except ImportError:  # torch < 1.10
+    from torch.quantization import quantize_dynamic
+
+QUANTIZED_MODULES = {nn.Linear, nn.LSTM, nn.GRU}
+SUPPORTED_DTYPES = {'qint8': torch.qint8, 'float16': torch.float16}
+
+
+def quantize_model(model: nn.Module, dtype: str = 'qint8') -> nn.Module:
+    """
+    Dynamic quantization of a trained ListenAttendSpell or DeepSpeech2 for CPU inference.
+    Weights of the LSTM, GRU and Linear layers are stored in dtype, and activations are quantized per batch
+    at run time, so no calibration data is needed. Convolutions, batch norms and embeddings stay in fp32.
+    The input model is not modified.
+
+    Args:
+        model (nn.Module): trained fp32 model
+        dtype (str): qint8 or float16 (default: qint8)
+
+    Returns: quantized_model
+        - **quantized_model** (nn.Module): quantized copy of the model on CPU
+    """
+    if dtype not in SUPPORTED_DTYPES:
+        raise ValueError('Unsupported quantization dtype {}, expected one of {}'.format(dtype, list(SUPPORTED_DTYPES)))
+
+    model = copy.deepcopy(model).cpu().eval()
+    quantized_model = quantize_dynamic(model, QUANTIZED_MODULES, dtype=SUPPORTED_DTYPES[dtype])
+
+    for module in (getattr(quantized_model, 'encoder', None), getattr(quantized_model, 'decoder', None)):
+        if module is not None and hasattr(module, 'device'):
+            module.device = torch.device('cpu')
+
+    return quantized_model
+
+
+def is_quantized(model: nn.Module) -> bool:
+    """ Whether the model has dynamically quantized modules, which only run on CPU """
+    return any('.quantized.' in type(module).__module__ for module in model.modules())
+
+
+def get_model_size(model: nn.Module) -> int:
+    """ Size in bytes of the serialized state dict, packed int8 weights included """
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+
+    return buffer.getbuffer().nbytes
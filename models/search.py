@@ -9,30 +9,510 @@
 # copies of the Software, and to permit persons to whom the Software is
 # furnished to do so, subject to the following conditions:
 
+import math
+import numpy as np
 from torch import Tensor
 import torch
 import torch.nn as nn
+from multiprocessing import Pool
+from typing import List, Optional, Tuple
 
 
 class GreedySearch(nn.Module):
     def __init__(
             self,
             device: torch.device,
+            max_len: int = None,
+            lm=None,
+            lm_weight: float = 0.0,
     ) -> None:
         super(GreedySearch, self).__init__()
         self.device = device
+        self.max_len = max_len
+        self.lm = lm
+        self.lm_weight = lm_weight
 
     def forward(
             self,
             model: nn.Module,
             feature: Tensor,
             feature_lengths: Tensor,
-            result: Tensor,
+            result: Tensor = None,
     ) -> Tensor:
-        encoder_output_prob, encoder_output_lens, decoder_output_prob = model(feature, feature_lengths, None, 0.0)
+        max_len = result.size(1) if result is not None else self.max_len
 
-        decoder_output_prob = decoder_output_prob.to(self.device)
-        decoder_output_prob = decoder_output_prob[:, :result.size(1), :]
-        y_hat = decoder_output_prob.max(2)[1]
+        encoder_output, _, encoder_output_lengths = model.encoder(feature, feature_lengths)
+        y_hat = model.decoder.decode(encoder_output, max_len, self.lm, self.lm_weight, encoder_output_lengths)
 
         return y_hat
+
+
+class BeamSearch(nn.Module):
+    """
+    Batched beam search of the ListenAttendSpell decoder.
+    All utterances of the batch are decoded together as (batch * beam_size) hypotheses, the next hypotheses are chosen
+    with a single top-k over (beam_size * num_vocabs) candidates of each utterance, and the RNN and attention state
+    are reordered with index_select. The encoder output is not repeated per beam, every beam attends to the encoder
+    output of its utterance. Finished hypotheses are ranked by score / length ** length_penalty.
+    With a language model, lm_weight * the n-gram log probability is added to every step (shallow fusion).
+
+    Args:
+        device (torch.device): 'cuda' or 'cpu'
+        beam_size (int): the number of hypotheses kept per utterance (default: 5)
+        max_len (int): maximum number of decoding steps (default: 120)
+        length_penalty (float): exponent of the length normalization, if 0, no normalization (default: 1.0)
+        lm (NGramLanguageModel): language model for shallow fusion, if None, not used (default: None)
+        lm_weight (float): weight of the language model log probability (default: 0.0)
+
+    Inputs: model, feature, feature_lengths
+        - **model** (ListenAttendSpell): model to decode with
+        - **feature** (batch, dimension, seq_len): padded features
+        - **feature_lengths** (batch): valid length of each feature
+
+    Returns: y_hat
+        - **y_hat** (batch, max_len): best hypothesis of each utterance, padded with eos after its end
+    """
+    def __init__(
+            self,
+            device: torch.device,
+            beam_size: int = 5,
+            max_len: int = 120,
+            length_penalty: float = 1.0,
+            lm=None,
+            lm_weight: float = 0.0,
+    ) -> None:
+        super(BeamSearch, self).__init__()
+        self.device = device
+        self.beam_size = beam_size
+        self.max_len = max_len
+        self.length_penalty = length_penalty
+        self.lm = lm
+        self.lm_weight = lm_weight
+
+    @staticmethod
+    def _select_state(state, indices: Tensor):
+        if state is None:
+            return None
+        if isinstance(state, tuple):  # lstm (h, c)
+            return tuple(tensor.index_select(1, indices) for tensor in state)
+
+        return state.index_select(1, indices)
+
+    @torch.no_grad()
+    def forward(
+            self,
+            model: nn.Module,
+            feature: Tensor,
+            feature_lengths: Tensor,
+    ) -> Tensor:
+        decoder = model.decoder
+        encoder_output, _, encoder_output_lengths = model.encoder(feature, feature_lengths)
+
+        batch, beam_size, num_vocabs = encoder_output.size(0), self.beam_size, decoder.num_vocabs
+        device = encoder_output.device
+
+        # only the first beam is alive at the start, the others are copies of it
+        scores = encoder_output.new_full((batch, beam_size), float('-inf'))
+        scores[:, 0] = 0.0
+        lengths = torch.zeros(batch, beam_size, dtype=torch.long, device=device)
+        finished = torch.zeros(batch, beam_size, dtype=torch.bool, device=device)
+        sequences = torch.full((batch * beam_size, self.max_len), decoder.eos_id, dtype=torch.long, device=device)
+        beam_offset = (torch.arange(batch, device=device) * beam_size).unsqueeze(1)  # (B, 1)
+
+        inputs = torch.full((batch * beam_size,), decoder.sos_id, dtype=torch.long, device=device)
+        attn_distribution = None
+        hidden = None
+        lm_states = self.lm.initial_state(batch * beam_size) if self.lm is not None else None
+        cache = decoder.precompute(encoder_output, encoder_output_lengths)  # shared by the beams of each utterance
+
+        # a finished hypothesis is only extended with eos at no cost
+        eos_only = encoder_output.new_full((num_vocabs,), float('-inf'))
+        eos_only[decoder.eos_id] = 0.0
+
+        for step in range(self.max_len):
+            output, attn_distribution, hidden = decoder.forward_step(inputs, encoder_output, attn_distribution,
+                                                                     hidden, cache)
+            log_probs = output.view(batch, beam_size, num_vocabs)
+            if self.lm is not None:
+                lm_log_probs = self.lm.score(lm_states, num_vocabs).to(device)
+                log_probs = log_probs + self.lm_weight * lm_log_probs.view(batch, beam_size, num_vocabs)
+            log_probs = torch.where(finished.unsqueeze(2), eos_only, log_probs)
+
+            candidates = (scores.unsqueeze(2) + log_probs).view(batch, -1)  # (B, K * V)
+            scores, indices = candidates.topk(beam_size, dim=1)
+
+            beam_indices = (indices // num_vocabs + beam_offset).view(-1)  # (B * K)
+            tokens = indices % num_vocabs
+
+            sequences = sequences.index_select(0, beam_indices)
+            sequences[:, step] = tokens.view(-1)
+            lengths = lengths.view(-1).index_select(0, beam_indices).view(batch, beam_size)
+            finished = finished.view(-1).index_select(0, beam_indices).view(batch, beam_size)
+            lengths = lengths + (~finished).long()
+            finished = finished | (tokens == decoder.eos_id)
+
+            if finished.all():
+                break
+
+            hidden = self._select_state(hidden, beam_indices)
+            if decoder.attn_mechanism == 'location':
+                attn_distribution = attn_distribution.index_select(0, beam_indices)
+            inputs = tokens.view(-1)
+
+            if self.lm is not None:
+                lm_states = self.lm.advance(lm_states.index_select(0, beam_indices.cpu()), inputs)
+
+        normalized_scores = scores / lengths.clamp(min=1).float().pow(self.length_penalty)
+        best = normalized_scores.argmax(dim=1) + beam_offset.squeeze(1)  # (B)
+
+        return sequences.index_select(0, best)
+
+
+def get_ctc_output(
+        model: nn.Module,
+        feature: Tensor,
+        feature_lengths: Tensor,
+) -> Tuple[Tensor, Tensor, Optional[Tensor]]:
+    """
+    Runs the CTC head of DeepSpeech2 or of the joint CTC/attention LAS encoder
+
+    Returns: log_probs, output_lengths, encoder_output
+        - **log_probs** (batch, seq_len, num_vocabs): CTC log probabilities
+        - **output_lengths** (batch): valid length of each output
+        - **encoder_output** (batch, seq_len, dimension): encoder output for attention rescoring, None for DeepSpeech2
+    """
+    if hasattr(model, 'encoder'):
+        encoder_output, log_probs, output_lengths = model.encoder(feature, feature_lengths)
+        if log_probs is None:
+            raise ValueError('CTC decoding needs an encoder trained with use_joint_ctc_attention')
+
+        return log_probs, output_lengths, encoder_output
+
+    log_probs, output_lengths = model(feature, feature_lengths)
+
+    return log_probs, output_lengths, None
+
+
+def ctc_greedy_decode(
+        log_probs: Tensor,
+        output_lengths: Tensor,
+        blank_id: int,
+        sos_id: int = 1,
+        eos_id: int = 2,
+) -> Tensor:
+    """
+    Best path decoding, the argmax of each frame with repeated tokens collapsed and blanks removed.
+    sos and eos emitted by the CTC head are dropped, so the result can be compared with target[:, 1:].
+
+    Returns: y_hat
+        - **y_hat** (batch, max_len): decoded tokens, padded with eos
+    """
+    tokens = log_probs.argmax(dim=-1)  # (B, T)
+    positions = torch.arange(tokens.size(1), device=tokens.device)
+
+    keep = torch.ones_like(tokens, dtype=torch.bool)
+    keep[:, 1:] = tokens[:, 1:] != tokens[:, :-1]
+    keep &= (tokens != blank_id) & (tokens != sos_id) & (tokens != eos_id)
+    keep &= positions.unsqueeze(0) < output_lengths.to(tokens.device).unsqueeze(1)
+
+    indices = keep.long().cumsum(dim=1) - 1
+    y_hat = tokens.new_full((tokens.size(0), max(int(keep.sum(dim=1).max()), 1)), eos_id)
+    y_hat[keep.nonzero()[:, 0], indices[keep]] = tokens[keep]
+
+    return y_hat
+
+
+def _log_add(a: float, b: float) -> float:
+    if a == -math.inf:
+        return b
+    if b == -math.inf:
+        return a
+    if a < b:
+        a, b = b, a
+
+    return a + math.log1p(math.exp(b - a))
+
+
+def ctc_prefix_beam_search(
+        top_tokens: np.ndarray,
+        top_log_probs: np.ndarray,
+        blank_log_probs: np.ndarray,
+        beam_size: int,
+        blank_id: int,
+        blank_threshold: float = 0.999,
+        lm=None,
+        lm_weight: float = 0.0,
+        skip_tokens: tuple = (),
+) -> List[Tuple[tuple, float]]:
+    """
+    CTC prefix beam search of one utterance over pruned frames.
+    With a language model, prefixes are ranked by ctc log probability + lm_weight * n-gram log probability,
+    the n-gram probability of a token is added once when a prefix is extended with it.
+
+    Args:
+        top_tokens (np.ndarray): the top-k tokens of each frame ``(seq_len, top_k)``
+        top_log_probs (np.ndarray): log probabilities of top_tokens ``(seq_len, top_k)``
+        blank_log_probs (np.ndarray): log probability of blank of each frame ``(seq_len)``
+        beam_size (int): the number of prefixes kept after each frame
+        blank_id (int): index of blank
+        blank_threshold (float): frames whose blank probability is above it only extend prefixes with blank
+        lm (NGramLanguageModel): language model for shallow fusion, if None, not used (default: None)
+        lm_weight (float): weight of the language model log probability (default: 0.0)
+        skip_tokens (tuple): tokens not scored by the language model, e.g. sos and eos emitted by the CTC head
+
+    Returns: hypotheses
+        - **hypotheses** (list): (prefix, score) of the beam, best first, score includes the weighted lm log probability
+    """
+    log_threshold = math.log(blank_threshold)
+    beams = {tuple(): (0.0, -math.inf)}  # prefix => (log p ending in blank, log p ending in non blank)
+    lm_scores = {tuple(): (0.0, tuple(lm.initial_state(1)[0].tolist()) if lm is not None else None)}  # prefix => (lm, state)
+
+    def lm_extend(prefix: tuple, token: int) -> None:
+        next_prefix = prefix + (token,)
+        if lm is None or next_prefix in lm_scores:
+            return
+
+        lm_score, lm_state = lm_scores[prefix]
+        if token not in skip_tokens:
+            log_prob, lm_state = lm.score_token(lm_state, token)
+            lm_score += lm_weight * log_prob
+
+        lm_scores[next_prefix] = (lm_score, lm_state)
+
+    def total_score(beam: tuple) -> float:
+        prefix, (p_b, p_nb) = beam
+        return _log_add(p_b, p_nb) + (lm_scores[prefix][0] if lm is not None else 0.0)
+
+    for blank_log_prob, tokens, log_probs in zip(blank_log_probs.tolist(), top_tokens.tolist(),
+                                                 top_log_probs.tolist()):
+        if blank_log_prob > log_threshold:
+            beams = {prefix: (_log_add(p_b, p_nb) + blank_log_prob, -math.inf) for prefix, (p_b, p_nb) in beams.items()}
+            continue
+
+        next_beams = dict()
+
+        def extend(prefix: tuple, p_b: float, p_nb: float) -> None:
+            if p_b == -math.inf and p_nb == -math.inf:
+                return
+            last_p_b, last_p_nb = next_beams.get(prefix, (-math.inf, -math.inf))
+            next_beams[prefix] = (_log_add(last_p_b, p_b), _log_add(last_p_nb, p_nb))
+
+        for prefix, (p_b, p_nb) in beams.items():
+            extend(prefix, _log_add(p_b, p_nb) + blank_log_prob, -math.inf)
+
+            for token, log_prob in zip(tokens, log_probs):
+                if token == blank_id:
+                    continue
+
+                lm_extend(prefix, token)
+
+                if prefix and prefix[-1] == token:
+                    extend(prefix, -math.inf, p_nb + log_prob)  # repeated token is collapsed
+                    extend(prefix + (token,), -math.inf, p_b + log_prob)  # blank in between starts a new token
+                else:
+                    extend(prefix + (token,), -math.inf, _log_add(p_b, p_nb) + log_prob)
+
+        beams = dict(sorted(next_beams.items(), key=total_score, reverse=True)[:beam_size])
+
+        if lm is not None:  # pruned prefixes are not extended anymore
+            lm_scores = {prefix: lm_scores[prefix] for prefix in beams}
+
+    return [(prefix, total_score((prefix, beam))) for prefix, beam in beams.items()]
+
+
+def _ctc_prefix_beam_search(args: tuple) -> List[Tuple[tuple, float]]:
+    return ctc_prefix_beam_search(*args)
+
+
+class CTCPrefixBeamSearch(nn.Module):
+    """
+    CTC prefix beam search for DeepSpeech2 and the joint CTC/attention LAS encoder.
+    Frames are pruned on the device before the search, only the top_k tokens of each frame are expanded and frames
+    whose blank probability is above blank_threshold only extend the prefixes with blank. Utterances of the batch are
+    searched in a worker pool. With rescoring, the n-best prefixes of the joint model are rescored with the attention
+    decoder and ranked by ctc_weight * ctc score + (1 - ctc_weight) * attention score. With a language model,
+    the ctc score of each prefix includes lm_weight * its n-gram log probability.
+
+    Args:
+        device (torch.device): 'cuda' or 'cpu'
+        blank_id (int): index of blank
+        sos_id (int): index of the start of sentence (default: 1)
+        eos_id (int): index of the end of sentence (default: 2)
+        beam_size (int): the number of prefixes kept after each frame (default: 10)
+        top_k (int): the number of tokens expanded per frame (default: 10)
+        blank_threshold (float): blank probability above which a frame is not expanded (default: 0.999)
+        num_workers (int): the number of worker processes, if 0, searched in this process (default: 0)
+        rescore (bool): flag indication rescoring with the attention decoder or not (default: False)
+        ctc_weight (float): weight of the ctc score in rescoring (default: 0.3)
+        lm (NGramLanguageModel): language model for shallow fusion, if None, not used (default: None)
+        lm_weight (float): weight of the language model log probability (default: 0.0)
+
+    Inputs: model, feature, feature_lengths
+        - **model** (DeepSpeech2 or ListenAttendSpell): model to decode with
+        - **feature** (batch, dimension, seq_len): padded features
+        - **feature_lengths** (batch): valid length of each feature
+
+    Returns: y_hat
+        - **y_hat** (batch, max_len): best hypothesis of each utterance without sos, padded with eos
+    """
+    def __init__(
+            self,
+            device: torch.device,
+            blank_id: int,
+            sos_id: int = 1,
+            eos_id: int = 2,
+            beam_size: int = 10,
+            top_k: int = 10,
+            blank_threshold: float = 0.999,
+            num_workers: int = 0,
+            rescore: bool = False,
+            ctc_weight: float = 0.3,
+            lm=None,
+            lm_weight: float = 0.0,
+    ) -> None:
+        super(CTCPrefixBeamSearch, self).__init__()
+        self.device = device
+        self.blank_id = blank_id
+        self.sos_id = sos_id
+        self.eos_id = eos_id
+        self.beam_size = beam_size
+        self.top_k = top_k
+        self.blank_threshold = blank_threshold
+        self.num_workers = num_workers
+        self.rescore = rescore
+        self.ctc_weight = ctc_weight
+        self.lm = lm
+        self.lm_weight = lm_weight
+        self.pool = None
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state['pool'] = None
+        return state
+
+    def close(self) -> None:
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def prune(self, log_probs: Tensor) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """ The top_k tokens and log probabilities and the blank log probability of each frame, on CPU """
+        top_log_probs, top_tokens = log_probs.topk(min(self.top_k, log_probs.size(-1)), dim=-1)
+        blank_log_probs = log_probs[..., self.blank_id]
+
+        return top_tokens.cpu().numpy(), top_log_probs.float().cpu().numpy(), blank_log_probs.float().cpu().numpy()
+
+    def search(self, log_probs: Tensor, output_lengths: Tensor) -> List[List[Tuple[tuple, float]]]:
+        """ Returns the beam of each utterance, prefixes without sos and eos """
+        return self.search_pruned(*self.prune(log_probs), output_lengths)
+
+    def search_pruned(
+            self,
+            top_tokens: np.ndarray,
+            top_log_probs: np.ndarray,
+            blank_log_probs: np.ndarray,
+            output_lengths: Tensor,
+    ) -> List[List[Tuple[tuple, float]]]:
+        """ search over the output of prune, ``(batch, seq_len, top_k)`` and ``(batch, seq_len)`` """
+        tasks = [
+            (top_tokens[idx, :length], top_log_probs[idx, :length], blank_log_probs[idx, :length],
+             self.beam_size, self.blank_id, self.blank_threshold, self.lm, self.lm_weight, (self.sos_id, self.eos_id))
+            for idx, length in enumerate(output_lengths.tolist())
+        ]
+
+        if self.num_workers > 0:
+            if self.pool is None:
+                self.pool = Pool(self.num_workers)
+            beams = self.pool.map(_ctc_prefix_beam_search, tasks)
+        else:
+            beams = [_ctc_prefix_beam_search(task) for task in tasks]
+
+        markers = (self.sos_id, self.eos_id)
+        merged_beams = list()
+
+        for beam in beams:  # prefixes that differ only in sos and eos, e.g. (a, sos, b) and (a, b), are merged
+            merged = dict()
+            for prefix, score in beam:
+                prefix = tuple(token for token in prefix if token not in markers)
+                merged[prefix] = _log_add(merged.get(prefix, -math.inf), score)
+            merged_beams.append(sorted(merged.items(), key=lambda item: item[1], reverse=True))
+
+        return merged_beams
+
+    def attention_scores(
+            self,
+            decoder: nn.Module,
+            encoder_output: Tensor,
+            hypotheses: Tensor,
+            encoder_output_lengths: Optional[Tensor] = None,
+    ) -> Tensor:
+        """ Log probability of (batch * N, L) eos padded hypotheses under the attention decoder, eos included """
+        batch_beam, max_len = hypotheses.size()
+        inputs = torch.full((batch_beam,), decoder.sos_id, dtype=torch.long, device=hypotheses.device)
+        scores = torch.zeros(batch_beam, device=hypotheses.device)
+        finished = torch.zeros(batch_beam, dtype=torch.bool, device=hypotheses.device)
+        attn_distribution = None
+        hidden = None
+        cache = decoder.precompute(encoder_output, encoder_output_lengths)
+
+        for step in range(max_len):
+            output, attn_distribution, hidden = decoder.forward_step(inputs, encoder_output, attn_distribution,
+                                                                     hidden, cache)
+            tokens = hypotheses[:, step]
+            log_probs = output.squeeze(1).gather(1, tokens.unsqueeze(1)).squeeze(1)
+
+            scores += log_probs.masked_fill(finished, 0.0)
+            finished |= tokens == decoder.eos_id
+            inputs = tokens
+
+            if finished.all():
+                break
+
+        return scores
+
+    @torch.no_grad()
+    def forward(
+            self,
+            model: nn.Module,
+            feature: Tensor,
+            feature_lengths: Tensor,
+    ) -> Tensor:
+        log_probs, output_lengths, encoder_output = get_ctc_output(model, feature, feature_lengths)
+        beams = self.search(log_probs, output_lengths)
+
+        if self.rescore and encoder_output is not None:
+            best = self._rescore(model.decoder, encoder_output, beams, output_lengths)
+        else:
+            best = [beam[0][0] for beam in beams]
+
+        y_hat = torch.full((len(best), max(max(len(prefix) for prefix in best), 1)), self.eos_id, dtype=torch.long)
+        for idx, prefix in enumerate(best):
+            y_hat[idx, :len(prefix)] = torch.LongTensor(prefix)
+
+        return y_hat.to(log_probs.device)
+
+    def _rescore(
+            self,
+            decoder: nn.Module,
+            encoder_output: Tensor,
+            beams: list,
+            encoder_output_lengths: Optional[Tensor] = None,
+    ) -> List[tuple]:
+        num_best = max(len(beam) for beam in beams)
+        max_len = max(len(prefix) for beam in beams for prefix, _ in beam) + 1  # eos
+
+        hypotheses = torch.full((len(beams) * num_best, max_len), self.eos_id, dtype=torch.long)
+        ctc_scores = torch.full((len(beams), num_best), -math.inf)
+
+        for idx, beam in enumerate(beams):
+            for rank, (prefix, score) in enumerate(beam):
+                hypotheses[idx * num_best + rank, :len(prefix)] = torch.LongTensor(prefix)
+                ctc_scores[idx, rank] = score
+
+        attention_scores = self.attention_scores(decoder, encoder_output, hypotheses.to(encoder_output.device),
+                                                 encoder_output_lengths)
+        scores = self.ctc_weight * ctc_scores + (1 - self.ctc_weight) * attention_scores.cpu().view(len(beams), num_best)
+        ranks = scores.argmax(dim=1).tolist()
+
+        return [beam[rank][0] for beam, rank in zip(beams, ranks)]
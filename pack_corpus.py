@@ -0,0 +1,35 @@
+# MIT License
+#
+# Copyright (c) 2021 Sangchun Ha
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+import argparse
+from data.packed_corpus import pack_corpus
+from vocabulary import load_dataset, load_manifest
+
+
+parser = argparse.ArgumentParser(description='pack audio corpus')
+parser.add_argument('--dataset_path', type=str, default='')
+parser.add_argument('--manifest_path', type=str, default='')
+parser.add_argument('--audio_path', type=str, default='')
+parser.add_argument('--corpus_path', type=str, default='')
+parser.add_argument('--extension', type=str, default='pcm')
+parser.add_argument('--sampling_rate', type=int, default=16000)
+args = parser.parse_args()
+
+if args.manifest_path:
+    audio_paths, _, _, _ = load_manifest(args.manifest_path, 'eval')
+else:
+    audio_paths, _, _, _ = load_dataset(args.dataset_path, 'eval')
+
+num_samples = pack_corpus(args.audio_path, audio_paths, args.corpus_path, args.extension, args.sampling_rate)
+
+print('{} utterances ({:.1f} hours) are packed to {}'.format(len(audio_paths),
+                                                            num_samples / args.sampling_rate / 3600,
+                                                            args.corpus_path))
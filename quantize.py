@@ -0,0 +1,154 @@
+# MIT License
+#
+# Copyright (c) 2021 Sangchun Ha
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+import os
+import time
+import numpy as np
+import random
+import torch
+import hydra
+
+from hydra.core.config_store import ConfigStore
+from omegaconf import OmegaConf, DictConfig
+from evaluator.evaluator import Evaluator, build_test_loader
+from model_builder import load_test_model
+from models.quantization import quantize_model, get_model_size
+from models.search import CTCPrefixBeamSearch
+from data import (
+    MelSpectrogramConfig,
+    SpectrogramConfig,
+    MFCCConfig,
+    FilterBankConfig
+)
+from evaluator import EvaluateConfig, QuantizeConfig
+from vocabulary import load_label
+
+
+cs = ConfigStore.instance()
+cs.store(group="audio", name="melspectrogram", node=MelSpectrogramConfig, package="audio")
+cs.store(group="audio", name="filterbank", node=FilterBankConfig, package="audio")
+cs.store(group="audio", name="mfcc", node=MFCCConfig, package="audio")
+cs.store(group="audio", name="spectrogram", node=SpectrogramConfig, package="audio")
+cs.store(group="eval", name="default", node=EvaluateConfig, package="eval")
+cs.store(group="quantize", name="default", node=QuantizeConfig, package="quantize")
+
+
+def read_memory_status() -> dict:
+    """ Current (VmRSS) and peak (VmHWM) resident set size of this process in bytes, empty if /proc is missing """
+    memory_status = dict()
+
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                key, value = line.split(':', 1)
+                if key in ('VmRSS', 'VmHWM'):
+                    memory_status[key] = int(value.split()[0]) * 1024
+    except OSError:
+        pass
+
+    return memory_status
+
+
+def reset_peak_memory() -> bool:
+    """ Resets VmHWM to the current resident set size (Linux 4.0+) """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        return False
+
+    return True
+
+
+def measure_latency(model, decoder, loader, num_samples: int, frame_stride: float) -> dict:
+    """ Encoding and decoding time and peak resident memory of single utterances, as served """
+    latencies = list()
+    audio_seconds = 0.0
+    peak_memory = float('nan')  # not measured without /proc
+    baseline = read_memory_status().get('VmRSS') if reset_peak_memory() else None
+
+    with torch.no_grad():
+        for batch_idx, (feature, _, feature_lengths, _) in enumerate(loader):
+            if batch_idx > num_samples:
+                break
+
+            start = time.perf_counter()
+            decoder(model, feature, feature_lengths)
+            elapsed = time.perf_counter() - start
+
+            if batch_idx == 0:  # warm up
+                continue
+
+            latencies.append(elapsed)
+            audio_seconds += feature_lengths.sum().item() * frame_stride
+
+    if baseline is not None:  # memory of activations and decoding above the loaded models
+        peak_memory = read_memory_status()['VmHWM'] - baseline
+
+    return {
+        'mean': np.mean(latencies) * 1e3,
+        'p90': np.percentile(latencies, 90) * 1e3,
+        'rtf': sum(latencies) / max(audio_seconds, 1e-9),
+        'peak_memory': peak_memory,
+    }
+
+
+@hydra.main(config_path='configs', config_name='quantize')
+def main(config: DictConfig) -> None:
+    print(OmegaConf.to_yaml(config))
+
+    torch.manual_seed(config.eval.seed)
+    np.random.seed(config.eval.seed)
+    random.seed(config.eval.seed)
+    torch.set_num_threads(config.quantize.num_threads)
+
+    device = torch.device('cpu')  # dynamically quantized kernels run on CPU only
+
+    char2id, id2char = load_label(config.eval.label_path, config.eval.blank_id)
+    test_loader = build_test_loader(config)
+    latency_loader = build_test_loader(config, batch_size=1)
+
+    model = load_test_model(config, device)
+    quantized_model = quantize_model(model, config.quantize.dtype)
+
+    evaluator = Evaluator(config, device, test_loader, id2char)
+    results = dict()
+
+    for name, target_model in (('fp32', model), (config.quantize.dtype, quantized_model)):
+        print('Evaluate {} model'.format(name))
+        target_model.eval()
+        cer = evaluator.evaluate(target_model, 'inference_result_{}.csv'.format(name))
+        decoder = evaluator.build_decoder(target_model)
+        try:
+            latency = measure_latency(target_model, decoder, latency_loader,
+                                      config.quantize.num_latency_samples, config.audio.frame_stride)
+        finally:
+            if isinstance(decoder, CTCPrefixBeamSearch):
+                decoder.close()
+        results[name] = (cer, latency, get_model_size(target_model))
+
+    for name, (cer, latency, size) in results.items():
+        print('{:8s} : cer {:.4f}, latency mean {:.1f} ms p90 {:.1f} ms, rtf {:.3f}, '
+              'serialized size {:.1f} MB, peak runtime memory {:.1f} MB'.format(
+                  name, cer, latency['mean'], latency['p90'], latency['rtf'], size / 2 ** 20,
+                  latency['peak_memory'] / 2 ** 20))
+
+    fp32_cer, _, fp32_size = results['fp32']
+    quantized_cer, _, quantized_size = results[config.quantize.dtype]
+    print('cer delta {:+.4f}, size ratio {:.2f}'.format(quantized_cer - fp32_cer, quantized_size / fp32_size))
+
+    quantized_model_path = os.path.join(os.getcwd(), config.quantize.quantized_model_path)
+    torch.save(quantized_model, quantized_model_path)
+    print('Quantized model is written to {}'.format(quantized_model_path))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+import torch
+from models.attention import MultiHeadAttention, FusedMultiHeadAttention
+
+torch.manual_seed(22)
+batch, q_len, k_len, key_dim, num_head = 3, 5, 40, 64, 8
+
+query = torch.randn(batch, q_len, key_dim)
+key = torch.randn(batch, k_len, key_dim)
+key_lengths = torch.IntTensor([40, 31, 17])
+
+multi_head = MultiHeadAttention(key_dim, num_head)
+fused = FusedMultiHeadAttention(key_dim, num_head)
+
+# without padding, the same as MultiHeadAttention
+context, _ = multi_head(query, key, key)
+fused_context, attn_distribution = fused(query, key, key)
+print(torch.allclose(context, fused_context, atol=1e-6), attn_distribution)
+# True None
+
+# with padding, each utterance attends only to its own frames
+fused_context, _ = fused(query, key, key, key_lengths=key_lengths)
+print(all(torch.allclose(multi_head(query[idx:idx + 1], key[idx:idx + 1, :length], key[idx:idx + 1, :length])[0],
+                         fused_context[idx:idx + 1], atol=1e-6) for idx, length in enumerate(key_lengths.tolist())))
+# True
+
+# explicit weights for visualization give the same context and no mass on padded frames
+weighted_context, attn_distribution = fused(query, key, key, key_lengths=key_lengths, need_weights=True)
+print(torch.allclose(weighted_context, fused_context, atol=1e-6), attn_distribution.size())
+print(attn_distribution.view(batch, num_head, q_len, k_len)[1, :, :, 31:].abs().sum().item())
+# True torch.Size([24, 5, 40])
+# 0.0
+
+# a cache from precompute is reused across steps
+cache = fused.precompute(key, key, key_lengths)
+print(torch.equal(fused(query, None, None, cache)[0], fused_context))
+# True
@@ -0,0 +1,45 @@
+import torch
+import numpy as np
+from data.feature import Spectrogram, MelSpectrogram, MFCC, FilterBank
+from data.batch_feature import BatchFeatureExtractor
+
+np.random.seed(22)
+sound_lengths = [16000, 12345, 8000]
+sounds = [np.random.uniform(-0.5, 0.5, length).astype(np.float32) for length in sound_lengths]
+
+padded_sounds = torch.zeros(len(sounds), max(sound_lengths))
+for idx, sound in enumerate(sounds):
+    padded_sounds[idx, :len(sound)] = torch.from_numpy(sound)
+sound_lengths = torch.LongTensor(sound_lengths)
+
+feature_extractors = {
+    'spectrogram': Spectrogram(320, 160),
+    'melspectrogram': MelSpectrogram(320, 160, 16000, 80),
+    'mfcc': MFCC(320, 160, 16000, 40),
+    'filterbank': FilterBank(0.020, 0.010, 16000, 80),
+}
+
+for feature_extraction, feature_extractor in feature_extractors.items():
+    n_dim = 40 if feature_extraction == 'mfcc' else 80
+    batch_feature_extractor = BatchFeatureExtractor(feature_extraction, 16000, n_dim, 0.020, 0.010)
+
+    for normalize in (False, True):
+        features, feature_lengths = batch_feature_extractor(padded_sounds, sound_lengths, normalize)
+
+        max_error = 0.0
+        for idx, sound in enumerate(sounds):
+            expected = feature_extractor(sound.copy(), normalize)
+            assert feature_lengths[idx].item() == expected.size(1)
+            error = (features[idx, :, :expected.size(1)] - expected).abs().max().item()
+            max_error = max(max_error, error / max(expected.abs().max().item(), 1.0))
+            assert features[idx, :, expected.size(1):].abs().sum().item() == 0
+
+        print(feature_extraction, normalize, features.size(), max_error < 1e-3)
+# spectrogram False torch.Size([3, 161, 101]) True
+# spectrogram True torch.Size([3, 161, 101]) True
+# melspectrogram False torch.Size([3, 80, 101]) True
+# melspectrogram True torch.Size([3, 80, 101]) True
+# mfcc False torch.Size([3, 40, 101]) True
+# mfcc True torch.Size([3, 40, 101]) True
+# filterbank False torch.Size([3, 80, 99]) True
+# filterbank True torch.Size([3, 80, 99]) True
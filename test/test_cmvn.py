@@ -0,0 +1,40 @@
+import os
+import tempfile
+import numpy as np
+import torch
+from data.cmvn import GlobalCMVN, compute_cmvn_stats
+from data.data_loader import _collate_fn
+
+if __name__ == '__main__':
+    torch.manual_seed(0)
+    # dimensions with different offsets and scales, as log mel energies
+    dataset = [(torch.randn(8, int(length)) * torch.arange(1, 9).unsqueeze(1) + torch.arange(8).unsqueeze(1) * 10,
+                torch.LongTensor([1, 2, 3])) for length in torch.randint(20, 200, (13,))]
+    features = torch.cat([feature for feature, _ in dataset], dim=1).double()
+
+    mean, std, count = compute_cmvn_stats(dataset, num_workers=2, chunk_size=3)
+    print(count == features.size(1), np.allclose(mean, features.mean(dim=1).numpy()),
+          np.allclose(std, features.std(dim=1, unbiased=False).numpy()))
+    # 0 / 5 chunks
+    # True True True
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cmvn_path = os.path.join(tmp_dir, 'cmvn.npz')
+        np.savez(cmvn_path, mean=mean, std=std, count=count)
+        cmvn = GlobalCMVN(cmvn_path)
+
+    pad_seqs, _, seq_lengths, _ = _collate_fn(dataset[:4])
+    normalized = cmvn(pad_seqs.clone(), seq_lengths)
+    padding = torch.arange(pad_seqs.size(2)) >= seq_lengths.unsqueeze(1)
+
+    # valid frames are (feature - mean) / std, the padding beyond seq_lengths stays zero
+    expected = (pad_seqs - torch.from_numpy(mean).float().unsqueeze(1)) / torch.from_numpy(std).float().unsqueeze(1)
+    print(bool(padding.any()), torch.allclose(normalized.masked_select(~padding.unsqueeze(1)),
+                                              expected.masked_select(~padding.unsqueeze(1)), atol=1e-5),
+          bool((normalized.masked_select(padding.unsqueeze(1)) == 0).all()))
+    # True True True
+
+    normalized = cmvn(features.float().unsqueeze(0), torch.IntTensor([features.size(1)]))[0]
+    print(torch.allclose(normalized.mean(dim=1), torch.zeros(8), atol=1e-4),
+          torch.allclose(normalized.std(dim=1, unbiased=False), torch.ones(8), atol=1e-4))
+    # True True
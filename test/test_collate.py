@@ -0,0 +1,33 @@
+import torch
+from data.data_loader import BufferedCollate, _collate_fn
+
+torch.manual_seed(0)
+
+
+def make_batch(batch_size: int, max_length: int) -> list:
+    lengths = torch.randint(max_length // 2, max_length + 1, (batch_size,))
+    return [(torch.randn(40, int(length)), torch.randint(1, 100, (int(length) // 10 + 1,))) for length in lengths]
+
+
+# batches grow and shrink, so reused buffers hold stale values beyond the new padding
+batches = [make_batch(batch_size, max_length) for batch_size, max_length in
+           ((4, 100), (8, 300), (2, 50), (8, 200), (3, 400), (1, 30), (6, 250))]
+
+for reuse in (True, False):
+    buffered_collate = BufferedCollate(reuse=reuse, num_buffers=2)
+    print(reuse, all(
+        all(torch.equal(expected, result) and expected.dtype == result.dtype
+            for expected, result in zip(_collate_fn(batch), buffered_collate(batch)))
+        for batch in batches
+    ))
+# True True
+# False True
+
+# a batch that is still held is not overwritten while the next num_buffers (smaller) batches are collated
+buffered_collate = BufferedCollate(reuse=True, num_buffers=3)
+held = buffered_collate(batches[1])
+expected = [tensor.clone() for tensor in held]
+outputs = [buffered_collate(batch) for batch in (batches[0], batches[2], batches[5])]
+print(all(torch.equal(tensor, copy) for tensor, copy in zip(held, expected)),
+      len({output[0].data_ptr() for output in outputs + [held]}))
+# True 4
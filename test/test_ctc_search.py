@@ -0,0 +1,51 @@
+import itertools
+import numpy as np
+import torch
+from models.search import ctc_prefix_beam_search, ctc_greedy_decode, CTCPrefixBeamSearch
+
+torch.manual_seed(22)
+seq_len, num_vocabs, blank_id = 5, 4, 3
+
+for _ in range(3):
+    log_probs = torch.log_softmax(torch.randn(seq_len, num_vocabs) * 2, dim=-1)
+
+    # probability of every labeling, summed over all alignments
+    labelings = dict()
+    for path in itertools.product(range(num_vocabs), repeat=seq_len):
+        score = sum(log_probs[t, token].item() for t, token in enumerate(path))
+        labeling = tuple(token for t, token in enumerate(path)
+                         if token != blank_id and (t == 0 or token != path[t - 1]))
+        labelings[labeling] = np.logaddexp(labelings.get(labeling, -np.inf), score)
+
+    top_log_probs, top_tokens = log_probs.topk(num_vocabs, dim=-1)
+    beam = ctc_prefix_beam_search(top_tokens.numpy(), top_log_probs.numpy(), log_probs[:, blank_id].numpy(),
+                                  beam_size=1000, blank_id=blank_id, blank_threshold=1.0)
+    best = max(labelings, key=labelings.get)
+
+    print(beam[0][0] == best, all(abs(score - labelings[prefix]) < 1e-6 for prefix, score in beam))
+# True True
+# True True
+# True True
+
+log_probs = torch.log(torch.eye(6)[[3, 3, 5, 3, 4, 4, 2, 5]]).unsqueeze(0).clamp(min=-100)
+print(ctc_greedy_decode(log_probs, torch.IntTensor([8]), blank_id=5, sos_id=1, eos_id=2))
+# tensor([[3, 3, 4]])
+
+# sos and eos emitted by the CTC head are stripped, prefixes that differ only in them are merged into one entry
+sos_id, eos_id, blank_id = 1, 2, 5
+log_probs = torch.log_softmax(torch.randn(5, 6), dim=-1)
+labelings = dict()
+for path in itertools.product(range(6), repeat=5):
+    score = sum(log_probs[t, token].item() for t, token in enumerate(path))
+    labeling = tuple(token for t, token in enumerate(path)
+                     if token != blank_id and (t == 0 or token != path[t - 1]))
+    labeling = tuple(token for token in labeling if token not in (sos_id, eos_id))
+    labelings[labeling] = np.logaddexp(labelings.get(labeling, -np.inf), score)
+
+search = CTCPrefixBeamSearch(torch.device('cpu'), blank_id, sos_id, eos_id, beam_size=10000, top_k=6,
+                             blank_threshold=1.0)
+beam = search.search(log_probs.unsqueeze(0), torch.IntTensor([5]))[0]
+prefixes = [prefix for prefix, _ in beam]
+print(len(prefixes) == len(set(prefixes)) == len(labelings), beam[0][0] == max(labelings, key=labelings.get),
+      all(abs(score - labelings[prefix]) < 1e-6 for prefix, score in beam))
+# True True True
@@ -42,3 +42,16 @@ print(decoder_output_prob)
 #          [-7.6382, -7.6025, -7.5645,  ..., -7.6110, -7.5886, -7.5842]]]
 
 print(decoder_output_prob.size())  # torch.Size([3, 20, 2000])
+
+decoder.eval()
+y_hat = decoder.decode(encoder_output, max_len=20)  # stops when every sequence emitted eos
+
+print(y_hat.size())  # torch.Size([3, 20])
+
+# keys projected once per utterance give the same step output as projecting them in every step
+with torch.no_grad():
+    inputs = torch.full((3,), decoder.sos_id, dtype=torch.long)
+    cached_output, _, _ = decoder.forward_step(inputs, encoder_output, cache=decoder.precompute(encoder_output))
+    output, _, _ = decoder.forward_step(inputs, encoder_output)
+
+print(torch.equal(cached_output, output))  # True
@@ -0,0 +1,38 @@
+import sys
+import tempfile
+import torch
+from models.deepspeech2.model import DeepSpeech2
+from models.las.encoder import Encoder
+from models.las.decoder import Decoder
+from models.las.model import ListenAttendSpell
+from models.export import export_model
+from models.search import GreedySearch, ctc_greedy_decode
+
+sys.path.insert(0, 'deploy')
+from runtime import Recognizer
+
+inputs = torch.rand(3, 80, 100)  # BxDxT
+input_lengths = torch.IntTensor([100, 90, 80])
+device = torch.device('cpu')
+
+las = ListenAttendSpell(Encoder(2000, 80, 256), Decoder(device, 2000, 512, 512, max_len=20)).eval()
+ds2 = DeepSpeech2(2000, 80, 512).eval()
+
+with tempfile.TemporaryDirectory() as export_dir, torch.no_grad():
+    export_model(las, export_dir, blank_id=1999, max_len=20)
+    print(torch.equal(Recognizer(export_dir)(inputs, input_lengths), GreedySearch(device, 20)(las, inputs, input_lengths)))
+    # True
+
+with tempfile.TemporaryDirectory() as export_dir, torch.no_grad():
+    export_model(ds2, export_dir, blank_id=1999)
+    log_prob, output_lengths = ds2(inputs, input_lengths)
+    print(torch.equal(Recognizer(export_dir)(inputs, input_lengths), ctc_greedy_decode(log_prob, output_lengths, 1999)))
+    # True
+
+# the model is exported from a copy, a model in training keeps its mode and device
+las.train()
+las.decoder.device = las.encoder.device = torch.device('cuda')
+with tempfile.TemporaryDirectory() as export_dir:
+    export_model(las, export_dir, blank_id=1999, max_len=20)
+print(all(module.training for module in las.modules()), las.decoder.device, las.encoder.device)
+# True cuda cuda
@@ -0,0 +1,57 @@
+import os
+import sys
+import subprocess
+import tempfile
+import numpy as np
+import torch
+from data.feature_cache import FeatureCache
+
+CONFIG = dict(feature_extraction='melspectrogram', n_dim=40, frame_length=0.02, frame_stride=0.01, normalize=True)
+
+# reads every key back in a fresh process, so nothing comes from the index or memmaps of the writer
+READ_SCRIPT = '''
+import sys
+import numpy as np
+from data.feature_cache import FeatureCache
+feature_cache = FeatureCache(sys.argv[1], dtype=sys.argv[2], **{})
+np.savez(sys.argv[3], **{{key: feature_cache.get(key).numpy() for key in sys.argv[4:]}})
+'''.format(CONFIG)
+
+torch.manual_seed(0)
+features = {'{}.pcm'.format(idx): torch.randn(40, 50 + 7 * idx) for idx in range(10)}
+
+for dtype in ('float32', 'float16'):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        feature_cache = FeatureCache(tmp_dir, dtype=dtype, shard_size=40 * 100 * 4, **CONFIG)
+        for path, feature in features.items():
+            feature_cache.put(path, feature)
+
+        result_path = os.path.join(tmp_dir, 'result.npz')
+        subprocess.run([sys.executable, '-c', READ_SCRIPT, tmp_dir, dtype, result_path] + list(features),
+                       check=True, env=dict(os.environ, PYTHONPATH=os.getcwd()))
+        result = np.load(result_path)
+        tolerance = 0 if dtype == 'float32' else 1e-2
+        print(dtype, len(os.listdir(feature_cache.cache_dir)) > 3, all(
+            result[path].shape == tuple(feature.shape) and np.abs(result[path] - feature.numpy()).max() <= tolerance
+            for path, feature in features.items()
+        ))
+# float32 True True
+# float16 True True
+
+with tempfile.TemporaryDirectory() as tmp_dir:
+    feature_cache = FeatureCache(tmp_dir, **CONFIG)
+    feature_cache.put('a.pcm', features['0.pcm'])
+    feature_cache.put('b.pcm', features['1.pcm'])
+    shard_name = feature_cache.shard_name
+
+    # a writer killed inside n_frames leaves a line with 5 fields and no newline
+    with open(os.path.join(feature_cache.cache_dir, 'index-torn.tsv'), 'w', encoding='utf-8') as f:
+        f.write('c.pcm\t{}\t0\t40\t5'.format(shard_name))
+    # the index line made it to disk but the feature did not
+    with open(os.path.join(feature_cache.cache_dir, 'index-lost.tsv'), 'w', encoding='utf-8') as f:
+        f.write('d.pcm\t{}\t{}\t40\t50\n'.format(shard_name, 40 * (50 + 57)))
+
+    feature_cache = FeatureCache(tmp_dir, **CONFIG)
+    print(len(feature_cache), 'c.pcm' in feature_cache, 'd.pcm' in feature_cache,
+          torch.equal(feature_cache.get('b.pcm'), features['1.pcm']))
+# 2 False False True
@@ -0,0 +1,51 @@
+import math
+import os
+import tempfile
+import torch
+from models.lm import compile_arpa, NGramLanguageModel
+from models.search import ctc_prefix_beam_search
+
+ARPA = '''\\data\\
+ngram 1=4
+ngram 2=3
+
+\\1-grams:
+-99\t<s>\t-0.5
+-1.0\t</s>
+-0.5\ta\t-0.3
+-0.7\tb\t-0.2
+
+\\2-grams:
+-0.1\t<s> a
+-0.2\ta b
+-0.3\tb </s>
+
+\\end\\
+'''
+
+with tempfile.TemporaryDirectory() as tmp_dir:
+    arpa_path = os.path.join(tmp_dir, 'test.arpa')
+    with open(arpa_path, 'w') as f:
+        f.write(ARPA)
+
+    compile_arpa(arpa_path, {'<pad>': 0, '<sos>': 1, '<eos>': 2, 'a': 3, 'b': 4}, tmp_dir)
+    lm = NGramLanguageModel(tmp_dir)
+
+    states = lm.initial_state(1)
+    print((lm.score(states)[0, 2:] / math.log(10)).round(decimals=4))
+    states = lm.advance(states, torch.LongTensor([3]))
+    print((lm.score(states)[0, 2:] / math.log(10)).round(decimals=4))
+    print(lm.score_token(tuple(states[0].tolist()), 4)[0] / math.log(10))
+    # tensor([-1.5000, -0.1000, -1.2000])
+    # tensor([-1.3000, -0.8000, -0.2000])
+    # -0.2 (up to float32 rounding)
+
+    # the acoustically more likely b is replaced by a, which the language model prefers after <s>
+    top_tokens = torch.LongTensor([[4, 3, 5]])  # blank is 5
+    top_log_probs = torch.log(torch.FloatTensor([[0.58, 0.4, 0.02]]))
+    for lm_weight in (0.0, 1.0):
+        beam = ctc_prefix_beam_search(top_tokens.numpy(), top_log_probs.numpy(), top_log_probs[:, 2].numpy(),
+                                      beam_size=4, blank_id=5, blank_threshold=1.0, lm=lm, lm_weight=lm_weight)
+        print(beam[0][0])
+    # (4,)
+    # (3,)
@@ -0,0 +1,39 @@
+import torch
+from models.deepspeech2.model import DeepSpeech2
+from models.las.encoder import Encoder
+from models.las.decoder import Decoder
+from models.las.model import ListenAttendSpell
+from models.long_form import LongFormTranscriber, merge_overlap
+from models.search import GreedySearch, ctc_greedy_decode
+
+print(merge_overlap([5, 6, 7, 8, 9], [8, 9, 10, 11], 2, 2))
+# [5, 6, 7, 8, 9, 10, 11]
+print(merge_overlap([5, 6, 7, 8], [12, 13, 14, 15], 2, 2))
+# [5, 6, 7, 13, 14, 15]
+
+feature = torch.rand(80, 2345)  # DxT
+device = torch.device('cpu')
+
+ds2 = DeepSpeech2(2000, 80, 512).eval()
+transcriber = LongFormTranscriber(ds2, device, blank_id=1999, window_size=1000, overlap=200, batch_size=2)
+print(transcriber.windows(feature.size(1)))
+# [(0, 1000), (800, 1800), (1600, 2345)]
+
+with torch.no_grad():
+    log_prob, output_lengths = ds2(feature[:, :1000].unsqueeze(0), torch.IntTensor([1000]))
+y_hat = ctc_greedy_decode(log_prob, output_lengths, 1999)
+print(transcriber(feature[:, :1000]) == [token for token in y_hat[0].tolist() if token != 2])  # a single window
+# True
+print(len(transcriber(feature)) > 0)
+# True
+
+las = ListenAttendSpell(Encoder(2000, 80, 256), Decoder(device, 2000, 512, 512, max_len=20)).eval()
+transcriber = LongFormTranscriber(las, device, blank_id=1999, window_size=1000, overlap=200, max_len=20)
+
+with torch.no_grad():
+    y_hat = GreedySearch(device, 20)(las, feature[:, :1000].unsqueeze(0), torch.IntTensor([1000]))
+tokens = y_hat[0].tolist()
+print(transcriber(feature[:, :1000]) == (tokens[:tokens.index(2)] if 2 in tokens else tokens))
+# True
+print(len(transcriber(feature)) > 0)
+# True
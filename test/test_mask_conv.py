@@ -0,0 +1,53 @@
+import torch
+import torch.nn as nn
+from models.modules import MaskConv
+
+
+def reference_mask_conv(mask_conv: MaskConv, inputs: torch.Tensor, seq_lens: torch.Tensor):
+    """ Masks after every module with a python loop over the batch, as MaskConv did before """
+    output = None
+
+    for module in mask_conv.sequential:
+        output = module(inputs)
+        mask = torch.BoolTensor(output.size()).fill_(0)
+        seq_lens = mask_conv.get_seq_lens(module, seq_lens)
+
+        for idx, seq_len in enumerate(seq_lens):
+            seq_len = seq_len.item()
+            if (mask[idx].size(2) - seq_len) > 0:
+                mask[idx].narrow(2, seq_len, mask[idx].size(2) - seq_len).fill_(1)
+
+        output = output.masked_fill(mask, 0)
+        inputs = output
+
+    return output, seq_lens
+
+
+torch.manual_seed(22)
+mask_conv = MaskConv(nn.Sequential(
+    nn.Conv2d(in_channels=1, out_channels=32, kernel_size=(41, 11), stride=(2, 2), padding=(20, 5)),
+    nn.BatchNorm2d(num_features=32),
+    nn.Hardtanh(min_val=0, max_val=20, inplace=True),
+    nn.Conv2d(in_channels=32, out_channels=32, kernel_size=(21, 11), stride=(2, 1), padding=(10, 5)),
+    nn.BatchNorm2d(num_features=32),
+    nn.Hardtanh(min_val=0, max_val=20, inplace=True)
+))
+
+inputs = torch.randn(4, 1, 80, 100)
+input_lengths = torch.IntTensor([100, 93, 71, 40])
+
+for training in (True, False):
+    mask_conv.train(training)
+
+    expected_inputs = inputs.clone().requires_grad_(True)
+    expected_output, expected_lengths = reference_mask_conv(mask_conv, expected_inputs, input_lengths.clone())
+    expected_output.sum().backward()
+
+    actual_inputs = inputs.clone().requires_grad_(True)
+    output, output_lengths = mask_conv(actual_inputs, input_lengths.clone())
+    output.sum().backward()
+
+    print(training, output.size(), torch.equal(output, expected_output), torch.equal(output_lengths, expected_lengths),
+          torch.equal(actual_inputs.grad, expected_inputs.grad))
+# True torch.Size([4, 32, 20, 50]) True True True
+# False torch.Size([4, 32, 20, 50]) True True True
@@ -0,0 +1,46 @@
+import os
+import tempfile
+import torch
+from models.deepspeech2.model import DeepSpeech2
+from models.export import export_onnx
+from models.las.decoder import Decoder
+from models.las.encoder import Encoder
+from models.las.model import ListenAttendSpell
+from models.onnx_backend import load_onnx_model
+from models.search import CTCPrefixBeamSearch, GreedySearch, ctc_greedy_decode
+
+inputs = torch.rand(3, 80, 100)  # BxDxT
+input_lengths = torch.IntTensor([100, 90, 80])
+device = torch.device('cpu')
+
+las = ListenAttendSpell(Encoder(2000, 80, 256), Decoder(device, 2000, 512, 512, max_len=20)).eval()
+ds2 = DeepSpeech2(2000, 80, 512).eval()
+
+with tempfile.TemporaryDirectory() as export_dir, torch.no_grad():
+    export_onnx(las, export_dir)
+    onnx_las = load_onnx_model(os.path.join(export_dir, 'encoder.onnx'), las.decoder)
+    print(torch.equal(GreedySearch(device, 20)(onnx_las, inputs, input_lengths),
+                      GreedySearch(device, 20)(las, inputs, input_lengths)))
+    # True
+    search = CTCPrefixBeamSearch(device, blank_id=1999, beam_size=4, top_k=4)
+    print(torch.equal(search(onnx_las, inputs, input_lengths), search(las, inputs, input_lengths)))
+    # True
+
+with tempfile.TemporaryDirectory() as export_dir, torch.no_grad():
+    export_onnx(ds2, export_dir)
+    onnx_ds2 = load_onnx_model(os.path.join(export_dir, 'model.onnx'))
+    log_prob, output_lengths = ds2(inputs, input_lengths)
+    onnx_log_prob, onnx_output_lengths = onnx_ds2(inputs, input_lengths)
+    print(torch.allclose(log_prob, onnx_log_prob, atol=1e-4), torch.equal(output_lengths, onnx_output_lengths))
+    # True True
+    print(torch.equal(ctc_greedy_decode(onnx_log_prob, onnx_output_lengths, 1999),
+                      ctc_greedy_decode(log_prob, output_lengths, 1999)))
+    # True
+
+# the model is exported from a copy, a model in training keeps its mode and device
+las.train()
+las.encoder.device = torch.device('cuda')
+with tempfile.TemporaryDirectory() as export_dir:
+    export_onnx(las, export_dir)
+print(all(module.training for module in las.modules()), las.encoder.device)
+# True cuda
@@ -0,0 +1,21 @@
+import torch
+from models.deepspeech2.model import DeepSpeech2
+from models.quantization import quantize_model, is_quantized, get_model_size
+
+inputs = torch.rand(3, 80, 100)  # BxDxT
+input_lengths = torch.IntTensor([100, 90, 80])
+
+model = DeepSpeech2(2000, 80, 512).eval()
+quantized_model = quantize_model(model)
+
+print(is_quantized(model), is_quantized(quantized_model))  # False True
+print(quantized_model.rnn)  # DynamicQuantizedGRU(640, 512, num_layers=5, batch_first=True, dropout=0.3, bidirectional=True)
+
+with torch.no_grad():
+    log_prob, output_lengths = model(inputs, input_lengths)
+    quantized_log_prob, quantized_output_lengths = quantized_model(inputs, input_lengths)
+
+print(torch.equal(output_lengths, quantized_output_lengths), (log_prob - quantized_log_prob).abs().max() < 0.1)
+print(get_model_size(quantized_model) / get_model_size(model) < 0.35)
+# True tensor(True)
+# True
@@ -0,0 +1,20 @@
+import numpy as np
+from data.data_loader import DynamicBucketingSampler
+
+np.random.seed(0)
+feature_lengths = np.random.randint(100, 1500, 20000)
+sampler = DynamicBucketingSampler(feature_lengths, max_frames=20000, num_buckets=10)
+
+first_epoch = [tuple(sorted(batch)) for batch in sampler]
+second_epoch = [tuple(sorted(batch)) for batch in sampler]
+
+print(sorted(idx for batch in first_epoch for idx in batch) == list(range(20000)))
+# True
+print(sorted(idx for batch in second_epoch for idx in batch) == list(range(20000)))
+# True
+print(all(feature_lengths[list(batch)].max() * len(batch) <= 20000 for batch in first_epoch + second_epoch))
+# True
+print(len(set(first_epoch) & set(second_epoch)) < len(first_epoch) // 10)  # batch membership changes across epochs
+# True
+print(sampler.padding_efficiency() > 0.9)
+# True
@@ -0,0 +1,50 @@
+import os
+import tempfile
+import numpy as np
+from data.data_loader import ShardedSpectrogramDataset, write_shards
+
+np.random.seed(0)
+
+with tempfile.TemporaryDirectory() as tmp_dir:
+    audio_paths, transcripts = list(), list()
+    for idx in range(50):
+        path = '{}.pcm'.format(idx)
+        (np.random.randn(1600 + 16 * idx) * 1000).astype('h').tofile(os.path.join(tmp_dir, path))
+        audio_paths.append(path)
+        transcripts.append(str(idx + 3))  # one token per utterance identifies it
+
+    shard_path = os.path.join(tmp_dir, 'shards')
+    print(write_shards(tmp_dir, audio_paths, transcripts, shard_path, utterances_per_shard=5))
+    # 10
+
+    def build_dataset(rank: int, world_size: int) -> ShardedSpectrogramDataset:
+        dataset = ShardedSpectrogramDataset(shard_path, feature_extraction='spectrogram', spec_augment=False,
+                                            shuffle_buffer_size=8)
+        dataset.get_rank = lambda: (rank, world_size)
+        return dataset
+
+    # shards of each rank are disjoint, and __len__ counts only the shards of the rank
+    datasets = [build_dataset(rank, 2) for rank in range(2)]
+    print([len(dataset) for dataset in datasets], set(datasets[0].get_rank_shard_paths()).isdisjoint(
+        datasets[1].get_rank_shard_paths()))
+    # [25, 25] True
+
+    # the shuffle buffer yields every sample of the rank exactly once, in a different order each epoch
+    for dataset in datasets:
+        epochs = list()
+        for epoch in range(2):
+            dataset.set_epoch(epoch)
+            epochs.append([int(transcript[1]) - 3 for _, transcript in dataset])
+        print(len(epochs[0]) == len(dataset), sorted(epochs[0]) == sorted(epochs[1]),
+              len(set(epochs[0])) == len(dataset), epochs[0] != epochs[1])
+    # True True True True
+    # True True True True
+
+    print(sorted(set(epochs[0]) | set(int(transcript[1]) - 3 for _, transcript in datasets[0])) == list(range(50)))
+    # True
+
+    try:
+        build_dataset(0, 16).get_rank_shard_paths()
+    except ValueError:
+        print('ValueError')
+    # ValueError
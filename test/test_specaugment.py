@@ -0,0 +1,45 @@
+import torch
+from torch.utils.data import DataLoader
+from data.data_loader import BatchCollate
+from data.specaugment import BatchSpecAugment
+
+torch.manual_seed(0)
+feature_lengths = torch.IntTensor([300, 200, 120, 50])
+padding = torch.arange(300).unsqueeze(0) >= feature_lengths.unsqueeze(1)  # (B, T)
+
+# without frequency masks every zero comes from a time mask, the padding is filled with ones to see them
+time_spec_augment = BatchSpecAugment(freq_mask_parameter=10, num_freq_mask=0, num_time_mask=5)
+masked_padding, masked_frames = 0, 0
+for seed in range(200):
+    features = time_spec_augment(torch.ones(4, 20, 300), feature_lengths, seed)
+    masked = (features == 0).all(dim=1)  # (B, T)
+    masked_padding += int((masked & padding).sum())
+    masked_frames += int(masked.sum())
+print(masked_padding, masked_frames > 0)
+# 0 True
+
+spec_augment = BatchSpecAugment(freq_mask_parameter=10, num_freq_mask=2, num_time_mask=5)
+features = torch.randn(4, 20, 300).masked_fill(padding.unsqueeze(1), 0)
+masked = [spec_augment(features.clone(), feature_lengths, seed) for seed in (7, 7, 8)]
+print(torch.equal(masked[0], masked[1]), torch.equal(masked[0], masked[2]))
+# True False
+
+# the seed of BatchCollate depends on the batch content, not on the worker that collates it
+dataset = [(torch.randn(20, int(length)), torch.randint(1, 100, (int(length) // 10,)))
+           for length in torch.randint(50, 300, (32,))]
+batch_collate = BatchCollate(spec_augment=spec_augment, seed=3)
+outputs = dict()
+for num_workers in (0, 1, 3):
+    data_loader = DataLoader(dataset, batch_size=4, num_workers=num_workers, collate_fn=batch_collate)
+    outputs[num_workers] = [(batch_collate.get_seed(targets, seq_lengths), seqs)
+                            for seqs, targets, seq_lengths, target_lengths in data_loader]
+print(all(
+    [seed for seed, _ in outputs[num_workers]] == [seed for seed, _ in outputs[0]] and
+    all(torch.equal(seqs, expected) for (_, seqs), (_, expected) in zip(outputs[num_workers], outputs[0]))
+    for num_workers in (1, 3)
+))
+# True
+
+batch_collate.epoch = 1
+print(batch_collate(dataset[:4])[0].equal(outputs[0][0][1]))
+# False
@@ -0,0 +1,30 @@
+import torch
+from models.deepspeech2.model import DeepSpeech2
+from models.deepspeech2.streaming import StreamingDeepSpeech2
+from models.search import ctc_greedy_decode
+
+inputs = torch.rand(2, 80, 157)  # BxDxT
+input_lengths = torch.IntTensor([157, 157])
+
+model = DeepSpeech2(2000, 80, 512, bidirectional=False, lookahead_context=20).eval()
+streaming = StreamingDeepSpeech2(model, blank_id=1999)
+
+with torch.no_grad():
+    log_prob, output_lengths = model(inputs, input_lengths)
+
+chunks = [streaming.forward_chunk(inputs[:, :, begin:begin + 16]) for begin in range(0, 157, 16)]
+chunks.append(streaming.forward_chunk(inputs[:, :, :0], is_last=True))
+streaming_log_prob = torch.cat(chunks, dim=1)
+
+print(streaming_log_prob.size(), torch.allclose(streaming_log_prob, log_prob, atol=1e-5))
+# torch.Size([2, 79, 2000]) True
+
+streaming.reset()
+for begin in range(0, 157, 16):
+    streaming(inputs[:, :, begin:begin + 16])
+streaming.finish()
+
+y_hat = ctc_greedy_decode(log_prob, output_lengths, 1999)
+print(all(hypothesis == [token for token in y_hat[idx].tolist() if token != 2]
+          for idx, hypothesis in enumerate(streaming.hypotheses)))
+# True
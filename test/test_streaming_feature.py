@@ -0,0 +1,57 @@
+import numpy as np
+import torch
+from data.batch_feature import BatchFeatureExtractor
+from data.streaming_feature import StreamingFeatureExtractor
+from models.deepspeech2.model import DeepSpeech2
+from models.deepspeech2.streaming import StreamingDeepSpeech2
+from models.search import ctc_greedy_decode
+
+np.random.seed(0)
+sound = (np.random.randn(16123) * 0.1).astype('float32')
+sound_lengths = torch.LongTensor([len(sound)])
+
+# the running maximum of the default top_db is not exact, so melspectrogram and mfcc use a fixed ref_db or no clipping
+for feature_extraction, top_db, ref_db in (('spectrogram', 80.0, None), ('melspectrogram', 80.0, 0.0),
+                                           ('melspectrogram', None, None), ('mfcc', 80.0, 0.0), ('mfcc', None, None),
+                                           ('filterbank', 80.0, None)):
+    n_dim = 40 if feature_extraction == 'mfcc' else 80
+    batch_feature_extractor = BatchFeatureExtractor(feature_extraction, 16000, n_dim, 0.020, 0.010, top_db, ref_db)
+    streaming_feature_extractor = StreamingFeatureExtractor(feature_extraction, 16000, n_dim, 0.020, 0.010,
+                                                            top_db=top_db, ref_db=ref_db)
+
+    with torch.no_grad():
+        features, feature_lengths = batch_feature_extractor(torch.from_numpy(sound).unsqueeze(0), sound_lengths)
+
+    # 1 sample and chunks shorter than n_fft // 2 exercise the left and right padding across calls
+    matches = list()
+    for chunk_size in (1, 100, 160, 1000, len(sound)):
+        streaming_feature_extractor.reset()
+        chunks = [streaming_feature_extractor(sound[begin:begin + chunk_size])
+                  for begin in range(0, len(sound), chunk_size)]
+        streaming_features = torch.cat(chunks + [streaming_feature_extractor.finish()], dim=2)
+        matches.append(streaming_features.size() == features.size() and
+                       torch.allclose(streaming_features, features, atol=1e-3))
+
+    print(feature_extraction, top_db, all(matches))
+# spectrogram 80.0 True
+# melspectrogram 80.0 True
+# melspectrogram None True
+# mfcc 80.0 True
+# mfcc None True
+# filterbank 80.0 True
+
+feature_extractor = BatchFeatureExtractor('filterbank', 16000, 80, 0.020, 0.010)
+model = DeepSpeech2(2000, 80, 512, bidirectional=False, lookahead_context=20).eval()
+streaming = StreamingDeepSpeech2(model, 1999, feature_extractor=StreamingFeatureExtractor('filterbank', 16000, 80))
+
+with torch.no_grad():
+    features, feature_lengths = feature_extractor(torch.from_numpy(sound).unsqueeze(0), sound_lengths)
+    log_prob, output_lengths = model(features, feature_lengths)
+
+for begin in range(0, len(sound), 1600):
+    streaming.accept_waveform(sound[begin:begin + 1600])
+streaming.finish_waveform()
+
+y_hat = ctc_greedy_decode(log_prob, output_lengths, 1999)
+print(streaming.hypotheses[0] == [token for token in y_hat[0].tolist() if token != 2])
+# True
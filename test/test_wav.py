@@ -0,0 +1,68 @@
+import os
+import struct
+import tempfile
+import numpy as np
+import librosa
+from data.wav import load_wav, read_wav_header
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+
+
+def write_wav(path, sound, sampling_rate, float_format=False, extra_chunks=(), data_size=None):
+    """ Writes a RIFF WAVE file by hand, sound is (num_frames, num_channels) """
+    payload = sound.astype('<f4' if float_format else '<i2').tobytes()
+    num_channels = sound.shape[1]
+    bits_per_sample = 32 if float_format else 16
+    block_align = num_channels * bits_per_sample // 8
+    fmt = struct.pack('<HHIIHH', WAVE_FORMAT_IEEE_FLOAT if float_format else WAVE_FORMAT_PCM, num_channels,
+                      sampling_rate, sampling_rate * block_align, block_align, bits_per_sample)
+
+    chunks = b'fmt ' + struct.pack('<I', len(fmt)) + fmt
+    for chunk_id, chunk in extra_chunks:
+        chunks += chunk_id + struct.pack('<I', len(chunk)) + chunk + b'\x00' * (len(chunk) % 2)
+    chunks += b'data' + struct.pack('<I', len(payload) if data_size is None else data_size) + payload
+
+    with open(path, 'wb') as f:
+        f.write(b'RIFF' + struct.pack('<I', 4 + len(chunks) if data_size is None else data_size) + b'WAVE' + chunks)
+
+
+np.random.seed(0)
+t = np.arange(16000) / 16000
+mono = (0.5 * np.sin(2 * np.pi * 440 * t))[:, None]
+stereo = np.concatenate((mono, 0.25 * np.random.uniform(-1, 1, (16000, 1))), axis=1)
+extra_chunks = ((b'LIST', b'INFOISFT\x05\x00\x00\x00test\x00'), (b'odd ', b'abc'))
+
+with tempfile.TemporaryDirectory() as tmp_dir:
+    cases = {
+        'int16 mono': (np.round(mono * 32767), 16000, False, ()),
+        'int16 stereo': (np.round(stereo * 32767), 16000, False, ()),
+        'float32 mono': (mono, 16000, True, ()),
+        'float32 stereo': (stereo, 16000, True, ()),
+        'extra chunks': (np.round(mono * 32767), 16000, False, extra_chunks),
+    }
+
+    for name, (sound, sampling_rate, float_format, chunks) in cases.items():
+        path = os.path.join(tmp_dir, name.replace(' ', '_') + '.wav')
+        write_wav(path, sound, sampling_rate, float_format, chunks)
+        expected, _ = librosa.load(path, sr=16000)
+        print(name, np.abs(load_wav(path, 16000) - expected).max() < 1e-6)
+# int16 mono True
+# int16 stereo True
+# float32 mono True
+# float32 stereo True
+# extra chunks True
+
+    path = os.path.join(tmp_dir, '8k.wav')
+    sound_8k = 0.5 * np.sin(2 * np.pi * 440 * np.arange(8000) / 8000)[:, None]
+    write_wav(path, np.round(sound_8k * 32767), 8000)
+    expected, _ = librosa.load(path, sr=16000)
+    resampled = load_wav(path, 16000)
+    print(resampled.shape == expected.shape, np.abs(resampled - expected)[100:-100].max() < 1e-2)  # filters differ
+# True True
+
+    # streamed wav, the RIFF and data sizes are unknown and written as 0xFFFFFFFF
+    path = os.path.join(tmp_dir, 'streamed.wav')
+    write_wav(path, np.round(mono * 32767), 16000, data_size=0xFFFFFFFF)
+    print(read_wav_header(path).num_frames, np.abs(load_wav(path, 16000) - np.round(mono[:, 0] * 32767) / 32768).max())
+# 16000 0.0
@@ -15,6 +15,9 @@ from dataclasses import dataclass
 @dataclass
 class TrainConfig:
     dataset_path: str = 'D:/dataset/transcripts.txt'
+    manifest_path: str = ''
+    corpus_path: str = ''
+    shard_path: str = ''
     audio_path: str = 'E:/KsponSpeech'
     label_path: str = 'D:/label/aihub_labels.csv'
     train_result_path: str = 'C:/Users/cote/PycharmProjects/las/result/train_result'
@@ -31,7 +34,12 @@ class TrainConfig:
     blank_id: int = 1999
 
     batch_size: int = 4
+    max_frames: int = 0
+    num_buckets: int = 10
+    shuffle_buffer_size: int = 1000
     num_workers: int = 4
+    preallocate: bool = False
+    num_prefetch: int = 2
     lr: float = 1e-04
 
     cuda: bool = True
@@ -15,7 +15,9 @@ import torch.nn as nn
 import torch.optim as optim
 from typing import Tuple
 from vocabulary import get_distance, label_to_string
-from data.data_loader import BucketingSampler, AudioDataLoader
+from data.data_loader import BucketingSampler, DynamicBucketingSampler, AudioDataLoader
+from data.prefetcher import DevicePrefetcher
+from models.search import ctc_greedy_decode
 from omegaconf import DictConfig
 
 
@@ -38,16 +40,12 @@ def validate(
     total_length = 0
 
     model.eval()
+    valid_loader = DevicePrefetcher(valid_loader, device, config.train.num_prefetch)
 
     with torch.no_grad():
         for batch_idx, data in enumerate(valid_loader):
             feature, target, feature_lengths, target_lengths = data
 
-            feature = feature.to(device)
-            target = target.to(device)
-            feature_lengths = feature_lengths.to(device)
-            target_lengths = target_lengths.to(device)
-
             result = target[:, 1:]
 
             if config.model.architecture == 'las':
@@ -76,7 +74,8 @@ def validate(
             elif config.model.architecture == 'deepspeech2':
                 output_prob, output_lengths = model(feature, feature_lengths)
                 loss = ctcloss(output_prob.transpose(0, 1), target, output_lengths, target_lengths)
-                y_hat = output_prob.max(2)[1]
+                y_hat = ctc_greedy_decode(output_prob, output_lengths, config.train.blank_id, config.train.sos_id,
+                                          config.train.eos_id)
 
             result = label_to_string(config.train.eos_id, config.train.blank_id, result, id2char)
             y_hat = label_to_string(config.train.eos_id, config.train.blank_id, y_hat, id2char)
@@ -125,14 +124,15 @@ def train(
 
     model.train()
 
+    if isinstance(train_sampler, DynamicBucketingSampler):
+        print('Epoch {epoch} : padding efficiency {efficiency:.4f}'.format(epoch=epoch,
+                                                                         efficiency=train_sampler.padding_efficiency()))
+
+    train_loader = DevicePrefetcher(train_loader, device, config.train.num_prefetch)
+
     for batch_idx, data in enumerate(train_loader):
         feature, target, feature_lengths, target_lengths = data
 
-        feature = feature.to(device)
-        target = target.to(device)
-        feature_lengths = feature_lengths.to(device)
-        target_lengths = target_lengths.to(device)
-
         result = target[:, 1:]
 
         optimizer.zero_grad()
@@ -166,7 +166,8 @@ def train(
         elif config.model.architecture == 'deepspeech2':
             output_prob, output_lengths = model(feature, feature_lengths)
             loss = ctcloss(output_prob.transpose(0, 1), target, output_lengths, target_lengths)
-            y_hat = output_prob.max(2)[1]
+            y_hat = ctc_greedy_decode(output_prob, output_lengths, config.train.blank_id, config.train.sos_id,
+                                      config.train.eos_id)
 
         loss.backward()
         optimizer.step()
@@ -193,7 +194,7 @@ def train(
                       'CTC loss : {ctc_loss:.4f}\t'
                       'Cross entropy loss : {cross_entropy_loss:.4f}\t'
                       'loss : {loss:.4f}\t'
-                      'cer : {cer:.2f}\t'.format(epoch=epoch, batch_idx=batch_idx, total_idx=len(train_sampler),
+                      'cer : {cer:.2f}\t'.format(epoch=epoch, batch_idx=batch_idx, total_idx=len(train_loader),
                                                  ctc_loss=ctc_loss, cross_entropy_loss=cross_entropy_loss,
                                                  loss=loss, cer=cer))
 
@@ -201,9 +202,11 @@ def train(
             if batch_idx % config.train.print_interval == 0:
                 print('Epoch {epoch} : {batch_idx} / {total_idx}\t'
                       'loss : {loss:.4f}\t'
-                      'cer : {cer:.2f}\t'.format(epoch=epoch, batch_idx=batch_idx, total_idx=len(train_sampler),
+                      'cer : {cer:.2f}\t'.format(epoch=epoch, batch_idx=batch_idx, total_idx=len(train_loader),
                                                  loss=loss, cer=cer))
 
+    print('Epoch {epoch} : data wait time {wait_time:.2f}s'.format(epoch=epoch, wait_time=train_loader.wait_time))
+
     validation_epoch_result = validate(config, model, device, valid_loader, id2char, ctcloss, crossentropyloss)
 
     save_train_epoch_result(train_epoch_result, config, epoch_idx)
@@ -9,11 +9,13 @@
 # copies of the Software, and to permit persons to whom the Software is
 # furnished to do so, subject to the following conditions:
 
+import os
 import pandas as pd
 import numpy as np
 import Levenshtein as Lev
 from torch import Tensor
-from typing import Tuple, Optional, Any
+from typing import Tuple, Optional, Any, Union
+from data.data_loader import get_audio_length
 
 
 def load_label(label_path: str, blank_id: int) -> Tuple[dict, dict]:
@@ -103,6 +105,140 @@ def load_dataset(dataset_path: str, mode: str) -> Tuple[list, list, list, list]:
     return audio_paths, transcripts, valid_audio_paths, valid_transcripts
 
 
+def build_manifest(
+        dataset_path: str,
+        manifest_path: str,
+        audio_path: str,
+        extension: str = 'pcm',
+        sampling_rate: int = 16000,
+) -> int:
+    """
+    Converts a transcript file into a binary manifest of flat numpy arrays
+
+    Args:
+        dataset_path (str): path of transcript file with audio path and transcript
+        manifest_path (str): directory where the manifest is written
+        audio_path (str): root directory of audio files, used to read audio lengths
+        extension (str): audio extension (default: pcm)
+        sampling_rate (int): sampling rate of audio (default: 16000)
+
+    Returns: num_utterances
+        - **num_utterances** (int): the number of utterances in the manifest
+    """
+    audio_paths = list()
+    audio_lengths = list()
+    tokens = list()
+    offsets = [0]
+
+    with open(dataset_path) as f:
+        for line in f:
+            path, _, transcript = line.split('\t')
+            transcript = list(map(int, transcript.split()))
+
+            audio_paths.append(path.encode('utf-8'))
+            audio_lengths.append(get_audio_length(os.path.join(audio_path, path), extension, sampling_rate))
+            tokens.extend(transcript)
+            offsets.append(len(tokens))
+
+    os.makedirs(manifest_path, exist_ok=True)
+    np.save(os.path.join(manifest_path, 'audio_paths.npy'), np.array(audio_paths))
+    np.save(os.path.join(manifest_path, 'audio_lengths.npy'), np.array(audio_lengths, dtype=np.int64))
+    np.save(os.path.join(manifest_path, 'tokens.npy'), np.array(tokens, dtype=np.int32))
+    np.save(os.path.join(manifest_path, 'offsets.npy'), np.array(offsets, dtype=np.int64))
+
+    return len(audio_paths)
+
+
+class ManifestColumn(object):
+    """
+    Indexed view over one column of a binary manifest. Arrays are memory-mapped lazily in each process,
+    so only the manifest path and the indices are copied to DataLoader workers.
+
+    Args:
+        manifest_path (str): directory of the manifest
+        column (str): audio_paths or transcripts
+        indices (np.ndarray): manifest rows covered by this view
+    """
+    def __init__(
+            self,
+            manifest_path: str,
+            column: str,
+            indices: np.ndarray,
+    ) -> None:
+        self.manifest_path = manifest_path
+        self.column = column
+        self.indices = indices
+        self.arrays = None
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state['arrays'] = None
+        return state
+
+    def _load(self) -> dict:
+        if self.arrays is None:
+            names = ('audio_paths', 'audio_lengths') if self.column == 'audio_paths' else ('tokens', 'offsets')
+            self.arrays = {
+                name: np.load(os.path.join(self.manifest_path, name + '.npy'), mmap_mode='r') for name in names
+            }
+
+        return self.arrays
+
+    @property
+    def audio_lengths(self) -> np.ndarray:
+        return np.asarray(self._load()['audio_lengths'][self.indices])
+
+    def __getitem__(self, idx: int) -> Union[str, np.ndarray]:
+        arrays = self._load()
+        row = self.indices[idx]
+
+        if self.column == 'audio_paths':
+            return arrays['audio_paths'][row].decode('utf-8')
+
+        return arrays['tokens'][arrays['offsets'][row]:arrays['offsets'][row + 1]]
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+
+def load_manifest(manifest_path: str, mode: str) -> Tuple[Any, Any, Any, Any]:
+    """
+    Divide a binary manifest into train and validate, same split as load_dataset
+
+    Args:
+        manifest_path (str): directory of the manifest written by build_manifest
+        mode (str): flag indication train or eval
+
+    Returns: audio_paths, transcripts, valid_audio_paths, valid_transcripts
+        - **audio_paths** (ManifestColumn): audio paths to train or eval
+        - **transcripts** (ManifestColumn): token ids to train or eval
+        - **valid_audio_paths** (ManifestColumn): audio paths to validate, if mode is eval, return None
+        - **valid_transcripts** (ManifestColumn): token ids to validate, if mode is eval, return None
+    """
+    num_utterances = len(np.load(os.path.join(manifest_path, 'audio_lengths.npy'), mmap_mode='r'))
+
+    valid_audio_paths = None
+    valid_transcripts = None
+
+    if mode == 'train':
+        TRAIN_NUM = 410000
+
+        indices = np.random.permutation(num_utterances)
+        valid_indices = indices[TRAIN_NUM:]
+        indices = indices[:TRAIN_NUM]
+
+        valid_audio_paths = ManifestColumn(manifest_path, 'audio_paths', valid_indices)
+        valid_transcripts = ManifestColumn(manifest_path, 'transcripts', valid_indices)
+
+    else:
+        indices = np.arange(num_utterances)
+
+    audio_paths = ManifestColumn(manifest_path, 'audio_paths', indices)
+    transcripts = ManifestColumn(manifest_path, 'transcripts', indices)
+
+    return audio_paths, transcripts, valid_audio_paths, valid_transcripts
+
+
 def label_to_string(
         eos_id: int,
         blank_id: int,